@@ -0,0 +1,353 @@
+import numpy as np
+
+from collision import WallGrid
+
+from sim import (
+    WALK_SPEED, TURN_SPEED, LEG_SWING_DEG, LEG_SWING_SPEED, SMOOTH_RETURN,
+    AGENT_RADIUS, PICKUP_RANGE, TICK_DT,
+    IN_FORWARD, IN_BACK, IN_LEFT, IN_RIGHT, IN_ACTION,
+    MODE_ROAM, MODE_CHASE, MODE_RETURN,
+    NPCState, World, build_rooms, inside_any_room, substeps,
+)
+from level import default_level
+
+ANIM_NONE, ANIM_PICKUP, ANIM_DROP = 0, 1, 2
+ANIM_NAMES = ('none', 'pickup', 'drop')
+
+class BatchEnv:
+    """B independent copies of the game stored as structure-of-arrays.
+
+    ``step(actions)`` takes a ``(B,)`` array of ``IN_*`` bitmasks and applies
+    the same rules as ``sim.World.step`` to every world at once. NPCs chase
+    in a straight line, as in ``World(navigation=False)``, and only the
+    first guard of ``level`` (default: the built-in one) is simulated.
+    """
+
+    def __init__(self, batch_size, bomb_spawns=None, dt=TICK_DT, level=None):
+        self.B = batch_size
+        self.dt = dt
+        self.level = level if level is not None else default_level()
+        self.rooms = self.level.rooms
+        walls, room_floors = [], []
+        build_rooms(walls, room_floors, self.level)
+        self.walls = walls
+        self.collision = WallGrid(walls, AGENT_RADIUS)
+        self.path = np.array(NPCState(self.level.guards[0]).path, dtype=np.float64)
+        self.pads = np.array([(a["x0"], a["z0"], a["x1"], a["z1"]) for a in self.level.pads], dtype=np.float64)
+        if bomb_spawns is None:
+            bomb_spawns = self.level.first_spawns
+        self.n_bombs = len(bomb_spawns)
+
+        B, NB = self.B, self.n_bombs
+        self.time = np.zeros(B)
+        self.tick = np.zeros(B, dtype=np.int64)
+        self.game_over = np.zeros(B, dtype=bool)
+
+        self.ax = np.zeros(B); self.az = np.zeros(B); self.ayaw = np.zeros(B)
+        self.a_walk = np.zeros(B, dtype=bool)
+        self.a_leg_l = np.zeros(B); self.a_leg_r = np.zeros(B); self.a_t = np.zeros(B)
+        self.carrying = np.full(B, -1, dtype=np.int64)
+        self.anim = np.zeros(B, dtype=np.int8)
+        self.anim_t = np.zeros(B)
+        self.anim_obj = np.full(B, -1, dtype=np.int64)
+        self.anim_start = np.zeros((B, 3))
+        self.anim_end = np.zeros((B, 3))
+
+        self.nx = np.zeros(B); self.nz = np.zeros(B); self.nyaw = np.zeros(B)
+        self.n_walk = np.zeros(B, dtype=bool)
+        self.n_leg_l = np.zeros(B); self.n_leg_r = np.zeros(B); self.n_t = np.zeros(B)
+        self.n_speed = np.zeros(B)
+        self.mode = np.zeros(B, dtype=np.int8)
+        self.path_idx = np.zeros(B, dtype=np.int64)
+        self.return_idx = np.zeros(B, dtype=np.int64)
+
+        self.bomb_pos = np.zeros((B, NB, 3))
+        self.bomb_start = np.zeros((B, NB))
+        self.bomb_timer = np.zeros((B, NB))
+        self.bomb_active = np.zeros((B, NB), dtype=bool)
+        self.bomb_deactivated = np.zeros((B, NB), dtype=bool)
+        self.bomb_exploded = np.zeros((B, NB), dtype=bool)
+        self.bomb_carried = np.zeros((B, NB), dtype=bool)
+
+        self.reset(bomb_spawns=bomb_spawns)
+
+    def reset(self, mask=None, bomb_spawns=None):
+        m = np.ones(self.B, dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+        if bomb_spawns is None:
+            bomb_spawns = self.level.round_spawns
+        spawns = np.asarray(bomb_spawns, dtype=np.float64)
+        if len(spawns) != self.n_bombs:
+            raise ValueError(f"expected {self.n_bombs} bomb spawns, got {len(spawns)}")
+        npc = NPCState(self.level.guards[0])
+
+        self.game_over[m] = False
+        self.ax[m] = 0.0; self.az[m] = -3.0; self.ayaw[m] = 0.0
+        self.a_walk[m] = False
+        self.a_leg_l[m] = 0.0; self.a_leg_r[m] = 0.0; self.a_t[m] = 0.0
+        self.carrying[m] = -1
+        self.anim[m] = ANIM_NONE
+        self.anim_t[m] = 0.0
+        self.anim_obj[m] = -1
+        self.anim_start[m] = 0.0; self.anim_end[m] = 0.0
+
+        self.nx[m] = npc.x; self.nz[m] = npc.z; self.nyaw[m] = npc.yaw
+        self.n_walk[m] = False
+        self.n_leg_l[m] = 0.0; self.n_leg_r[m] = 0.0; self.n_t[m] = 0.0
+        self.n_speed[m] = npc.speed
+        self.mode[m] = MODE_ROAM
+        self.path_idx[m] = npc.current_idx
+        self.return_idx[m] = npc.return_idx
+
+        self.bomb_pos[m, :, 0] = spawns[:, 0]
+        self.bomb_pos[m, :, 1] = 0.18
+        self.bomb_pos[m, :, 2] = spawns[:, 1]
+        self.bomb_timer[m] = spawns[:, 2]
+        self.bomb_start[m] = self.time[m, None]
+        self.bomb_active[m] = True
+        self.bomb_deactivated[m] = False
+        self.bomb_exploded[m] = False
+        self.bomb_carried[m] = False
+
+    def _back_pos(self):
+        rad = np.radians(self.ayaw)
+        return np.stack([self.ax - np.sin(rad) * 0.28,
+                         np.full(self.B, 1.1),
+                         self.az - np.cos(rad) * 0.28], axis=1)
+
+    def _handle_action(self, m):
+        m = m & (self.anim == ANIM_NONE)
+        rows = np.arange(self.B)
+
+        drop = m & (self.carrying >= 0)
+        if drop.any():
+            rad = np.radians(self.ayaw[drop])
+            idx = self.carrying[drop]
+            self.anim[drop] = ANIM_DROP
+            self.anim_t[drop] = 0.0
+            self.anim_obj[drop] = idx
+            self.anim_start[drop] = self._back_pos()[drop]
+            self.anim_end[drop] = np.stack([self.ax[drop] + np.sin(rad) * 0.6,
+                                            np.full(idx.shape, 0.18),
+                                            self.az[drop] + np.cos(rad) * 0.6], axis=1)
+            self.carrying[drop] = -1
+            self.bomb_carried[rows[drop], idx] = False
+
+        pick = m & ~drop
+        if pick.any():
+            d = np.hypot(self.ax[:, None] - self.bomb_pos[:, :, 0], self.az[:, None] - self.bomb_pos[:, :, 2])
+            eligible = ~(self.bomb_deactivated | self.bomb_exploded | self.bomb_carried) & (d <= PICKUP_RANGE)
+            d = np.where(eligible, d, np.inf)
+            best = d.argmin(axis=1)
+            pick &= eligible[rows, best]
+            if pick.any():
+                idx = best[pick]
+                self.anim[pick] = ANIM_PICKUP
+                self.anim_t[pick] = 0.0
+                self.anim_obj[pick] = idx
+                self.anim_start[pick] = self.bomb_pos[rows[pick], idx]
+                self.bomb_carried[rows[pick], idx] = True
+
+    def _process_input(self, m, actions, dt):
+        left = m & ((actions & IN_LEFT) != 0)
+        right = m & ((actions & IN_RIGHT) != 0)
+        fwd = m & ((actions & IN_FORWARD) != 0)
+        back = m & ((actions & IN_BACK) != 0)
+
+        yaw = self.ayaw.copy()
+        yaw = np.where(left, yaw + TURN_SPEED * dt, yaw)
+        yaw = np.where(right, yaw - TURN_SPEED * dt, yaw)
+        self.ayaw = np.where(m, np.mod(yaw, 360.0), self.ayaw)
+
+        fx = np.sin(np.radians(self.ayaw))
+        fz = np.cos(np.radians(self.ayaw))
+        dx = np.where(fwd, fx * WALK_SPEED * dt, 0.0)
+        dz = np.where(fwd, fz * WALK_SPEED * dt, 0.0)
+        dx = np.where(back, dx - fx * WALK_SPEED * dt, dx)
+        dz = np.where(back, dz - fz * WALK_SPEED * dt, dz)
+
+        new_x = self.ax + dx
+        ok = m & ~self.collision.crossed_many(self.ax, self.az, new_x, self.az)
+        self.ax = np.where(ok, new_x, self.ax)
+        new_z = self.az + dz
+        ok = m & ~self.collision.crossed_many(self.ax, self.az, self.ax, new_z)
+        self.az = np.where(ok, new_z, self.az)
+
+        self.a_walk = np.where(m, fwd | back, self.a_walk)
+
+    def _update_carry_anim(self, m, dt, deactivated):
+        m = m & (self.anim != ANIM_NONE)
+        if not m.any():
+            return
+        rows = np.nonzero(m)[0]
+        self.anim_t[rows] += dt / 0.4
+        t = np.minimum(1.0, self.anim_t[rows])
+        lift = 0.5 * np.sin(t * np.pi)
+        start = self.anim_start[rows]
+        end = np.where((self.anim[rows] == ANIM_PICKUP)[:, None], self._back_pos()[rows], self.anim_end[rows])
+        cur = start + (end - start) * t[:, None]
+        cur[:, 1] += lift
+        obj = self.anim_obj[rows]
+        self.bomb_pos[rows, obj] = cur
+
+        done = self.anim_t[rows] >= 1.0
+        if not done.any():
+            return
+        rows, obj = rows[done], obj[done]
+        picked = self.anim[rows] == ANIM_PICKUP
+        self.carrying[rows[picked]] = obj[picked]
+
+        dr, do = rows[~picked], obj[~picked]
+        self.bomb_pos[dr, do] = self.anim_end[dr]
+        cx = self.bomb_pos[dr, do, 0][:, None]
+        cz = self.bomb_pos[dr, do, 2][:, None]
+        x0, z0, x1, z1 = self.pads.T
+        on_pad = ((x0 <= cx) & (cx <= x1) & (z0 <= cz) & (cz <= z1)).any(axis=1)
+        self.bomb_deactivated[dr[on_pad], do[on_pad]] = True
+        self.bomb_active[dr[on_pad], do[on_pad]] = False
+        deactivated[dr[on_pad], do[on_pad]] = True
+
+        self.anim[rows] = ANIM_NONE
+        self.anim_obj[rows] = -1
+
+    def _animate_legs(self, m, walk, t, leg_l, leg_r, dt):
+        w = m & walk
+        t[w] += dt
+        ang = np.sin(t[w] * LEG_SWING_SPEED) * LEG_SWING_DEG
+        leg_l[w] = ang
+        leg_r[w] = -ang
+        s = m & ~walk
+        k = min(1.0, SMOOTH_RETURN*dt)
+        leg_l[s] += (0 - leg_l[s]) * k
+        leg_r[s] += (0 - leg_r[s]) * k
+
+    def _update_npc(self, m, dt):
+        both = inside_any_room(self.ax, self.az, self.rooms) & inside_any_room(self.nx, self.nz, self.rooms)
+
+        to_chase = m & (self.mode == MODE_ROAM) & both
+        to_return = m & (self.mode == MODE_CHASE) & ~both
+        self.mode[to_chase] = MODE_CHASE
+        self.mode[to_return] = MODE_RETURN
+        if to_return.any():
+            d = np.hypot(self.path[None, :, 0] - self.nx[to_return, None],
+                         self.path[None, :, 1] - self.nz[to_return, None])
+            self.return_idx[to_return] = d.argmin(axis=1)
+
+        roam = m & (self.mode == MODE_ROAM)
+        chase = m & (self.mode == MODE_CHASE)
+        ret = m & (self.mode == MODE_RETURN)
+        tgt = self.path[np.where(ret, self.return_idx, self.path_idx)]
+        tx = np.where(chase, self.ax, tgt[:, 0])
+        tz = np.where(chase, self.az, tgt[:, 1])
+
+        dx = tx - self.nx
+        dz = tz - self.nz
+        dist = np.hypot(dx, dz)
+        mv = m & (dist >= 0.001)
+        safe = np.where(mv, dist, 1.0)
+        dir_x = dx / safe
+        dir_z = dz / safe
+        step = self.n_speed * dt
+        self.nx = np.where(mv, self.nx + dir_x * step, self.nx)
+        self.nz = np.where(mv, self.nz + dir_z * step, self.nz)
+        self.nyaw = np.where(mv, np.degrees(np.arctan2(dir_x, dir_z)), self.nyaw)
+
+        self.n_walk[m] = True
+        arrived = dist < 0.15
+        hit = roam & arrived
+        self.path_idx[hit] = (self.path_idx[hit] + 1) % len(self.path)
+        self.n_walk[hit] = False
+        back = ret & arrived
+        self.path_idx[back] = self.return_idx[back]
+        self.mode[back] = MODE_ROAM
+        self.n_walk[back] = False
+
+    def step(self, actions, dt=None):
+        """Advance every world one tick.
+
+        Returns a dict of boolean event arrays: ``caught`` ``(B,)`` and
+        ``deactivated`` / ``exploded`` ``(B, n_bombs)``.
+        """
+        dt = self.dt if dt is None else dt
+        actions = np.broadcast_to(np.asarray(actions, dtype=np.int64), (self.B,))
+        deactivated = np.zeros((self.B, self.n_bombs), dtype=bool)
+        self.time += dt
+        self.tick += 1
+        # A carried bomb's timer is paused: push its start forward instead.
+        self.bomb_start += dt * self.bomb_carried
+
+        m = ~self.game_over
+        self._handle_action(m & ((actions & IN_ACTION) != 0))
+        # Long ticks are sub-stepped as in ``sim`` (one count for the whole batch).
+        k = substeps(WALK_SPEED * dt)
+        for _ in range(k):
+            self._process_input(m, actions, dt / k)
+        self._update_carry_anim(m, dt, deactivated)
+        self._animate_legs(m, self.a_walk, self.a_t, self.a_leg_l, self.a_leg_r, dt)
+        k = substeps(float(self.n_speed.max()) * dt) if self.B else 1
+        for _ in range(k):
+            self._update_npc(m, dt / k)
+            self._animate_legs(m, self.n_walk, self.n_t, self.n_leg_l, self.n_leg_r, dt / k)
+
+        caught = m & (np.hypot(self.ax - self.nx, self.az - self.nz) < 0.7)
+        self.game_over |= caught
+        self.a_walk[caught] = False
+        self.n_walk[caught] = False
+
+        remaining = np.maximum(0, self.bomb_timer - (self.time[:, None] - self.bomb_start))
+        exploded = (self.bomb_active & ~self.bomb_deactivated & ~self.bomb_carried
+                    & (remaining <= 0) & ~self.bomb_exploded)
+        self.bomb_exploded |= exploded
+        self.bomb_active &= ~exploded
+        self.game_over |= exploded.any(axis=1)
+
+        return {"caught": caught, "deactivated": deactivated, "exploded": exploded}
+
+
+def max_divergence(batch, worlds):
+    """Largest absolute difference in continuous state between ``batch`` and
+    a list of scalar ``sim.World`` objects, plus a count of discrete mismatches."""
+    err = 0.0
+    mismatches = 0
+    for i, w in enumerate(worlds):
+        a, n = w.agent, w.npcs
+        err = max(err,
+                  abs(batch.ax[i] - a.x), abs(batch.az[i] - a.z), abs(batch.ayaw[i] - a.yaw),
+                  abs(batch.a_leg_l[i] - a.leg_l), abs(batch.nx[i] - n.x[0]), abs(batch.nz[i] - n.z[0]),
+                  abs(batch.n_leg_l[i] - n.leg_l[0]))
+        for j, b in enumerate(w.bombs):
+            err = max(err, *(abs(batch.bomb_pos[i, j, k] - b.world_pos[k]) for k in range(3)))
+            mismatches += (batch.bomb_carried[i, j] != b.carried) + (batch.bomb_exploded[i, j] != b.exploded) \
+                + (batch.bomb_deactivated[i, j] != b.deactivated)
+        carrying = -1 if a.carrying_index is None else a.carrying_index
+        mismatches += (batch.carrying[i] != carrying) + (ANIM_NAMES[batch.anim[i]] != a.anim_state) \
+            + (batch.mode[i] != n.mode[0]) + (batch.path_idx[i] != n.path_idx[0]) \
+            + (bool(batch.game_over[i]) != w.game_over) + (bool(batch.a_walk[i]) != (a.state == 'walk')) \
+            + (batch.n_walk[i] != n.walk[0])
+    return err, int(mismatches)
+
+def check_against_scalar(batch_size=32, ticks=2000, seed=0, dt=TICK_DT):
+    """Step a BatchEnv and the same number of scalar Worlds with identical
+    random actions and return ``max_divergence`` after every tick's worst case."""
+    rng = np.random.default_rng(seed)
+    batch = BatchEnv(batch_size, dt=dt)
+    worlds = [World(navigation=False) for _ in range(batch_size)]
+    held = rng.integers(0, 16, size=batch_size)
+    worst_err, worst_mis = 0.0, 0
+    for _ in range(ticks):
+        flip = rng.random(batch_size) < 0.05
+        held = np.where(flip, rng.integers(0, 16, size=batch_size), held)
+        actions = held | np.where(rng.random(batch_size) < 0.03, IN_ACTION, 0)
+        done = batch.game_over.copy()
+        batch.reset(done)
+        for i, w in enumerate(worlds):
+            if w.game_over:
+                w.reset()
+            w.step(int(actions[i]), batch.dt)
+        batch.step(actions)
+        err, mis = max_divergence(batch, worlds)
+        worst_err = max(worst_err, err); worst_mis = max(worst_mis, mis)
+    return worst_err, worst_mis
+
+if __name__ == "__main__":
+    err, mis = check_against_scalar()
+    print(f"error absoluto máximo {err:.3e}, discrepancias discretas {mis}")
@@ -0,0 +1,387 @@
+"""Deterministic benchmark scenarios for the simulation and the renderer.
+
+    python benchmark.py                      # run, compare with bench_baseline.json
+    python benchmark.py --update-baseline    # run and store the results as the new baseline
+    python benchmark.py --no-render          # simulation only
+    python benchmark.py --startup            # import time and time to the first frame
+
+Rendering uses an offscreen EGL context (Mesa llvmpipe works), so it runs
+on a headless Linux box. Raw ticks/s and frame times are reported as-is;
+the pass/fail gate uses ``sim_score`` and ``render_score``, which are
+normalized by a calibration loop timed next to each measurement. The
+process exits with status 1 when a score regresses by more than
+``--tolerance``.
+"""
+import argparse
+import ctypes
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import time
+
+import sim
+from level import default_level
+from collision import generated_walls
+
+BASELINE_PATH = "bench_baseline.json"
+RESULTS_PATH = "bench_results.json"
+
+
+class Autopilot:
+    """Scripted input source: a list of ``("goto", x, z)``, ``("action",)``
+    and ``("wait", ticks)`` steps, optionally looped."""
+
+    def __init__(self, script, loop=False):
+        self.script = script
+        self.loop = loop
+        self.restart()
+
+    def restart(self):
+        self.pc = 0
+        self.wait = 0
+
+    def steer(self, agent, tx, tz):
+        desired = math.degrees(math.atan2(tx - agent.x, tz - agent.z))
+        diff = (desired - agent.yaw + 180.0) % 360.0 - 180.0
+        bits = 0
+        if diff > 4.0:
+            bits |= sim.IN_LEFT
+        elif diff < -4.0:
+            bits |= sim.IN_RIGHT
+        if abs(diff) < 30.0:
+            bits |= sim.IN_FORWARD
+        return bits
+
+    def __call__(self, world):
+        if self.pc >= len(self.script):
+            if not self.loop:
+                return 0
+            self.pc = 0
+        step = self.script[self.pc]
+        if step[0] == "goto":
+            _, tx, tz = step
+            if math.hypot(tx - world.agent.x, tz - world.agent.z) < 0.3:
+                self.pc += 1
+                return 0
+            return self.steer(world.agent, tx, tz)
+        if step[0] == "action":
+            self.pc += 1
+            return sim.IN_ACTION
+        if step[0] == "wait":
+            self.wait += 1
+            if self.wait >= step[1]:
+                self.wait = 0
+                self.pc += 1
+            return 0
+        raise ValueError(f"unknown script step {step!r}")
+
+class Constant:
+    def __init__(self, bits, action_every=0):
+        self.bits = bits
+        self.action_every = action_every
+        self.n = 0
+
+    def restart(self):
+        self.n = 0
+
+    def __call__(self, world):
+        self.n += 1
+        if self.action_every and self.n % self.action_every == 0:
+            return self.bits | sim.IN_ACTION
+        return self.bits
+
+
+def park_npc(world):
+    world.npcs.x[0], world.npcs.z[0] = 60.0, 60.0
+    world.npcs.speed[0] = 0.0
+
+def scenario_idle():
+    world = sim.World()
+    world.agent.z = -20.0
+    return world, Constant(0), None
+
+def scenario_patrol():
+    world = sim.World()
+    path = sim.NPCState(default_level().guards[0]).path
+    return world, Autopilot([("goto", x, z) for x, z in path], loop=True), None
+
+def scenario_pickup_deactivate():
+    world = sim.World()
+    park_npc(world)
+    script = [("goto", 0.0, -2.2), ("action",), ("wait", 40),
+              ("goto", 0.0, 10.0), ("goto", -20.0, 10.0), ("goto", -20.0, 1.0),
+              ("action",), ("wait", 40)]
+    return world, Autopilot(script), park_npc
+
+def scenario_chase():
+    world = sim.World()
+    return world, Constant(sim.IN_FORWARD | sim.IN_LEFT), None
+
+def scenario_stress(walls=20000, bombs=500):
+    world = sim.World()
+    world.rebuild_level(generated_walls(walls, extent=85.0, seed=3))
+    rng = random.Random(5)
+    spawns = [(rng.uniform(-80, 80), rng.uniform(-80, 80), 1e9) for _ in range(bombs)]
+    world.reset(spawns)
+    reset = lambda w: w.reset(spawns)
+    return world, Constant(sim.IN_FORWARD | sim.IN_LEFT, action_every=30), reset
+
+def scenario_guards(n=200):
+    rng = random.Random(7)
+    guards = []
+    for _ in range(n):
+        g = sim.NPCState(default_level().guards[0])
+        g.x, g.z = rng.uniform(-70, 70), rng.uniform(-70, 70)
+        g.path = [(g.x + rng.uniform(-8, 8), g.z + rng.uniform(-8, 8)) for _ in range(4)]
+        g.current_idx = 0
+        guards.append(g)
+    world = sim.World(guards=guards)
+    reset = lambda w: w.reset(guards=guards)
+    return world, Constant(sim.IN_FORWARD | sim.IN_LEFT), reset
+
+SCENARIOS = {
+    "idle": scenario_idle,
+    "patrol": scenario_patrol,
+    "pickup_deactivate": scenario_pickup_deactivate,
+    "chase": scenario_chase,
+    "stress": scenario_stress,
+    "guards": scenario_guards,
+}
+
+
+def state_digest(world):
+    a, n = world.agent, world.npcs
+    parts = [a.x, a.z, a.yaw, *n.x.tolist(), *n.z.tolist(), world.time] + [c for b in world.bombs for c in b.world_pos]
+    return hashlib.sha1(repr([round(v, 9) for v in parts]).encode()).hexdigest()[:16]
+
+def run_ticks(world, controller, on_reset, ticks, each_tick=None):
+    events = []
+    for _ in range(ticks):
+        if world.game_over:
+            world.reset()
+            if on_reset:
+                on_reset(world)
+            controller.restart()
+        events.extend(world.step(controller(world), sim.TICK_DT))
+        if each_tick:
+            each_tick()
+    return events
+
+CHUNK_TICKS = 200
+
+def calibration_unit():
+    """Seconds for a fixed pure-Python workload, timed next to every chunk so
+    results can be normalized against how fast the machine is right now."""
+    t = time.perf_counter()
+    acc = 0.0
+    for i in range(20000):
+        acc += math.hypot(i * 0.5, acc * 1e-9)
+    return time.perf_counter() - t
+
+def bench_sim(name, ticks, repeat):
+    """Ticks per second over ``ticks`` ticks. The run is timed in chunks and,
+    since every repeat does identical work, each chunk keeps its fastest
+    time. ``sim_score`` divides each chunk by a calibration loop timed right
+    before it, which cancels most of the drift on shared machines."""
+    best = score = None
+    for _ in range(repeat):
+        world, controller, on_reset = SCENARIOS[name]()
+        if on_reset:
+            on_reset(world)
+        events, chunks, units = [], [], []
+        for start in range(0, ticks, CHUNK_TICKS):
+            units.append(calibration_unit())
+            t = time.perf_counter()
+            events += run_ticks(world, controller, on_reset, min(CHUNK_TICKS, ticks - start))
+            chunks.append(time.perf_counter() - t)
+        rel = [c / u for c, u in zip(chunks, units)]
+        best = chunks if best is None else [min(a, b) for a, b in zip(best, chunks)]
+        score = rel if score is None else [min(a, b) for a, b in zip(score, rel)]
+    kinds = sorted({k for k, _ in events})
+    return {"sim_ticks_per_s": ticks / sum(best), "sim_score": ticks / sum(score),
+            "ticks": ticks, "events": kinds, "digest": state_digest(world)}
+
+
+def make_offscreen_context(width, height):
+    """Current OpenGL compatibility context on an EGL pbuffer, no display needed."""
+    from OpenGL import EGL
+    display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    if not EGL.eglInitialize(display, None, None):
+        raise RuntimeError("eglInitialize failed")
+    config = EGL.EGLConfig()
+    n = EGL.EGLint()
+    attrs = (EGL.EGLint * 9)(EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+                             EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+                             EGL.EGL_DEPTH_SIZE, 24, EGL.EGL_RED_SIZE, 8, EGL.EGL_NONE)
+    EGL.eglChooseConfig(display, attrs, ctypes.pointer(config), 1, ctypes.pointer(n))
+    if n.value < 1:
+        raise RuntimeError("no EGL config with desktop OpenGL support")
+    surface = EGL.eglCreatePbufferSurface(display, config, (EGL.EGLint * 5)(
+        EGL.EGL_WIDTH, width, EGL.EGL_HEIGHT, height, EGL.EGL_NONE))
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, None)
+    if not EGL.eglMakeCurrent(display, surface, surface, context):
+        raise RuntimeError("eglMakeCurrent failed")
+    return display, surface, context
+
+def bench_render(name, frames):
+    import numpy as np
+    import render
+    from main import hud_lines
+    from OpenGL.GL import glFinish
+
+    world, controller, on_reset = SCENARIOS[name]()
+    if on_reset:
+        on_reset(world)
+    render.init(world)
+
+    times, units = [], []
+    def frame():
+        units.append(calibration_unit())
+        t = time.perf_counter()
+        render.draw_scene()
+        render.draw_hud(hud_lines(world))
+        glFinish()
+        times.append(time.perf_counter() - t)
+    run_ticks(world, controller, on_reset, frames, each_tick=frame)
+    times, units = np.array(times[5:]), np.array(units[5:])
+    return {"render_frame_ms_p50": float(np.percentile(times, 50) * 1e3),
+            "render_frame_ms_p95": float(np.percentile(times, 95) * 1e3),
+            "render_score": float(np.percentile(times / units, 50))}
+
+
+# Runs in a fresh interpreter per sample: the ``t_*`` are seconds since
+# before ``import main``, as each step of opening the game completes.
+STARTUP_CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+import main
+t = {"import_main": time.perf_counter() - t0, "gl_in_main": "OpenGL" in sys.modules}
+try:
+    import render
+    from OpenGL.GL import glFinish
+    t["import_render"] = time.perf_counter() - t0
+    from benchmark import make_offscreen_context
+    make_offscreen_context(render.WIN_W, render.WIN_H)
+    world = main.World()
+    render.init(world)
+    render.draw_scene()
+    render.draw_hud(main.hud_lines(world))
+    glFinish()
+    t["first_frame"] = time.perf_counter() - t0
+except Exception as e:
+    t["error"] = repr(e)
+print(json.dumps(t))
+"""
+
+def bench_startup(repeat):
+    """Median time to ``import main``, to also import the GL renderer, and
+    to the first frame drawn offscreen, each over ``repeat`` fresh processes."""
+    import subprocess
+    env = dict(os.environ, PYOPENGL_PLATFORM=os.environ.get("PYOPENGL_PLATFORM", "egl"),
+               EGL_PLATFORM=os.environ.get("EGL_PLATFORM", "surfaceless"))
+    runs = [json.loads(subprocess.run([sys.executable, "-c", STARTUP_CHILD], env=env, check=True,
+                                      capture_output=True, text=True).stdout)
+            for _ in range(repeat)]
+    out = {"gl_in_main": any(r["gl_in_main"] for r in runs)}
+    for k in ("import_main", "import_render", "first_frame"):
+        times = sorted(r[k] for r in runs if k in r)
+        if times:
+            out[k + "_ms"] = times[len(times) // 2] * 1e3
+    if "error" in runs[0]:
+        out["error"] = runs[0]["error"]
+    return out
+
+
+# Raw timings are reported; only the calibrated scores decide pass/fail.
+GATED = {"sim_score": True, "render_score": False}   # metric -> higher is better
+
+def compare(results, baseline, tolerance):
+    failures = []
+    for name, metrics in results.items():
+        base = baseline.get(name, {})
+        for key, value in metrics.items():
+            ref = base.get(key)
+            if not isinstance(value, float) or not isinstance(ref, float):
+                continue
+            higher = GATED.get(key, key.endswith("_per_s"))
+            change = (ref - value) / ref if higher else (value - ref) / ref
+            if key not in GATED:
+                status = ""
+            elif change > tolerance:
+                status = "REGRESSION"
+                failures.append((name, key))
+            else:
+                status = "ok"
+            print(f"  {name:<18} {key:<22} {value:>12.3f}  baseline {ref:>12.3f}  {-change*100:+6.1f}%  {status}")
+        if base.get("ticks") == metrics.get("ticks") and base.get("digest") not in (None, metrics["digest"]):
+            print(f"  {name:<18} final state differs from baseline (behaviour changed?)")
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS), help="subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--ticks", type=int, default=6000)
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-render", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="allowed relative slowdown (default 0.20)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--startup", action="store_true",
+                        help="only time importing main.py and drawing the first frame, in fresh processes")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        res = bench_startup(max(args.repeat, 3))
+        for k, v in res.items():
+            print(f"{k:<20} {v:.1f}" if isinstance(v, float) else f"{k:<20} {v}")
+        if res["gl_in_main"]:
+            print("[!] importar main.py carga OpenGL")
+        return 1 if res["gl_in_main"] else 0
+
+    render = not args.no_render
+    if render:
+        os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+        os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+        try:
+            make_offscreen_context(1280, 720)
+        except Exception as e:
+            print(f"[!] Sin contexto OpenGL offscreen ({e!r}); solo se mide la simulación.")
+            render = False
+
+    results = {}
+    for name in args.scenarios:
+        res = bench_sim(name, args.ticks, args.repeat)
+        if render:
+            res.update(bench_render(name, args.frames))
+        results[name] = res
+        print(f"{name:<18} " + "  ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in res.items()))
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline guardado en {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No hay baseline en {args.baseline}; usa --update-baseline.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    print(f"Comparando con {args.baseline} (tolerancia {args.tolerance:.0%}):")
+    failures = compare(results, baseline, args.tolerance)
+    if failures:
+        print(f"{len(failures)} regresiones.")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
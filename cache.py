@@ -0,0 +1,9 @@
+"""Where the game keeps data it derives and can always rebuild: texture
+mip chains and baked level data."""
+import os
+
+
+def cache_dir(kind):
+    """``$XDG_CACHE_HOME/m4-game/<kind>`` (``~/.cache/m4-game/<kind>`` by default)."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "m4-game", kind)
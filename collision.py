@@ -0,0 +1,221 @@
+import math
+import random
+import time
+
+import numpy as np
+
+CELL_SIZE = 2.0
+
+def expanded_extents(walls, expand):
+    """(W, 4) array of ``minx, maxx, minz, maxz`` for ``(cx,cy,cz,sx,sy,sz)`` walls."""
+    w = np.asarray(walls, dtype=np.float64).reshape(-1, 6)
+    cx, cz, sx, sz = w[:, 0], w[:, 2], w[:, 3], w[:, 5]
+    return np.stack([cx - sx/2 - expand, cx + sx/2 + expand,
+                     cz - sz/2 - expand, cz + sz/2 + expand], axis=1)
+
+
+class WallGrid:
+    """Static uniform-grid index over wall AABBs, built once per level.
+
+    Extents are pre-expanded by ``expand`` (the agent radius), so a point
+    query is a single cell lookup followed by a handful of range tests.
+    Each wall is stored in every cell its expanded box overlaps. ``baked``
+    loads the grid from a ``level.BakeCache`` instead of rebuilding it.
+
+    ``blocked`` only looks at a point, which is enough for moves along one
+    axis shorter than ``thinnest`` (the thinnest expanded wall); ``crossed``
+    also sweeps the path of any other move.
+    """
+
+    def __init__(self, walls, expand, cell_size=CELL_SIZE):
+        self.expand = expand
+        self.cell_size = cell_size
+        self.ext = expanded_extents(walls, expand)
+        n = len(self.ext)
+        if n:
+            self.ox = float(self.ext[:, 0].min())
+            self.oz = float(self.ext[:, 2].min())
+            self.nx = int(math.floor((self.ext[:, 1].max() - self.ox) / cell_size)) + 1
+            self.nz = int(math.floor((self.ext[:, 3].max() - self.oz) / cell_size)) + 1
+        else:
+            self.ox = self.oz = 0.0
+            self.nx = self.nz = 0
+
+        cells = [[] for _ in range(self.nx * self.nz)]
+        i0 = np.floor((self.ext[:, 0] - self.ox) / cell_size).astype(np.int64)
+        i1 = np.floor((self.ext[:, 1] - self.ox) / cell_size).astype(np.int64)
+        k0 = np.floor((self.ext[:, 2] - self.oz) / cell_size).astype(np.int64)
+        k1 = np.floor((self.ext[:, 3] - self.oz) / cell_size).astype(np.int64)
+        for w in range(n):
+            for k in range(k0[w], k1[w] + 1):
+                row = k * self.nx
+                for i in range(i0[w], i1[w] + 1):
+                    cells[row + i].append(w)
+
+        # Padded (cells, max_per_cell) index table for batched queries; the
+        # scalar path walks per-cell tuples of plain floats instead.
+        width = max((len(c) for c in cells), default=0)
+        self.cell_table = np.full((len(cells), max(width, 1)), -1, dtype=np.int32)
+        for c, items in enumerate(cells):
+            self.cell_table[c, :len(items)] = items
+        self._finish()
+
+    def _finish(self):
+        self._ext_pad = np.vstack([self.ext, [[np.inf, -np.inf, np.inf, -np.inf]]])
+        if len(self.ext):
+            self.thinnest = float(np.minimum(self.ext[:, 1] - self.ext[:, 0], self.ext[:, 3] - self.ext[:, 2]).min())
+        else:
+            self.thinnest = math.inf
+        # Per-cell tuples of plain-float extents, built on first use.
+        self._cells = [None] * (self.nx * self.nz)
+
+    @classmethod
+    def from_arrays(cls, ext, cell_table, ox, oz, nx, nz, expand, cell_size=CELL_SIZE):
+        grid = cls.__new__(cls)
+        grid.expand, grid.cell_size = expand, cell_size
+        grid.ext, grid.cell_table = ext, cell_table
+        grid.ox, grid.oz, grid.nx, grid.nz = ox, oz, nx, nz
+        grid._finish()
+        return grid
+
+    @classmethod
+    def baked(cls, cache, walls, expand, cell_size=CELL_SIZE):
+        """The grid of ``walls`` from ``cache``, built and stored on first use."""
+        def build():
+            g = cls(walls, expand, cell_size)
+            return {"ext": g.ext, "cell_table": g.cell_table}, {"ox": g.ox, "oz": g.oz, "nx": g.nx, "nz": g.nz}
+        arrays, meta = cache.load(f"collision_{expand}_{cell_size}", build)
+        return cls.from_arrays(arrays["ext"], arrays["cell_table"], expand=expand, cell_size=cell_size, **meta)
+
+    def _walls_in(self, c):
+        row = self.cell_table[c]
+        walls = self._cells[c] = tuple(map(tuple, self.ext[row[row >= 0]].tolist()))
+        return walls
+
+    def _cell(self, px, pz):
+        i = math.floor((px - self.ox) / self.cell_size)
+        k = math.floor((pz - self.oz) / self.cell_size)
+        if 0 <= i < self.nx and 0 <= k < self.nz:
+            return k * self.nx + i
+        return -1
+
+    def blocked(self, px, pz):
+        c = self._cell(px, pz)
+        if c < 0:
+            return False
+        walls = self._cells[c]
+        if walls is None:
+            walls = self._walls_in(c)
+        for minx, maxx, minz, maxz in walls:
+            if minx <= px <= maxx and minz <= pz <= maxz:
+                return True
+        return False
+
+    def crossed(self, x0, z0, x1, z1):
+        """Whether moving from ``(x0, z0)`` to ``(x1, z1)`` ends in a wall or
+        passes through one it did not start in."""
+        if self.blocked(x1, z1):
+            return True
+        dx, dz = x1 - x0, z1 - z0
+        if (dx == 0.0 and abs(dz) < self.thinnest) or (dz == 0.0 and abs(dx) < self.thinnest):
+            return False
+        cs = self.cell_size
+        i0 = max(0, math.floor((min(x0, x1) - self.ox) / cs))
+        i1 = min(self.nx - 1, math.floor((max(x0, x1) - self.ox) / cs))
+        k0 = max(0, math.floor((min(z0, z1) - self.oz) / cs))
+        k1 = min(self.nz - 1, math.floor((max(z0, z1) - self.oz) / cs))
+        for k in range(k0, k1 + 1):
+            for i in range(i0, i1 + 1):
+                c = k * self.nx + i
+                walls = self._cells[c]
+                if walls is None:
+                    walls = self._walls_in(c)
+                for minx, maxx, minz, maxz in walls:
+                    if minx <= x0 <= maxx and minz <= z0 <= maxz:
+                        continue
+                    if _segment_hits(minx, maxx, minz, maxz, x0, z0, dx, dz):
+                        return True
+        return False
+
+    def blocked_many(self, px, pz):
+        """Vectorized ``blocked`` over equally shaped 1-D arrays of points."""
+        px = np.asarray(px, dtype=np.float64); pz = np.asarray(pz, dtype=np.float64)
+        i = np.floor((px - self.ox) / self.cell_size).astype(np.int64)
+        k = np.floor((pz - self.oz) / self.cell_size).astype(np.int64)
+        inside = (i >= 0) & (i < self.nx) & (k >= 0) & (k < self.nz)
+        c = np.where(inside, k * self.nx + i, 0)
+        cand = self._ext_pad[self.cell_table[c]]
+        px = px[:, None]; pz = pz[:, None]
+        hit = ((cand[..., 0] <= px) & (px <= cand[..., 1])
+               & (cand[..., 2] <= pz) & (pz <= cand[..., 3])).any(axis=1)
+        return hit & inside
+
+    def crossed_many(self, x0, z0, x1, z1):
+        """Vectorized ``crossed``; the few moves that need sweeping are swept
+        one at a time."""
+        hit = self.blocked_many(x1, z1)
+        dx, dz = np.abs(x1 - x0), np.abs(z1 - z0)
+        short = ((dx == 0.0) & (dz < self.thinnest)) | ((dz == 0.0) & (dx < self.thinnest))
+        for i in np.flatnonzero(~hit & ~short).tolist():
+            hit[i] = self.crossed(float(x0[i]), float(z0[i]), float(x1[i]), float(z1[i]))
+        return hit
+
+
+def _segment_hits(minx, maxx, minz, maxz, x, z, dx, dz):
+    """Whether the segment from ``(x, z)`` to ``(x + dx, z + dz)`` touches the box (slab test)."""
+    t0, t1 = 0.0, 1.0
+    for lo, hi, p, d in ((minx, maxx, x, dx), (minz, maxz, z, dz)):
+        if d == 0.0:
+            if not lo <= p <= hi:
+                return False
+            continue
+        a, b = (lo - p) / d, (hi - p) / d
+        if a > b:
+            a, b = b, a
+        t0, t1 = max(t0, a), min(t1, b)
+        if t0 > t1:
+            return False
+    return True
+
+def linear_blocked(px, pz, walls, expand):
+    """Reference scan over every wall, as ``move_with_collisions`` used to do."""
+    for cx, cy, cz, sx, sy, sz in walls:
+        if (cx - sx/2 - expand <= px <= cx + sx/2 + expand
+                and cz - sz/2 - expand <= pz <= cz + sz/2 + expand):
+            return True
+    return False
+
+def generated_walls(n, extent=500.0, seed=0):
+    """``n`` random axis-aligned wall segments inside ``[-extent, extent]^2``."""
+    rng = random.Random(seed)
+    walls = []
+    for _ in range(n):
+        cx = rng.uniform(-extent, extent); cz = rng.uniform(-extent, extent)
+        length = rng.uniform(1.0, 8.0)
+        if rng.random() < 0.5:
+            walls.append((cx, 1.5, cz, length, 3.0, 0.25))
+        else:
+            walls.append((cx, 1.5, cz, 0.25, 3.0, length))
+    return walls
+
+def benchmark(wall_counts=(19, 100, 1000, 10000, 30000), queries=2000, expand=0.35):
+    rng = random.Random(1)
+    print(f"{'paredes':>8} {'lineal us/c':>12} {'rejilla us/c':>13} {'mejora':>8}")
+    for n in wall_counts:
+        walls = generated_walls(n)
+        grid = WallGrid(walls, expand)
+        pts = [(rng.uniform(-500, 500), rng.uniform(-500, 500)) for _ in range(queries)]
+        reps = max(1, 20000 // (n + 1))
+        t = time.perf_counter()
+        for _ in range(reps):
+            ref = [linear_blocked(x, z, walls, expand) for x, z in pts]
+        lin = (time.perf_counter() - t) / (reps * queries)
+        t = time.perf_counter()
+        for _ in range(20):
+            got = [grid.blocked(x, z) for x, z in pts]
+        grd = (time.perf_counter() - t) / (20 * queries)
+        assert got == ref
+        print(f"{n:>8} {lin*1e6:>12.2f} {grd*1e6:>13.2f} {lin/grd:>8.1f}x")
+
+if __name__ == "__main__":
+    benchmark()
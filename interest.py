@@ -0,0 +1,137 @@
+"""Per-client interest management for ``net.GameServer``.
+
+Each snapshot tick, players and NPCs are bucketed in a ``SpatialHash``.
+Each client gets the ones in its player's room (the level's ``rooms``),
+the ones within ``near`` of the player, and the ones within ``view`` that
+are inside the chase camera's field of view. Once sent, an entity keeps
+being sent until it fails the same tests with radii ``hysteresis`` times
+larger and a cone ``angle_margin`` degrees wider, so nothing flickers on
+a boundary. Bombs are the objective and the HUD lists every timer, so
+every client always gets all of them.
+"""
+import math
+
+import numpy as np
+
+NEAR_RADIUS = 12.0
+VIEW_RADIUS = 40.0
+VIEW_HALF_ANGLE = 60.0
+CAMERA_BACK = 12.0      # the chase camera sits this far behind the player (render.set_camera)
+HYSTERESIS = 1.25
+ANGLE_MARGIN = 15.0
+HASH_CELL = 8.0
+
+
+def room_of(x, z, rooms):
+    """Index into ``rooms`` of the room holding each point, -1 outside."""
+    r = np.asarray(rooms, dtype=np.float64).reshape(-1, 4)
+    inside = (r[:, 0] <= x[:, None]) & (x[:, None] <= r[:, 2]) & (r[:, 1] <= z[:, None]) & (z[:, None] <= r[:, 3])
+    return np.where(inside.any(axis=1), inside.argmax(axis=1), -1)
+
+
+class SpatialHash:
+    """Points bucketed into square cells and sorted by cell key, so the
+    cells of one row of a query are a single contiguous slice."""
+
+    def __init__(self, x, z, cell=HASH_CELL):
+        self.cell = cell
+        self.n = len(x)
+        if not self.n:
+            return
+        cx = np.floor(x / cell).astype(np.int64)
+        cz = np.floor(z / cell).astype(np.int64)
+        self.ox, self.oz = int(cx.min()), int(cz.min())
+        self.cols = int(cx.max()) - self.ox + 1
+        self.rows = int(cz.max()) - self.oz + 1
+        keys = (cz - self.oz) * self.cols + (cx - self.ox)
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+
+    def query(self, x, z, radius):
+        """Indices of the points in the cells overlapping the square of
+        half-side ``radius`` around ``(x, z)`` (a superset of the circle)."""
+        if not self.n:
+            return np.zeros(0, dtype=np.int64)
+        c0 = max(0, math.floor((x - radius) / self.cell) - self.ox)
+        c1 = min(self.cols - 1, math.floor((x + radius) / self.cell) - self.ox)
+        r0 = max(0, math.floor((z - radius) / self.cell) - self.oz)
+        r1 = min(self.rows - 1, math.floor((z + radius) / self.cell) - self.oz)
+        if c0 > c1 or r0 > r1:
+            return np.zeros(0, dtype=np.int64)
+        rows = np.arange(r0, r1 + 1) * self.cols
+        starts = np.searchsorted(self.keys, rows + c0, "left")
+        ends = np.searchsorted(self.keys, rows + c1, "right")
+        return np.concatenate([self.order[s:e] for s, e in zip(starts.tolist(), ends.tolist())])
+
+
+class InterestManager:
+    """Chooses, per client, which rows of each snapshot section it receives.
+
+    ``begin`` evaluates every client in one vectorized pass per section:
+    the (client, candidate) pairs from the spatial hash are tested together.
+    """
+
+    def __init__(self, near=NEAR_RADIUS, view=VIEW_RADIUS, half_angle=VIEW_HALF_ANGLE,
+                 hysteresis=HYSTERESIS, angle_margin=ANGLE_MARGIN, cell=HASH_CELL):
+        self.near, self.view, self.half_angle = near, view, half_angle
+        self.hysteresis, self.angle_margin = hysteresis, angle_margin
+        self.cell = cell
+        self.visible = {}     # section -> keys (player id << 16 | entity id) sent last time
+        self.rows = {}        # (player id, section) -> sorted rows for this tick
+
+    def _relevant(self, d, same_room, vx, vz, fx, fz, scale, margin):
+        cos_limit = math.cos(math.radians(min(180.0, self.half_angle + margin)))
+        in_cone = vx * fx + vz * fz >= cos_limit * np.hypot(vx, vz)
+        return same_room | (d < self.near * scale) | (in_cone & (d < self.view * scale))
+
+    def begin(self, world):
+        """Pick this tick's rows for every player in ``world``."""
+        agents = sorted(world.agents.items())
+        pids = np.array([pid for pid, _ in agents], dtype=np.int64)
+        ax = np.array([a.x for _, a in agents])
+        az = np.array([a.z for _, a in agents])
+        yaw = np.radians([a.yaw for _, a in agents])
+        fx, fz = np.sin(yaw), np.cos(yaw)
+        camx, camz = ax - fx * CAMERA_BACK, az - fz * CAMERA_BACK
+        rooms = world.level.rooms
+        aroom = room_of(ax, az, rooms)
+        n = world.npcs
+        sections = {"players": (pids, ax, az), "npcs": (np.arange(len(n)), n.x, n.z)}
+        self.rows = {}
+        for name, (ids, x, z) in sections.items():
+            grid = SpatialHash(x, z, self.cell)
+            cand = [grid.query(px, pz, self.view * self.hysteresis) for px, pz in zip(ax.tolist(), az.tolist())]
+            owner = np.repeat(np.arange(len(agents)), [len(c) for c in cand])
+            cand = np.concatenate(cand) if cand else np.zeros(0, np.int64)
+            order = np.lexsort((cand, owner))
+            owner, cand = owner[order], cand[order]
+
+            ex, ez = x[cand], z[cand]
+            d = np.hypot(ex - ax[owner], ez - az[owner])
+            same_room = (room_of(ex, ez, rooms) == aroom[owner]) & (aroom[owner] >= 0)
+            vx, vz = ex - camx[owner], ez - camz[owner]
+            f = fx[owner], fz[owner]
+            enter = self._relevant(d, same_room, vx, vz, *f, 1.0, 0.0)
+            keep = self._relevant(d, same_room, vx, vz, *f, self.hysteresis, self.angle_margin)
+            keys = pids[owner] << 16 | ids[cand]
+            prev = self.visible.get(name)
+            if prev is not None:
+                enter |= keep & np.isin(keys, prev)
+            if name == "players":
+                enter |= ids[cand] == pids[owner]
+            self.visible[name] = keys[enter]
+            owner, cand = owner[enter], cand[enter]
+            bounds = np.searchsorted(owner, np.arange(len(agents) + 1)).tolist()
+            for i, pid in enumerate(pids.tolist()):
+                self.rows[(pid, name)] = cand[bounds[i]:bounds[i + 1]]
+
+    def forget(self, pid):
+        for name, keys in self.visible.items():
+            self.visible[name] = keys[keys >> 16 != pid]
+
+    def filter(self, pid, state):
+        """``state`` (from ``net.quantize``) cut down to what ``pid`` gets."""
+        out = dict(state)
+        for name in ("players", "npcs"):
+            out[name] = state[name][self.rows[(pid, name)]]
+        return out
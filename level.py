@@ -0,0 +1,178 @@
+"""Level files and the binary data baked from them.
+
+A level is a JSON file (see ``levels/rooms.json``):
+
+* ``floor_size``: half-side of the square floor;
+* ``rooms``: ``{"rect": [x0, z0, x1, z1], "color": [r, g, b]}`` floors, which
+  also decide when a guard sees a player;
+* ``walls``: ``[cx, cy, cz, sx, sy, sz]`` boxes;
+* ``pads``: deactivation areas, ``{"rect": ..., "color": ...}``;
+* ``bombs``: ``first_round`` and ``later_rounds`` spawns, ``[x, z, timer]``;
+* ``guards``: ``{"x", "z", "speed", "start", "path": [[x, z], ...]}`` patrols.
+
+Everything derived from the geometry (collision grid, nav grid, static
+render buffers) is baked into ``.npy`` files under a hash of that geometry
+and memory-mapped on later loads, so a level only pays for it once::
+
+    python level.py bake levels/rooms.json       # bake ahead of time
+    python level.py bench --walls 20000          # cold bake vs mapped load
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from cache import cache_dir
+
+BAKE_VERSION = 1
+LEVEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "levels")
+DEFAULT_LEVEL = os.path.join(LEVEL_DIR, "rooms.json")
+PAD_COLOR = (120, 230, 120)
+
+
+class Level:
+    """The contents of one level file, as the tuples and dicts ``sim`` uses."""
+
+    def __init__(self, data, name="level"):
+        self.name = data.get("name", name)
+        self.floor_size = float(data["floor_size"])
+        self.room_floors = [(*map(float, r["rect"]), tuple(r["color"])) for r in data["rooms"]]
+        self.rooms = tuple(f[:4] for f in self.room_floors)
+        self.walls = [tuple(map(float, w)) for w in data["walls"]]
+        self.pads = [dict(zip(("x0", "z0", "x1", "z1"), map(float, p["rect"])), color=tuple(p.get("color", PAD_COLOR)))
+                     for p in data["pads"]]
+        bombs = data["bombs"]
+        self.first_spawns = [tuple(map(float, s)) for s in bombs["first_round"]]
+        self.round_spawns = [tuple(map(float, s)) for s in bombs.get("later_rounds", bombs["first_round"])]
+        self.guards = data.get("guards", [])
+
+    @classmethod
+    def load(cls, path=DEFAULT_LEVEL):
+        with open(path) as f:
+            return cls(json.load(f), os.path.splitext(os.path.basename(path))[0])
+
+
+_default_level = None
+
+def default_level():
+    """The built-in level (``DEFAULT_LEVEL``), read on first use and then shared."""
+    global _default_level
+    if _default_level is None:
+        _default_level = Level.load()
+    return _default_level
+
+
+def geometry_key(walls, room_floors, pads, floor_size):
+    """Content hash of everything the baked data is built from."""
+    h = hashlib.sha1(f"v{BAKE_VERSION}".encode())
+    h.update(np.asarray(walls, dtype=np.float64).reshape(-1, 6).tobytes())
+    h.update(json.dumps([[list(f) for f in room_floors],
+                         [[p["x0"], p["z0"], p["x1"], p["z1"], list(p["color"])] for p in pads],
+                         floor_size]).encode())
+    return h.hexdigest()
+
+
+class BakeCache:
+    """Bundles of arrays baked from one level geometry.
+
+    A bundle is a dict of arrays plus JSON metadata, stored as one ``.npy``
+    per array next to a ``.json`` that is written last, so a bundle is
+    either complete on disk or rebuilt.
+    """
+
+    def __init__(self, key, use_cache=True):
+        self.key = key
+        self.dir = os.path.join(cache_dir("levels"), key)
+        self.use_cache = use_cache
+
+    @classmethod
+    def of(cls, walls, room_floors, pads, floor_size, use_cache=True):
+        return cls(geometry_key(walls, room_floors, pads, floor_size), use_cache)
+
+    def load(self, name, build):
+        """``(arrays, meta)`` of bundle ``name``: memory-mapped from disk when
+        baked, else from ``build()`` (and stored)."""
+        path = os.path.join(self.dir, name)
+        if self.use_cache:
+            try:
+                with open(path + ".json") as f:
+                    meta = json.load(f)
+                arrays = {k: np.load(f"{path}.{k}.npy", mmap_mode="r") for k in meta["arrays"]}
+                return arrays, meta["meta"]
+            except (OSError, ValueError, KeyError):
+                pass
+
+        arrays, meta = build()
+        if self.use_cache:
+            try:
+                os.makedirs(self.dir, exist_ok=True)
+                for k, a in arrays.items():
+                    _write(f"{path}.{k}.npy", lambda f, a=a: np.save(f, np.ascontiguousarray(a)))
+                _write(path + ".json", lambda f: f.write(json.dumps({"arrays": list(arrays), "meta": meta}).encode()))
+            except OSError:
+                pass
+        return arrays, meta
+
+def _write(path, dump):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        dump(f)
+    os.replace(tmp, path)
+
+
+def bake(level, extra_walls=(), use_cache=True):
+    """Load (baking if needed) the collision grid, nav grid and static render
+    batches of ``level``. Returns the seconds spent on each."""
+    from collision import WallGrid
+    from navgrid import NavGrid
+    from sim import AGENT_RADIUS
+    from static_scene import load_static_scene
+
+    walls = level.walls + list(extra_walls)
+    cache = BakeCache.of(walls, level.room_floors, level.pads, level.floor_size, use_cache)
+    times = {}
+    t = time.perf_counter()
+    WallGrid.baked(cache, walls, AGENT_RADIUS)
+    times["colisión"] = time.perf_counter() - t
+    t = time.perf_counter()
+    NavGrid.baked(cache, walls)
+    times["navegación"] = time.perf_counter() - t
+    t = time.perf_counter()
+    load_static_scene(cache, walls, level.room_floors, level.pads, level.floor_size)
+    times["render"] = time.perf_counter() - t
+    return cache, times
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Niveles: horneado de datos binarios")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("bake", help="hornear un nivel")
+    p.add_argument("path", nargs="?", default=DEFAULT_LEVEL)
+    p = sub.add_parser("bench", help="horneado en frío contra carga mapeada")
+    p.add_argument("path", nargs="?", default=DEFAULT_LEVEL)
+    p.add_argument("--walls", type=int, default=20000, help="paredes aleatorias añadidas al nivel")
+    args = parser.parse_args(argv)
+
+    level = Level.load(args.path)
+    if args.cmd == "bake":
+        cache, times = bake(level)
+        print(f"{level.name}: {len(level.walls)} paredes -> {cache.dir}")
+        for name, t in times.items():
+            print(f"  {name:<11} {t*1e3:8.1f} ms")
+        return
+
+    from collision import generated_walls
+    extra = generated_walls(args.walls, extent=level.floor_size - 5, seed=3)
+    _, cold = bake(level, extra, use_cache=False)
+    bake(level, extra)
+    _, warm = bake(level, extra)
+    print(f"{level.name} + {args.walls} paredes")
+    print(f"  {'':<11} {'sin caché':>10} {'mapeado':>10}")
+    for name in cold:
+        print(f"  {name:<11} {cold[name]*1e3:8.1f} ms {warm[name]*1e3:8.1f} ms")
+    print(f"  {'total':<11} {sum(cold.values())*1e3:8.1f} ms {sum(warm.values())*1e3:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
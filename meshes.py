@@ -0,0 +1,206 @@
+import math
+
+import numpy as np
+
+# Unit cube as 6 quads: +x, -x, +y, -y, +z, -z.
+CUBE_QUADS = np.array([
+    [(+.5,-.5,-.5), (+.5,+.5,-.5), (+.5,+.5,+.5), (+.5,-.5,+.5)],
+    [(-.5,-.5,+.5), (-.5,+.5,+.5), (-.5,+.5,-.5), (-.5,-.5,-.5)],
+    [(-.5,+.5,+.5), (+.5,+.5,+.5), (+.5,+.5,-.5), (-.5,+.5,-.5)],
+    [(-.5,-.5,-.5), (+.5,-.5,-.5), (+.5,-.5,+.5), (-.5,-.5,+.5)],
+    [(-.5,-.5,+.5), (-.5,+.5,+.5), (+.5,+.5,+.5), (+.5,-.5,+.5)],
+    [(+.5,-.5,-.5), (+.5,+.5,-.5), (-.5,+.5,-.5), (-.5,-.5,-.5)],
+], dtype=np.float32)
+CUBE_NORMALS = np.array([(1,0,0), (-1,0,0), (0,1,0), (0,-1,0), (0,0,1), (0,0,-1)], dtype=np.float32)
+
+HEAD_RADIUS = 0.225
+CARGO_SIZE = 0.35
+
+class Mesh:
+    """Quad list with per-vertex positions and normals, ``(V, 3)`` float32 each."""
+
+    def __init__(self, positions, normals):
+        self.positions = np.ascontiguousarray(positions, dtype=np.float32)
+        self.normals = np.ascontiguousarray(normals, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.positions)
+
+def unit_cube():
+    return Mesh(CUBE_QUADS.reshape(-1, 3), np.repeat(CUBE_NORMALS, 4, axis=0))
+
+def unit_sphere(slices=14, stacks=14):
+    """Same tessellation as the old immediate-mode sphere, as quads of radius 1."""
+    lat = np.pi * (-0.5 + np.arange(stacks + 1) / stacks)
+    lng = 2 * np.pi * np.arange(slices + 1) / slices
+    ring = np.stack([np.cos(lng)[None, :] * np.cos(lat)[:, None],
+                     np.sin(lng)[None, :] * np.cos(lat)[:, None],
+                     np.broadcast_to(np.sin(lat)[:, None], (stacks + 1, slices + 1))], axis=-1)
+    quads = np.stack([ring[:-1, :-1], ring[1:, :-1], ring[1:, 1:], ring[:-1, 1:]], axis=2)
+    pos = quads.reshape(-1, 3)
+    return Mesh(pos, pos)
+
+_mesh_cache = {}
+
+def get_mesh(name, **params):
+    """Build each mesh once and hand back the cached arrays afterwards."""
+    key = (name, tuple(sorted(params.items())))
+    mesh = _mesh_cache.get(key)
+    if mesh is None:
+        mesh = _mesh_cache[key] = {"cube": unit_cube, "sphere": unit_sphere}[name](**params)
+    return mesh
+
+
+def translation(t):
+    t = np.asarray(t, dtype=np.float64)
+    m = np.tile(np.eye(4), t.shape[:-1] + (1, 1))
+    m[..., :3, 3] = t
+    return m
+
+def scaling(s, n):
+    m = np.zeros((n, 4, 4))
+    m[:, 0, 0], m[:, 1, 1], m[:, 2, 2] = s
+    m[:, 3, 3] = 1.0
+    return m
+
+def rotation_x(deg):
+    r = np.radians(deg); c, s = np.cos(r), np.sin(r)
+    m = np.tile(np.eye(4), (len(r), 1, 1))
+    m[:, 1, 1], m[:, 1, 2], m[:, 2, 1], m[:, 2, 2] = c, -s, s, c
+    return m
+
+def rotation_y(deg):
+    r = np.radians(deg); c, s = np.cos(r), np.sin(r)
+    m = np.tile(np.eye(4), (len(r), 1, 1))
+    m[:, 0, 0], m[:, 0, 2], m[:, 2, 0], m[:, 2, 2] = c, s, -s, c
+    return m
+
+def const(v, n):
+    return np.broadcast_to(np.asarray(v, dtype=np.float64), (n, 3))
+
+
+class HumanoidPose:
+    """Per-character arrays that drive the humanoid body parts."""
+
+    def __init__(self, x, y, z, yaw, leg_l, leg_r, anim_t=None, torso_color=None, head_color=None):
+        self.x, self.y, self.z = (np.asarray(v, dtype=np.float64) for v in (x, y, z))
+        self.yaw = np.asarray(yaw, dtype=np.float64)
+        self.leg_l = np.asarray(leg_l, dtype=np.float64)
+        self.leg_r = np.asarray(leg_r, dtype=np.float64)
+        n = len(self.x)
+        # NaN anim_t means "not in a pickup/drop animation".
+        self.anim_t = np.full(n, np.nan) if anim_t is None else np.asarray(anim_t, dtype=np.float64)
+        self.torso_color = np.asarray(torso_color, dtype=np.float64).reshape(n, 3)
+        self.head_color = np.asarray(head_color, dtype=np.float64).reshape(n, 3)
+
+    def __len__(self):
+        return len(self.x)
+
+    @classmethod
+    def from_entities(cls, entities):
+        """``entities`` is a list of ``(entity, torso_color, head_color)``."""
+        cols = list(zip(*[(e.x, e.y, e.z, e.yaw, e.leg_l, e.leg_r,
+                           e.anim_t if getattr(e, 'anim_state', 'none') in ('pickup', 'drop') else np.nan,
+                           tc, hc) for e, tc, hc in entities]))
+        return cls(*cols)
+
+    FIELDS = ("x", "y", "z", "yaw", "leg_l", "leg_r", "anim_t", "torso_color", "head_color")
+
+    @classmethod
+    def concat(cls, poses):
+        return cls(*(np.concatenate([getattr(p, f) for p in poses]) for f in cls.FIELDS))
+
+    def take(self, idx):
+        """The characters at ``idx`` (an index array or mask)."""
+        return HumanoidPose(*(getattr(self, f)[idx] for f in self.FIELDS))
+
+def humanoid_parts(pose, lod=None, sphere_lods=None):
+    """Model matrices for every body part of every character.
+
+    Returns a list of ``(mesh_name, matrices (N, 4, 4), colors (N, 3))``.
+    With ``lod`` (detail level per character), only level 0 gets the thin
+    leg stripes and chest plate, and heads use the ``(slices, stacks)`` of
+    ``sphere_lods[level]``.
+    """
+    n = len(pose)
+    root = translation(np.stack([pose.x, pose.y, pose.z], axis=1)) @ rotation_y(pose.yaw)
+    animating = ~np.isnan(pose.anim_t)
+    curve = np.where(animating, np.sin(np.nan_to_num(pose.anim_t) * math.pi), 0.0)
+    crouch = np.stack([np.zeros(n), -0.35 * curve, np.zeros(n)], axis=1)
+    root = root @ translation(crouch) @ rotation_x(30.0 * curve)
+
+    torso_h = 1.0
+    torso_center_y = 0.9
+    torso_bottom_y = torso_center_y - torso_h * 0.5
+    torso_depth = 0.4
+    leg_h = 0.4
+    leg_depth = 0.22
+    leg_half_depth = leg_depth / 2.0
+
+    full = slice(None) if lod is None else lod == 0
+    parts = []
+    torso = root @ translation(const((0, torso_center_y, 0), n)) @ scaling((0.7, torso_h, torso_depth), n)
+    parts.append(("cube", torso, pose.torso_color))
+    head = root @ translation(const((0, 1.75, 0), n)) @ scaling((HEAD_RADIUS,) * 3, n)
+    if lod is None:
+        parts.append(("sphere", head, pose.head_color))
+    else:
+        for level, (slices, stacks) in enumerate(sphere_lods):
+            sel = lod == level
+            parts.append((("sphere", slices, stacks), head[sel], pose.head_color[sel]))
+    for side, swing in ((-0.18, pose.leg_l), (+0.18, pose.leg_r)):
+        hip = root @ translation(const((side, torso_bottom_y, 0), n)) @ rotation_x(swing)
+        leg = hip @ translation(const((0, -leg_h/2, 0), n)) @ scaling((0.22, leg_h, leg_depth), n)
+        stripe = hip @ translation(const((0, -leg_h/2, leg_half_depth + 0.01), n)) @ scaling((0.22, leg_h, 0.015), n)
+        parts.append(("cube", leg, pose.torso_color))
+        parts.append(("cube", stripe[full], pose.torso_color[full]))
+    chest = root @ translation(const((0, torso_center_y, (torso_depth/2) + 0.005), n)) @ scaling((0.7, torso_h, 0.03), n)
+    parts.append(("cube", chest[full], pose.torso_color[full]))
+    return parts, root
+
+def cargo_parts(positions, colors, parent=None):
+    """Cargo cube matrices at ``positions`` (N, 3), optionally relative to ``parent`` (N, 4, 4)."""
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    m = translation(positions) @ scaling((CARGO_SIZE,) * 3, len(positions))
+    if parent is not None:
+        m = parent @ m
+    return [("cube", m, np.asarray(colors, dtype=np.float64).reshape(-1, 3))]
+
+
+def bake_instances(parts, sphere_detail=(14, 14)):
+    """Transform every part's mesh into world space in one pass per mesh and
+    group the result by color. A mesh name is ``"cube"``, ``"sphere"`` (at
+    ``sphere_detail``) or ``("sphere", slices, stacks)``.
+
+    Returns a list of ``(color, positions (K, 3), normals (K, 3))`` quad
+    lists, one per distinct color, ready for a single draw call each.
+    """
+    by_mesh = {}
+    for name, mats, colors in parts:
+        if len(mats):
+            by_mesh.setdefault(name, []).append((mats, colors))
+
+    groups = {}
+    for name, items in by_mesh.items():
+        if name == "cube":
+            mesh = get_mesh(name)
+        elif name == "sphere":
+            mesh = get_mesh(name, slices=sphere_detail[0], stacks=sphere_detail[1])
+        else:
+            kind, slices, stacks = name
+            mesh = get_mesh(kind, slices=slices, stacks=stacks)
+        mats = np.concatenate([m for m, _ in items])
+        colors = np.concatenate([c for _, c in items])
+        lin = mats[:, :3, :3].astype(np.float32)
+        pos = mesh.positions @ lin.transpose(0, 2, 1) + mats[:, None, :3, 3].astype(np.float32)
+        # Inverse transpose keeps normals perpendicular under non-uniform
+        # scale; GL_NORMALIZE takes care of their length.
+        nrm = mesh.normals @ np.linalg.inv(lin)
+        keys, inverse = np.unique(colors, axis=0, return_inverse=True)
+        for k, color in enumerate(keys):
+            sel = inverse.reshape(-1) == k
+            groups.setdefault(tuple(int(c) for c in color), []).append((pos[sel].reshape(-1, 3), nrm[sel].reshape(-1, 3)))
+
+    return [(color, np.ascontiguousarray(np.concatenate([p for p, _ in g]), dtype=np.float32),
+             np.ascontiguousarray(np.concatenate([n for _, n in g]), dtype=np.float32))
+            for color, g in groups.items()]
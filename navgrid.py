@@ -0,0 +1,262 @@
+import heapq
+import math
+import random
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from collision import expanded_extents
+
+NAV_CELL_SIZE = 1.0
+NAV_EXPAND = 0.2
+FLOW_RADIUS = 24.0
+SQRT2 = math.sqrt(2.0)
+
+# (drow, dcol, cost) for the 8 neighbours of a cell.
+NEIGHBOURS = ((-1, 0, 1.0), (1, 0, 1.0), (0, -1, 1.0), (0, 1, 1.0),
+              (-1, -1, SQRT2), (-1, 1, SQRT2), (1, -1, SQRT2), (1, 1, SQRT2))
+NO_DIRECTION = len(NEIGHBOURS)
+# Unit (dx, dz) per neighbour index; NO_DIRECTION maps to None / (0, 0).
+UNIT_STEPS = [(dc / math.hypot(dr, dc), dr / math.hypot(dr, dc)) for dr, dc, _ in NEIGHBOURS] + [None]
+UNIT_X = np.array([u[0] for u in UNIT_STEPS[:-1]] + [0.0])
+UNIT_Z = np.array([u[1] for u in UNIT_STEPS[:-1]] + [0.0])
+
+
+class NavGrid:
+    """Occupancy grid rasterized from the level walls, for NPC pathing.
+
+    Rows run along z and columns along x. A cell is blocked when it overlaps
+    any wall box grown by ``expand``. Moves are 8-connected and may not cut
+    the corner of a blocked cell. ``find_path`` answers one-off A* queries;
+    ``flow_to`` hands out shared flow fields, cached by goal cell, that any
+    number of NPCs can read in O(1).
+    """
+
+    def __init__(self, walls, expand=NAV_EXPAND, cell_size=NAV_CELL_SIZE,
+                 flow_radius=FLOW_RADIUS, cache_size=1024):
+        self.cell_size = cell_size
+        self.flow_radius = int(math.ceil(flow_radius / cell_size))
+        self.cache_size = cache_size
+        self._flows = OrderedDict()
+        self._free = None
+        ext = expanded_extents(walls, expand)
+        if len(ext):
+            self.ox = float(ext[:, 0].min()) - cell_size
+            self.oz = float(ext[:, 2].min()) - cell_size
+            self.cols = int(math.ceil((ext[:, 1].max() - self.ox) / cell_size)) + 1
+            self.rows = int(math.ceil((ext[:, 3].max() - self.oz) / cell_size)) + 1
+        else:
+            self.ox = self.oz = 0.0
+            self.cols = self.rows = 1
+        self.blocked = np.zeros((self.rows, self.cols), dtype=bool)
+        c0 = np.floor((ext[:, 0] - self.ox) / cell_size).astype(np.int64)
+        c1 = np.ceil((ext[:, 1] - self.ox) / cell_size).astype(np.int64)
+        r0 = np.floor((ext[:, 2] - self.oz) / cell_size).astype(np.int64)
+        r1 = np.ceil((ext[:, 3] - self.oz) / cell_size).astype(np.int64)
+        for w in range(len(ext)):
+            self.blocked[r0[w]:r1[w], c0[w]:c1[w]] = True
+
+    @classmethod
+    def baked(cls, cache, walls, expand=NAV_EXPAND, cell_size=NAV_CELL_SIZE, **kwargs):
+        """The grid of ``walls`` with its ``blocked`` mask from ``cache``
+        (a ``level.BakeCache``), rasterized and stored on first use."""
+        def build():
+            g = cls(walls, expand, cell_size)
+            return {"blocked": g.blocked}, {"ox": g.ox, "oz": g.oz}
+        arrays, meta = cache.load(f"nav_{expand}_{cell_size}", build)
+        grid = cls((), expand, cell_size, **kwargs)
+        grid.ox, grid.oz = meta["ox"], meta["oz"]
+        grid.blocked = arrays["blocked"]
+        grid.rows, grid.cols = grid.blocked.shape
+        return grid
+
+    def cell(self, x, z):
+        """``(row, col)`` of the cell containing ``(x, z)``, or None outside the grid."""
+        r = math.floor((z - self.oz) / self.cell_size)
+        c = math.floor((x - self.ox) / self.cell_size)
+        if 0 <= r < self.rows and 0 <= c < self.cols:
+            return r, c
+        return None
+
+    def center(self, r, c):
+        return self.ox + (c + 0.5) * self.cell_size, self.oz + (r + 0.5) * self.cell_size
+
+    def _offsets(self, width):
+        """``(step, cost, side_a, side_b)`` per neighbour for a flat index over
+        rows of ``width``; diagonals need both sides free (no corner cutting)."""
+        return [(dr * width + dc, cost, dr * width if dr and dc else 0, dc if dr and dc else 0)
+                for dr, dc, cost in NEIGHBOURS]
+
+    def find_path(self, start, goal):
+        """A* from world point ``start`` to ``goal``. Returns the waypoints
+        (cell centers, ending on ``goal`` itself) or None if unreachable."""
+        s, g = self.cell(*start), self.cell(*goal)
+        if s is None or g is None or self.blocked[g]:
+            return None
+        # Flat free mask with a blocked border, so neighbours need no bounds checks.
+        width = self.cols + 2
+        if self._free is None:
+            self._free = np.pad(~self.blocked, 1).ravel().tolist()
+        free = self._free
+        gr, gc = g
+        si, gi = (s[0] + 1) * width + s[1] + 1, (gr + 1) * width + gc + 1
+
+        def h(i):
+            dr, dc = abs(i // width - 1 - gr), abs(i % width - 1 - gc)
+            return max(dr, dc) + (SQRT2 - 1.0) * min(dr, dc)
+
+        best = {si: 0.0}
+        came = {}
+        heap = [(h(si), 0.0, si)]
+        offsets = self._offsets(width)
+        while heap:
+            _, d, i = heapq.heappop(heap)
+            if i == gi:
+                cells = []
+                while i in came:
+                    i = came[i]
+                    cells.append(i)
+                return [self.center(i // width - 1, i % width - 1) for i in reversed(cells[:-1])] + [tuple(goal)]
+            if d > best[i]:
+                continue
+            for step, cost, side_a, side_b in offsets:
+                n = i + step
+                if not free[n] or (side_a and not (free[i + side_a] and free[i + side_b])):
+                    continue
+                nd = d + cost
+                if nd < best.get(n, math.inf):
+                    best[n] = nd
+                    came[n] = i
+                    heapq.heappush(heap, (nd + h(n), nd, n))
+        return None
+
+    def flow_to(self, x, z):
+        """Flow field toward the cell containing ``(x, z)``, or None when
+        that point is off the grid or inside a wall. Fields are cached per
+        goal cell, so a moving target only costs a rebuild when it enters a
+        cell that is not cached any more."""
+        g = self.cell(x, z)
+        if g is None or self.blocked[g]:
+            return None
+        field = self._flows.get(g)
+        if field is None:
+            field = self._flows[g] = FlowField(self, g, self.flow_radius)
+            if len(self._flows) > self.cache_size:
+                self._flows.popitem(last=False)
+        else:
+            self._flows.move_to_end(g)
+        return field
+
+
+class FlowField:
+    """Dijkstra distances to one goal cell over a square window around it,
+    kept as one byte per cell: the index into ``NEIGHBOURS`` of the step to
+    take, or ``NO_DIRECTION``."""
+
+    def __init__(self, grid, goal, radius):
+        self.grid = grid
+        self.goal = goal
+        gr, gc = goal
+        self.r0, self.c0 = max(0, gr - radius), max(0, gc - radius)
+        r1, c1 = min(grid.rows, gr + radius + 1), min(grid.cols, gc + radius + 1)
+        h, w = r1 - self.r0, c1 - self.c0
+
+        # Dijkstra over the window padded with a blocked border.
+        wp = w + 2
+        free_pad = np.pad(~grid.blocked[self.r0:r1, self.c0:c1], 1)
+        free = free_pad.ravel().tolist()
+        flat = [math.inf] * len(free)
+        gi = (gr - self.r0 + 1) * wp + gc - self.c0 + 1
+        flat[gi] = 0.0
+        heap = [(0.0, gi)]
+        offsets = grid._offsets(wp)
+        while heap:
+            d, i = heapq.heappop(heap)
+            if d > flat[i]:
+                continue
+            for step, cost, side_a, side_b in offsets:
+                n = i + step
+                if not free[n] or (side_a and not (free[i + side_a] and free[i + side_b])):
+                    continue
+                if d + cost < flat[n]:
+                    flat[n] = d + cost
+                    heapq.heappush(heap, (d + cost, n))
+        pad = np.array(flat).reshape(h + 2, w + 2)
+        dist = pad[1:-1, 1:-1]
+
+        # Each cell points at the neighbour it is reached through (cells
+        # inside walls at their closest free neighbour); the goal cell and
+        # unreachable cells get NO_DIRECTION.
+        best = np.full((h, w), np.inf)
+        self.code = np.full((h, w), NO_DIRECTION, dtype=np.int8)
+        for k, (dr, dc, cost) in enumerate(NEIGHBOURS):
+            cand = pad[1 + dr:1 + dr + h, 1 + dc:1 + dc + w] + cost
+            if dr and dc:
+                corner_ok = free_pad[1 + dr:1 + dr + h, 1:1 + w] & free_pad[1:1 + h, 1 + dc:1 + dc + w]
+                cand = np.where(corner_ok, cand, np.inf)
+            better = cand < best
+            best = np.where(better, cand, best)
+            self.code[better] = k
+        self.code[best > dist] = NO_DIRECTION
+
+    def direction(self, x, z):
+        """Unit ``(dx, dz)`` to walk from ``(x, z)``, or None when the point
+        is in the goal cell, outside the window or cannot reach the goal
+        (callers then head straight for the target)."""
+        g = self.grid
+        r = math.floor((z - g.oz) / g.cell_size) - self.r0
+        c = math.floor((x - g.ox) / g.cell_size) - self.c0
+        h, w = self.code.shape
+        if 0 <= r < h and 0 <= c < w:
+            return UNIT_STEPS[self.code.item(r, c)]
+        return None
+
+    def directions(self, x, z):
+        """Vectorized ``direction``: ``(dx, dz, ok)`` arrays shaped like ``x``."""
+        g = self.grid
+        h, w = self.code.shape
+        r = np.floor((z - g.oz) / g.cell_size).astype(np.int64) - self.r0
+        c = np.floor((x - g.ox) / g.cell_size).astype(np.int64) - self.c0
+        inside = (r >= 0) & (r < h) & (c >= 0) & (c < w)
+        code = np.where(inside, self.code[np.where(inside, r, 0), np.where(inside, c, 0)], NO_DIRECTION)
+        return UNIT_X[code], UNIT_Z[code], code != NO_DIRECTION
+
+
+def benchmark(npc_counts=(1, 10, 100, 1000), queries=200):
+    """Per-NPC A* every step versus one shared flow field, chasing a player
+    at the spawn point of the built-in level."""
+    from level import default_level
+    from sim import build_rooms
+    walls, floors = [], []
+    build_rooms(walls, floors, default_level())
+    t = time.perf_counter()
+    grid = NavGrid(walls)
+    print(f"rejilla {grid.rows}x{grid.cols} construida en {(time.perf_counter() - t)*1e3:.1f} ms")
+
+    rng = random.Random(4)
+    goal = (0.0, -3.0)
+    t = time.perf_counter()
+    for _ in range(20):
+        grid._flows.clear()
+        field = grid.flow_to(*goal)
+    build = (time.perf_counter() - t) / 20
+    # Chase-like queries: starts the goal can be reached from, inside the
+    # flow field window.
+    near = np.argwhere(field.code != NO_DIRECTION) + (field.r0, field.c0)
+    t = time.perf_counter()
+    for _ in range(queries):
+        grid.find_path(grid.center(*near[rng.randrange(len(near))]), goal)
+    astar = (time.perf_counter() - t) / queries
+    print(f"consulta A* {astar*1e3:.2f} ms, campo de flujo {build*1e3:.2f} ms ({len(near)} celdas alcanzables)")
+
+    print(f"{'npcs':>6} {'A* c/u ms':>11} {'lectura ms':>14}")
+    for n in npc_counts:
+        pts = np.array([grid.center(*near[rng.randrange(len(near))]) for _ in range(n)])
+        t = time.perf_counter()
+        field.directions(pts[:, 0], pts[:, 1])
+        read = time.perf_counter() - t
+        print(f"{n:>6} {astar*n*1e3:>11.2f} {read*1e3:>14.3f}")
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,590 @@
+"""Networked play: an asyncio game server and a headless client.
+
+The server steps one ``World`` at the fixed tick and every ``send_every``
+ticks sends each client a snapshot of the dynamic state. Snapshots are
+quantized into fixed-layout records (players, NPCs, bombs) and delta
+compressed against the last snapshot that client acknowledged: only the
+rows that changed are sent, and of those only the fields that changed.
+Rows are keyed by entity id, so a server with an ``InterestManager``
+(interest.py) can send each client only the players and NPCs near it.
+Without one, encodings are shared between clients that acknowledged the
+same tick. The level (floor size, walls, floors, deactivation areas) goes out once,
+in the welcome message.
+
+Every message is a ``<BI`` header (type, payload length) and a payload:
+
+* WELCOME (server): player id, tick dt, ticks per snapshot, then the level;
+* SNAPSHOT (server): tick, base tick (0 = full), last input seq applied,
+  flags, then one delta section per record type;
+* INPUT (client): input seq, last snapshot tick received, ``IN_*`` bitmask.
+  The server applies one input per tick, in order.
+
+    python net.py serve --port 5555
+    python net.py bot 127.0.0.1 5555       # headless client walking at random
+    python net.py serve --interest         # per-client interest management
+    python net.py bench --clients 8        # server + bots over localhost, vs a full-state server
+"""
+import argparse
+import asyncio
+import collections
+import math
+import random
+import struct
+import sys
+import time
+
+import numpy as np
+
+import sim
+from interest import InterestManager
+from level import Level, default_level
+
+PROTOCOL = 4
+
+MSG_WELCOME = 1
+MSG_SNAPSHOT = 2
+MSG_INPUT = 3
+MSG_FULL = 4      # tick + pickled full state, sent by a ``naive`` server for comparison
+
+HEADER = struct.Struct("<BI")
+WELCOME = struct.Struct("<BHdB")
+SNAPSHOT = struct.Struct("<IIIB")
+INPUT = struct.Struct("<IIB")
+COUNT = struct.Struct("<H")
+FLOOR = struct.Struct("<d")
+FULL = struct.Struct("<I")      # tick, ahead of the pickle so clients never load it
+
+SNAP_GAME_OVER = 1
+
+POS_SCALE = 0.01            # meters per unit of a quantized position
+YAW_SCALE = 360.0 / 65536   # degrees per unit of a quantized yaw
+TIME_SCALE = 0.1            # seconds per unit of a bomb's remaining time
+
+P_WALK, P_CARRY = 1, 2
+B_ACTIVE, B_DEACTIVATED, B_EXPLODED, B_CARRIED = 1, 2, 4, 8
+
+# Record layouts. A delta marks changed fields with one bit each, so a
+# record has at most 8 fields. Every section is sorted by ``id``. Positions
+# are 32-bit, so any level fits; ``carry`` is a bomb index, -1 for none.
+PLAYER_DTYPE = np.dtype([("id", "<u2"), ("x", "<i4"), ("z", "<i4"), ("yaw", "<u2"),
+                         ("leg_l", "i1"), ("leg_r", "i1"), ("flags", "u1"), ("carry", "<i2")])
+NPC_DTYPE = np.dtype([("id", "<u2"), ("x", "<i4"), ("z", "<i4"), ("yaw", "<u2"), ("leg_l", "i1"), ("leg_r", "i1")])
+BOMB_DTYPE = np.dtype([("id", "<u2"), ("x", "<i4"), ("y", "<i4"), ("z", "<i4"), ("remaining", "<u2"), ("flags", "u1")])
+SECTIONS = (("players", PLAYER_DTYPE), ("npcs", NPC_DTYPE), ("bombs", BOMB_DTYPE))
+# Per layout: byte offset of each field, and the field each byte belongs to.
+FIELD_STARTS = {dt: np.array([dt.fields[f][1] for f in dt.names]) for _, dt in SECTIONS}
+BYTE_FIELD = {dt: np.repeat(np.arange(len(dt.names)), [dt[f].itemsize for f in dt.names]) for _, dt in SECTIONS}
+
+MAX_INPUT_BACKLOG = 8
+
+
+def _pos(v):
+    return round(v / POS_SCALE)
+
+def _yaw(v):
+    return round(v / YAW_SCALE) % 65536
+
+def _deg(v):
+    return max(-127, min(127, round(v)))
+
+def _pos_array(v):
+    return np.round(v / POS_SCALE).astype(np.int32)
+
+def _yaw_array(v):
+    return (np.round(v / YAW_SCALE).astype(np.int64) % 65536).astype(np.uint16)
+
+def _deg_array(v):
+    return np.clip(np.round(v), -127, 127).astype(np.int8)
+
+def quantize(world):
+    """The dynamic state of ``world`` as one record array per section.
+    NPCs and bombs are identified by their index in the world."""
+    players = np.array([
+        (pid, _pos(a.x), _pos(a.z), _yaw(a.yaw), _deg(a.leg_l), _deg(a.leg_r),
+         (a.state == 'walk') * P_WALK | (a.carrying_index is not None and a.anim_state == 'none') * P_CARRY,
+         -1 if a.carrying_index is None else a.carrying_index)
+        for pid, a in sorted(world.agents.items())], PLAYER_DTYPE)
+
+    n = world.npcs
+    if len(n) <= n.SCALAR_LIMIT:
+        npcs = np.array([(i, _pos(x), _pos(z), _yaw(yaw), _deg(l), _deg(r)) for i, (x, z, yaw, l, r) in
+                         enumerate(zip(n.x.tolist(), n.z.tolist(), n.yaw.tolist(), n.leg_l.tolist(), n.leg_r.tolist()))],
+                        NPC_DTYPE)
+    else:
+        npcs = np.zeros(len(n), NPC_DTYPE)
+        npcs["id"] = np.arange(len(n))
+        npcs["x"], npcs["z"], npcs["yaw"] = _pos_array(n.x), _pos_array(n.z), _yaw_array(n.yaw)
+        npcs["leg_l"], npcs["leg_r"] = _deg_array(n.leg_l), _deg_array(n.leg_r)
+
+    now = world.time
+    bombs = np.array([
+        (i, _pos(b.world_pos[0]), _pos(b.world_pos[1]), _pos(b.world_pos[2]),
+         min(65535, math.ceil(b.remaining(now) / TIME_SCALE)),
+         b.active * B_ACTIVE | b.deactivated * B_DEACTIVATED | b.exploded * B_EXPLODED | b.carried * B_CARRIED)
+        for i, b in enumerate(world.bombs)], BOMB_DTYPE)
+    return {"players": players, "npcs": npcs, "bombs": bombs}
+
+
+def _same_ids(a, b):
+    return len(a) == len(b) and bool((a == b).all())
+
+def _reference(ids, base, dtype):
+    """What each row of a section with ``ids`` is diffed against: the row
+    of ``base`` with the same id, or zeros (but the id) for new rows."""
+    if base is not None and _same_ids(base["id"], ids):
+        return base
+    ref = np.zeros(len(ids), dtype)
+    ref["id"] = ids
+    if base is not None and len(base) and len(ids):
+        at = np.minimum(np.searchsorted(base["id"], ids), len(base) - 1)
+        hit = base["id"][at] == ids
+        ref[hit] = base[at[hit]]
+    return ref
+
+def _ids(ids):
+    return COUNT.pack(len(ids)) + ids.tobytes()
+
+def encode_section(cur, base=None):
+    """Rows of ``cur`` that differ from ``base`` (all rows without one),
+    matched by id: the ids that left and the ids that joined since
+    ``base``, a bitmap of changed rows, one field mask per changed row and
+    then the bytes of the changed fields, row by row."""
+    n = len(cur)
+    dtype = cur.dtype
+    ids = cur["id"]
+    base_ids = base["id"] if base is not None else ids[:0]
+    if base is not None and _same_ids(base_ids, ids):
+        left = joined = ids[:0]
+        ref = base
+    else:
+        left = np.setdiff1d(base_ids, ids, assume_unique=True)
+        joined = np.setdiff1d(ids, base_ids, assume_unique=True)
+        ref = _reference(ids, base, dtype)
+    raw = cur.view(np.uint8).reshape(n, dtype.itemsize)
+    diff = raw != ref.view(np.uint8).reshape(n, dtype.itemsize)
+    changed = np.logical_or.reduceat(diff, FIELD_STARTS[dtype], axis=1) if n else np.zeros((0, len(dtype.names)), bool)
+    masks = np.packbits(changed, axis=1, bitorder="little")[:, 0]
+    rows = masks != 0
+    return b"".join([_ids(left), _ids(joined), np.packbits(rows).tobytes(), masks[rows].tobytes(),
+                     raw[changed[:, BYTE_FIELD[dtype]]].tobytes()])
+
+def decode_section(data, offset, dtype, base=None):
+    """Inverse of ``encode_section``; returns ``(records, new offset)``."""
+    def ids():
+        nonlocal offset
+        k, = COUNT.unpack_from(data, offset)
+        a = np.frombuffer(data, "<u2", k, offset + COUNT.size)
+        offset += COUNT.size + a.nbytes
+        return a
+    left, joined = ids(), ids()
+    base_ids = base["id"] if base is not None else np.zeros(0, "<u2")
+    cur_ids = np.union1d(np.setdiff1d(base_ids, left, assume_unique=True), joined) if len(left) or len(joined) else base_ids
+    n = len(cur_ids)
+    nbytes = (n + 7) // 8
+    rows = np.unpackbits(np.frombuffer(data, np.uint8, nbytes, offset), count=n).astype(bool)
+    offset += nbytes
+    k = int(rows.sum())
+    changed = np.zeros((n, len(dtype.names)), bool)
+    changed[rows] = np.unpackbits(np.frombuffer(data, np.uint8, k, offset)[:, None], axis=1,
+                                  count=len(dtype.names), bitorder="little")
+    offset += k
+    cur = _reference(cur_ids, base, dtype).copy()
+    sel = changed[:, BYTE_FIELD[dtype]]
+    size = int(sel.sum())
+    cur.view(np.uint8).reshape(n, dtype.itemsize)[sel] = np.frombuffer(data, np.uint8, size, offset)
+    return cur, offset + size
+
+
+def encode_level(world):
+    """The level as sent in the welcome message: float64 and exact, so a
+    client hashes it to the same ``BakeCache`` key as the server."""
+    walls = np.asarray(world.walls, dtype="<f8").reshape(-1, 6)
+    floors = world.room_floors
+    rects = np.array([f[:4] for f in floors], dtype="<f8").reshape(-1, 4)
+    colors = np.array([f[4] for f in floors], dtype=np.uint8).reshape(-1, 3)
+    areas = np.array([[a["x0"], a["z0"], a["x1"], a["z1"]] for a in world.pads], dtype="<f8").reshape(-1, 4)
+    area_colors = np.array([a["color"] for a in world.pads], dtype=np.uint8).reshape(-1, 3)
+    return b"".join([FLOOR.pack(world.floor_size), COUNT.pack(len(walls)), walls.tobytes(),
+                     COUNT.pack(len(rects)), rects.tobytes(), colors.tobytes(),
+                     COUNT.pack(len(areas)), areas.tobytes(), area_colors.tobytes()])
+
+def decode_level(data, offset):
+    """``(walls, room_floors, pads, floor_size)``: the tuples ``build_rooms``
+    makes and ``level.Level.pads``-style dicts."""
+    floor_size, = FLOOR.unpack_from(data, offset)
+    offset += FLOOR.size
+    def block(shape_tail, dtype):
+        nonlocal offset
+        n, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        a = np.frombuffer(data, dtype, n * int(np.prod(shape_tail)), offset).reshape((n,) + shape_tail)
+        offset += a.nbytes
+        return a
+    def colors(n):
+        nonlocal offset
+        c = np.frombuffer(data, np.uint8, n * 3, offset).reshape(-1, 3)
+        offset += c.nbytes
+        return [tuple(map(int, x)) for x in c]
+    walls = block((6,), "<f8")
+    rects = block((4,), "<f8")
+    floors = [(*map(float, r), c) for r, c in zip(rects, colors(len(rects)))]
+    areas = block((4,), "<f8")
+    pads = [dict(zip(("x0", "z0", "x1", "z1"), map(float, a)), color=c) for a, c in zip(areas, colors(len(areas)))]
+    return [tuple(map(float, w)) for w in walls], floors, pads, floor_size
+
+
+def frame(kind, payload):
+    return HEADER.pack(kind, len(payload)) + payload
+
+async def read_message(reader):
+    kind, size = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return kind, await reader.readexactly(size)
+
+
+class _Client:
+    def __init__(self, pid, writer):
+        self.id = pid
+        self.writer = writer
+        self.inputs = collections.deque()
+        self.bits = 0
+        self.seq = 0          # last input seq applied
+        self.ack = 0          # last snapshot tick the client has
+        self.history = collections.OrderedDict()   # tick -> state sent to this client
+        self.bytes_sent = 0
+
+    def next_input(self):
+        """Input for this tick: the next queued one, or the held keys (never
+        the action bit) when the queue is empty. A backlog beyond
+        ``MAX_INPUT_BACKLOG`` is collapsed so a client can't lag the server."""
+        if not self.inputs:
+            return self.bits
+        action = 0
+        while len(self.inputs) > MAX_INPUT_BACKLOG:
+            action |= self.inputs.popleft()[1] & sim.IN_ACTION
+        self.seq, bits = self.inputs.popleft()
+        self.bits = bits & ~sim.IN_ACTION
+        return bits | action
+
+
+class GameServer:
+    """Runs a World at the fixed tick and streams snapshots to its clients.
+
+    ``interest`` (an ``interest.InterestManager``) culls each client's
+    snapshot to the entities relevant to it. ``naive`` sends every client
+    the pickled full state, level included, every tick, as the original
+    networked game did; it exists to compare against.
+    """
+
+    def __init__(self, world=None, send_every=2, history=64, restart_delay=3.0, naive=False, interest=None,
+                 dt=sim.TICK_DT):
+        self.world = world if world is not None else sim.World(players=())
+        self.dt = dt
+        self.send_every = send_every
+        self.history_size = history
+        self.interest = interest
+        self.restart_ticks = int(restart_delay / self.dt)
+        self.naive = naive
+        self.clients = {}
+        self.next_id = 1
+        self.encode_time = 0.0
+        self._over_since = None
+        self._level = encode_level(self.world)
+
+    async def handle(self, reader, writer):
+        pid = self.next_id
+        self.next_id += 1
+        client = self.clients[pid] = _Client(pid, writer)
+        client.task = asyncio.current_task()
+        self.world.add_player(pid)
+        print(f">>> Conexión entrante. Asignando ID: {pid}")
+        writer.write(frame(MSG_WELCOME, WELCOME.pack(PROTOCOL, pid, self.dt, self.send_every) + self._level))
+        try:
+            while True:
+                kind, payload = await read_message(reader)
+                if kind == MSG_INPUT:
+                    seq, ack, bits = INPUT.unpack(payload)
+                    client.inputs.append((seq, bits))
+                    client.ack = max(client.ack, ack)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            print(f"Cliente {pid} desconectado")
+            del self.clients[pid]
+            if self.interest is not None:
+                self.interest.forget(pid)
+            if pid in self.world.agents:
+                self.world.remove_player(pid)
+            writer.close()
+
+    def tick(self):
+        world = self.world
+        inputs = {pid: c.next_input() for pid, c in self.clients.items()}
+        events = world.step(inputs, self.dt)
+        if world.game_over:
+            if self._over_since is None:
+                self._over_since = world.tick
+            elif world.tick - self._over_since >= self.restart_ticks:
+                world.reset()
+                self._over_since = None
+        if self.naive:
+            self.broadcast_full()
+        elif world.tick % self.send_every == 0:
+            self.broadcast()
+        return events
+
+    def broadcast(self):
+        t = time.perf_counter()
+        world = self.world
+        state = quantize(world)
+        interest = self.interest
+        if interest is not None:
+            interest.begin(world)
+        flags = SNAP_GAME_OVER if world.game_over else 0
+        # (section, base tick) -> encoding, for sections every client gets whole
+        shared = {}
+        for c in self.clients.values():
+            # A client that isn't draining its socket only ever needs the
+            # newest snapshot; skip it until the buffer empties.
+            if c.writer.is_closing() or c.writer.transport.get_write_buffer_size() > 1 << 16:
+                continue
+            cstate = state if interest is None else interest.filter(c.id, state)
+            c.history[world.tick] = cstate
+            while len(c.history) > self.history_size:
+                c.history.popitem(last=False)
+            base = c.history.get(c.ack)
+            base_tick = c.ack if base is not None else 0
+            parts = []
+            for name, _ in SECTIONS:
+                whole = cstate[name] is state[name]
+                part = shared.get((name, base_tick)) if whole else None
+                if part is None:
+                    part = encode_section(cstate[name], None if base is None else base[name])
+                    if whole:
+                        shared[(name, base_tick)] = part
+                parts.append(part)
+            body = b"".join(parts)
+            msg = frame(MSG_SNAPSHOT, SNAPSHOT.pack(world.tick, base_tick, c.seq, flags) + body)
+            c.writer.write(msg)
+            c.bytes_sent += len(msg)
+        self.encode_time += time.perf_counter() - t
+
+    def broadcast_full(self):
+        import pickle
+        t = time.perf_counter()
+        world = self.world
+        for c in self.clients.values():
+            if c.writer.is_closing():
+                continue
+            msg = frame(MSG_FULL, FULL.pack(world.tick) + pickle.dumps((world.walls, world.room_floors, world.snapshot())))
+            c.writer.write(msg)
+            c.bytes_sent += len(msg)
+        self.encode_time += time.perf_counter() - t
+
+    async def run(self, host="0.0.0.0", port=5555, duration=None):
+        """Serve until cancelled (or for ``duration`` seconds)."""
+        server = await asyncio.start_server(self.handle, host, port)
+        loop = asyncio.get_running_loop()
+        start = next_tick = loop.time()
+        async with server:
+            while duration is None or loop.time() - start < duration:
+                now = loop.time()
+                if now - next_tick > sim.MAX_FRAME_DT:
+                    next_tick = now   # fell too far behind; drop the backlog
+                while next_tick <= now:
+                    self.tick()
+                    next_tick += self.dt
+                await asyncio.sleep(next_tick - loop.time())
+            clients = list(self.clients.values())
+            for c in clients:
+                c.writer.close()
+            await asyncio.gather(*(c.task for c in clients), return_exceptions=True)
+
+
+class NetClient:
+    """Headless client: keeps the latest decoded snapshot and sends inputs.
+
+    ``state`` maps each section name to its record array (see ``quantize``);
+    positions are in units of ``POS_SCALE``.
+    """
+
+    def __init__(self):
+        self.id = None
+        self.state = None
+        self.tick = 0
+        self.game_over = False
+        self.last_seq = 0
+        self.seq = 0
+        self.bytes_received = 0
+        self.snapshots = 0
+        self._history = collections.OrderedDict()
+
+    async def connect(self, host, port):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        kind, payload = await read_message(self.reader)
+        if kind != MSG_WELCOME:
+            raise ConnectionError("el servidor no envió la bienvenida")
+        protocol, self.id, self.dt, self.send_every = WELCOME.unpack_from(payload)
+        if protocol != PROTOCOL:
+            raise ConnectionError(f"protocolo {protocol} no soportado")
+        self.walls, self.room_floors, self.pads, self.floor_size = decode_level(payload, WELCOME.size)
+        self.bytes_received += HEADER.size + len(payload)
+
+    def apply(self, kind, payload):
+        """Take in one server message; True when it produced a new ``state``."""
+        self.bytes_received += HEADER.size + len(payload)
+        self.snapshots += 1
+        if kind == MSG_FULL:
+            # Only counted: unpickling what a server sends would let it run code here.
+            self.tick, = FULL.unpack_from(payload)
+            return False
+        tick, base_tick, last_seq, flags = SNAPSHOT.unpack_from(payload)
+        base = self._history.get(base_tick) if base_tick else None
+        if base_tick and base is None:
+            return False   # base already dropped; the next snapshot will use a newer ack
+        offset = SNAPSHOT.size
+        state = {}
+        for name, dtype in SECTIONS:
+            state[name], offset = decode_section(payload, offset, dtype, None if base is None else base[name])
+        self._history[tick] = state
+        while len(self._history) > 64:
+            self._history.popitem(last=False)
+        self.state, self.tick, self.last_seq, self.game_over = state, tick, last_seq, bool(flags & SNAP_GAME_OVER)
+        return True
+
+    async def receive(self):
+        try:
+            while True:
+                self.apply(*await read_message(self.reader))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    def send_input(self, bits):
+        self.seq += 1
+        self.writer.write(frame(MSG_INPUT, INPUT.pack(self.seq, self.tick, bits)))
+        return self.seq
+
+    def close(self):
+        self.writer.close()
+
+
+async def run_bot(host, port, duration=None, seed=None):
+    """Connect and walk around at random, one input per tick."""
+    rng = random.Random(seed)
+    client = NetClient()
+    await client.connect(host, port)
+    receiver = asyncio.ensure_future(client.receive())
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    bits = 0
+    while not receiver.done() and (duration is None or loop.time() - start < duration):
+        if rng.random() < 0.05:
+            bits = rng.choice((sim.IN_FORWARD, sim.IN_FORWARD | sim.IN_LEFT, sim.IN_FORWARD | sim.IN_RIGHT, 0))
+        client.send_input(bits | (sim.IN_ACTION if rng.random() < 0.01 else 0))
+        await asyncio.sleep(client.dt)
+    client.close()
+    receiver.cancel()
+    return client
+
+
+async def _bench(clients, seconds, mode, guards):
+    world = sim.World(players=(), guards=guards)
+    server = GameServer(world, naive=mode == "completo",
+                        interest=InterestManager() if mode == "interés" else None)
+    port = random.randrange(20000, 40000)
+    serving = asyncio.ensure_future(server.run("127.0.0.1", port, duration=seconds + 0.5))
+    await asyncio.sleep(0.2)
+    bots = await asyncio.gather(*[run_bot("127.0.0.1", port, seconds, seed=i) for i in range(clients)])
+    await serving
+    per_client = sum(b.bytes_received for b in bots) / clients / seconds
+    return per_client, server.encode_time / seconds / clients, bots
+
+def random_guards(n, seed=7):
+    rng = random.Random(seed)
+    spec = default_level().guards[0]
+    guards = [sim.NPCState(spec)]
+    for _ in range(n):
+        g = sim.NPCState(spec)
+        # Outside the rooms, so they patrol instead of ending the round.
+        g.x, g.z = rng.uniform(-70, 70), rng.choice((-1, 1)) * rng.uniform(20, 70)
+        g.path = [(g.x + rng.uniform(-8, 8), g.z + rng.uniform(-4, 4)) for _ in range(4)]
+        g.current_idx = 0
+        guards.append(g)
+    return guards
+
+def benchmark(clients=8, seconds=5.0, guards=None):
+    print(f"{clients} clientes, {len(guards or [None])} guardias, {seconds:.0f}s por modo en localhost")
+    print(f"{'modo':>10} {'KB/s por cliente':>17} {'ms CPU envío/s por cliente':>27} {'snapshots/s':>12} {'guardias vistos':>16}")
+    for mode in ("completo", "delta", "interés"):
+        per_client, enc, bots = asyncio.run(_bench(clients, seconds, mode, guards))
+        rate = sum(b.snapshots for b in bots) / clients / seconds
+        seen = len(guards or [None])
+        if mode != "completo":
+            seen = sum(len(b.state["npcs"]) for b in bots if b.state is not None) / clients
+        print(f"{mode:>10} {per_client / 1024:>17.1f} {enc * 1e3:>27.2f} {rate:>12.1f} {seen:>16.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor y cliente de red del juego")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("serve", help="run a dedicated server")
+    p.add_argument("--host", default="0.0.0.0")
+    p.add_argument("--port", type=int, default=5555)
+    p.add_argument("--send-every", type=int, default=2, help="ticks between snapshots")
+    p.add_argument("--interest", action="store_true", help="only send each client the entities near it")
+    p.add_argument("--level", metavar="PATH", help="level file to serve (default: levels/rooms.json)")
+    p.add_argument("--tick-rate", type=float, default=sim.TICK_RATE,
+                   help=f"simulation ticks per second (>= {1 / sim.MAX_FRAME_DT:g}; movement is sub-stepped)")
+    p = sub.add_parser("bot", help="connect a headless client that walks at random")
+    p.add_argument("host")
+    p.add_argument("port", type=int)
+    p.add_argument("--seconds", type=float)
+    p = sub.add_parser("bench", help="compare bandwidth and CPU of full-state, delta and interest-managed servers")
+    p.add_argument("--clients", type=int, default=8)
+    p.add_argument("--seconds", type=float, default=5.0)
+    p.add_argument("--guards", type=int, default=0, help="extra patrolling guards in the level")
+    sub.add_parser("check", help="check that snapshots carry many bombs and far positions intact")
+    args = parser.parse_args(argv)
+    if args.cmd == "serve" and args.tick_rate * sim.MAX_FRAME_DT < 1:
+        parser.error(f"--tick-rate must be at least {1 / sim.MAX_FRAME_DT:g}")
+
+    if args.cmd == "serve":
+        print(f">>> Iniciando SERVIDOR en el puerto {args.port}")
+        try:
+            world = sim.World(players=(), level=Level.load(args.level)) if args.level else None
+            server = GameServer(world, send_every=args.send_every, interest=InterestManager() if args.interest else None,
+                                dt=1.0 / args.tick_rate)
+            asyncio.run(server.run(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    elif args.cmd == "bot":
+        client = asyncio.run(run_bot(args.host, args.port, args.seconds))
+        print(f"Jugador {client.id}: {client.snapshots} snapshots, {client.bytes_received} bytes")
+    elif args.cmd == "check":
+        err, carry = check_quantize()
+        print(f"error máximo de posición {err * 100:.2f} cm, bomba llevada {'bien' if carry else 'MAL'}")
+        return 0 if err <= POS_SCALE / 2 + 1e-9 and carry else 1
+    else:
+        benchmark(args.clients, args.seconds, random_guards(args.guards) if args.guards else None)
+    return 0
+
+def check_quantize(bombs=300, far=400.0, guards=40):
+    """Quantize and decode a world with more bombs than fit in a byte and a
+    player and guards far from the origin; returns the largest position
+    error (m) and whether the carried bomb index survived."""
+    world = sim.World(bomb_spawns=[(far - i * 0.5, -far, 120.0) for i in range(bombs)],
+                      guards=random_guards(guards))
+    agent = world.agent
+    agent.x, agent.z, agent.carrying_index = far, -far, bombs - 1
+    world.npcs.x[:] = -far
+    state = quantize(world)
+    decoded = {}
+    for name, dtype in SECTIONS:
+        decoded[name], _ = decode_section(encode_section(state[name]), 0, dtype)
+    p, n, b = decoded["players"], decoded["npcs"], decoded["bombs"]
+    err = max(abs(p["x"][0] * POS_SCALE - agent.x), abs(p["z"][0] * POS_SCALE - agent.z),
+              float(np.abs(n["x"] * POS_SCALE - world.npcs.x).max()),
+              max(abs(r["x"] * POS_SCALE - w.world_pos[0]) for r, w in zip(b, world.bombs)))
+    return err, int(p["carry"][0]) == bombs - 1
+
+if __name__ == "__main__":
+    sys.exit(main())
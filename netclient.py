@@ -0,0 +1,413 @@
+"""Client runtime for networked play.
+
+Snapshots from ``net.GameServer`` land in a jitter buffer stamped with
+their arrival time. The render clock runs a little behind the server clock,
+so the client can always interpolate remote players, NPCs and bombs between
+two received ticks. It can then draw at monitor rate while the server ticks
+at 20-30 Hz.
+
+The own agent is not interpolated. Every local tick it is predicted with
+``sim.process_input``, the same ``move_with_collisions`` rules the server
+runs. When a snapshot reports the last input the server applied, the
+client restarts from the server's position and replays the inputs that are
+still in flight. Any difference is blended out over a few frames instead
+of snapping.
+
+    python netclient.py bench --lag 0.08 --jitter 0.03   # local server behind a latency proxy
+"""
+import argparse
+import asyncio
+import collections
+import math
+import random
+import sys
+import time
+
+import numpy as np
+
+import net
+import sim
+from collision import WallGrid
+from level import BakeCache
+from spatial import PointHash, RectSet
+
+SMOOTH_TIME = 0.1       # seconds for a prediction correction to fade out
+SNAP_DISTANCE = 1.0     # corrections larger than this (a respawn) are not smoothed
+# Fields blended between snapshots, and their quantization scale.
+BLENDED = {"players": ("x", "z", "yaw", "leg_l", "leg_r"),
+           "npcs": ("x", "z", "yaw", "leg_l", "leg_r"),
+           "bombs": ("x", "y", "z", "remaining")}
+SCALES = {"x": net.POS_SCALE, "y": net.POS_SCALE, "z": net.POS_SCALE, "remaining": net.TIME_SCALE}
+
+
+def lerp_angle(a, b, t):
+    return a + ((b - a + 180.0) % 360.0 - 180.0) * t
+
+
+class SnapshotBuffer:
+    """Snapshots by server tick, plus the clock used to read them back.
+
+    ``offset`` maps server ticks to local time. It follows the fastest
+    arrivals and creeps up slowly, in case the route gets slower. ``jitter``
+    is the mean lateness of the others. Rendering runs ``delay`` behind the
+    newest tick, so a late snapshot still arrives before it is needed.
+    """
+
+    def __init__(self, dt, send_every, capacity=32):
+        self.dt = dt
+        self.interval = dt * send_every
+        self.snapshots = collections.deque(maxlen=capacity)   # (tick, state), ticks ascending
+        self.offset = None
+        self.jitter = 0.0
+        self.starved = 0      # render times past the newest snapshot
+
+    def push(self, tick, now, state):
+        if self.snapshots and tick <= self.snapshots[-1][0]:
+            return
+        self.snapshots.append((tick, state))
+        sample = now - tick * self.dt
+        if self.offset is None or sample < self.offset:
+            self.offset = sample
+        else:
+            self.offset += (sample - self.offset) * 0.002
+        self.jitter += (sample - self.offset - self.jitter) * 0.1
+
+    @property
+    def delay(self):
+        return self.interval + 2.0 * self.jitter + self.dt
+
+    def render_tick(self, now):
+        return (now - self.offset - self.delay) / self.dt
+
+    def sample(self, now):
+        """``(a, b, t)``: the snapshots on either side of the render time
+        and how far between them it is. Before the oldest or after the
+        newest snapshot, that snapshot is held."""
+        snaps = self.snapshots
+        tick = self.render_tick(now)
+        if tick >= snaps[-1][0]:
+            self.starved += tick > snaps[-1][0] + 1
+            return snaps[-1][1], snaps[-1][1], 0.0
+        for i in range(len(snaps) - 1, 0, -1):
+            t0, a = snaps[i - 1]
+            if t0 <= tick:
+                t1, b = snaps[i]
+                return a, b, (tick - t0) / (t1 - t0)
+        return snaps[0][1], snaps[0][1], 0.0
+
+
+def interpolate(a, b, t):
+    """Float arrays for every section, blended ``t`` of the way from ``a``
+    to ``b``. Rows are matched by id; flags and rows that only exist in
+    ``b`` come from ``b``."""
+    out = {}
+    for name, _ in net.SECTIONS:
+        sa, sb = a[name], b[name]
+        src = sb.copy()
+        have = np.zeros(len(sb), bool)
+        if len(sa):
+            at = np.minimum(np.searchsorted(sa["id"], sb["id"]), len(sa) - 1)
+            have = sa["id"][at] == sb["id"]
+            src[have] = sa[at[have]]
+        tp = np.where(have, t, 1.0)
+        sec = {f: sb[f] for f in sb.dtype.names}
+        for f in BLENDED[name]:
+            va, vb = src[f].astype(np.float64), sb[f].astype(np.float64)
+            if f == "yaw":
+                sec[f] = lerp_angle(va * net.YAW_SCALE, vb * net.YAW_SCALE, tp)
+            else:
+                sec[f] = (va + (vb - va) * tp) * SCALES.get(f, 1.0)
+        out[name] = sec
+    return out
+
+
+class NPCView:
+    """NPC arrays as ``main.py`` reads them from ``NPCManager``."""
+
+    def __init__(self):
+        self.x = self.z = self.yaw = self.leg_l = self.leg_r = np.zeros(0)
+
+    def __len__(self):
+        return len(self.x)
+
+
+class View:
+    """What a networked client draws. It has the attributes of ``World``
+    that ``main.py`` reads: ``agent`` and ``agents``, ``npcs``, ``bombs``, the
+    level, ``game_over`` and ``time``."""
+
+    def __init__(self, own_id, walls, room_floors, pads, floor_size):
+        self.own_id = own_id
+        self.walls, self.room_floors = walls, room_floors
+        self.pads = pads
+        self.pad_index = RectSet.of_pads(self.pads)
+        self.bomb_index = PointHash()
+        self.floor_size = floor_size
+        self.bake_cache = BakeCache.of(walls, room_floors, self.pads, self.floor_size)
+        self.level_version = 1
+        self.agents = {}
+        self.npcs = NPCView()
+        self.bombs = []
+        self.game_over = False
+        self.time = 0.0
+
+    @property
+    def agent(self):
+        return self.agents[self.own_id]
+
+
+class ClientRuntime:
+    """Jitter buffer, interpolation and own-agent prediction for a ``NetClient``.
+
+    ``advance(frame_dt, inputs)`` runs the local fixed ticks, sending and
+    predicting one input each. ``update_view(now)`` refreshes ``view`` for
+    drawing. With a GL loop, ``pump()`` once per frame processes the
+    network I/O that arrived meanwhile.
+    """
+
+    def __init__(self, client, clock=time.perf_counter):
+        self.client = client
+        self.clock = clock
+        self.dt = client.dt
+        self.buffer = SnapshotBuffer(client.dt, client.send_every)
+        self.collision = WallGrid(client.walls, sim.AGENT_RADIUS)
+        self.view = View(client.id, client.walls, client.room_floors, client.pads, client.floor_size)
+        self.predicted = None
+        self.pending = collections.deque()    # (seq, bits) not yet applied by the server
+        self.smooth_x = self.smooth_z = 0.0
+        self.accumulator = 0.0
+        self.corrections = 0
+        self.correction_sum = 0.0
+        self._action = False
+        self._last_view = None
+        self.loop = None
+
+    @classmethod
+    def connect(cls, host, port, clock=time.perf_counter):
+        """Connect from synchronous code (the GL loop); drive it with ``pump``."""
+        loop = asyncio.new_event_loop()
+        client = net.NetClient()
+        loop.run_until_complete(client.connect(host, port))
+        runtime = cls(client, clock)
+        runtime.loop = loop
+        runtime.receiver = loop.create_task(runtime.receive())
+        while runtime.predicted is None and not runtime.receiver.done():
+            runtime.pump()
+        if runtime.predicted is None:
+            raise ConnectionError("el servidor cerró la conexión")
+        runtime.update_view(runtime.clock())
+        return runtime
+
+    def pump(self):
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+
+    def close(self):
+        self.client.close()
+        if self.loop is not None:
+            self.receiver.cancel()
+            self.pump()
+            self.loop.close()
+
+    async def receive(self):
+        try:
+            while True:
+                if self.client.apply(*await net.read_message(self.client.reader)):
+                    self.on_snapshot(self.clock())
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    def on_snapshot(self, now):
+        c = self.client
+        self.buffer.push(c.tick, now, c.state)
+        own = c.state["players"][c.state["players"]["id"] == c.id]
+        if not len(own):
+            return
+        while self.pending and self.pending[0][0] <= c.last_seq:
+            self.pending.popleft()
+        rec = own[0]
+        if self.predicted is None:
+            self.predicted = sim.AgentState()
+        p = self.predicted
+        old_x, old_z = p.x, p.z
+        p.x, p.z = float(rec["x"]) * net.POS_SCALE, float(rec["z"]) * net.POS_SCALE
+        p.yaw = float(rec["yaw"]) * net.YAW_SCALE
+        if not c.game_over:
+            for _, bits in self.pending:
+                sim.process_input(p, bits, self.dt, self.collision)
+        p.carrying_index = int(rec["carry"]) if rec["flags"] & net.P_CARRY else None
+        err = math.hypot(p.x - old_x, p.z - old_z)
+        if err < SNAP_DISTANCE:
+            self.smooth_x += old_x - p.x
+            self.smooth_z += old_z - p.z
+        else:
+            self.smooth_x = self.smooth_z = 0.0
+        self.corrections += 1
+        self.correction_sum += err
+
+    def queue_action(self):
+        self._action = True
+
+    def advance(self, frame_dt, inputs):
+        self.accumulator += min(frame_dt, sim.MAX_FRAME_DT)
+        while self.accumulator >= self.dt:
+            bits = inputs & ~sim.IN_ACTION
+            if self._action:
+                bits |= sim.IN_ACTION
+                self._action = False
+            seq = self.client.send_input(bits)
+            self.pending.append((seq, bits))
+            if self.predicted is not None and not self.client.game_over:
+                sim.process_input(self.predicted, bits, self.dt, self.collision)
+                sim.animate_legs(self.predicted, self.dt)
+            self.accumulator -= self.dt
+        return []
+
+    def update_view(self, now):
+        view = self.view
+        if not self.buffer.snapshots:
+            return view
+        frame_dt = 0.0 if self._last_view is None else now - self._last_view
+        self._last_view = now
+        k = math.exp(-frame_dt / SMOOTH_TIME)
+        self.smooth_x *= k
+        self.smooth_z *= k
+
+        a, b, t = self.buffer.sample(now)
+        s = interpolate(a, b, t)
+        agents = {}
+        p = s["players"]
+        for i, pid in enumerate(p["id"].tolist()):
+            agent = view.agents.get(pid) or sim.AgentState()
+            if pid == view.own_id and self.predicted is not None:
+                src = self.predicted
+                agent.x, agent.z, agent.yaw = src.x + self.smooth_x, src.z + self.smooth_z, src.yaw
+                agent.leg_l, agent.leg_r, agent.state = src.leg_l, src.leg_r, src.state
+                agent.carrying_index = src.carrying_index
+            else:
+                agent.x, agent.z, agent.yaw = float(p["x"][i]), float(p["z"][i]), float(p["yaw"][i])
+                agent.leg_l, agent.leg_r = float(p["leg_l"][i]), float(p["leg_r"][i])
+                agent.state = 'walk' if p["flags"][i] & net.P_WALK else 'idle'
+                agent.carrying_index = int(p["carry"][i]) if p["flags"][i] & net.P_CARRY else None
+            agents[pid] = agent
+        view.agents = agents
+
+        n = s["npcs"]
+        view.npcs.x, view.npcs.z, view.npcs.yaw = n["x"], n["z"], n["yaw"]
+        view.npcs.leg_l, view.npcs.leg_r = n["leg_l"], n["leg_r"]
+
+        bombs = s["bombs"]
+        view.time = self.buffer.render_tick(now) * self.dt
+        if len(view.bombs) != len(bombs["x"]):
+            view.bombs = [sim.Bomb() for _ in range(len(bombs["x"]))]
+            view.bomb_index = PointHash()
+        for i, bomb in enumerate(view.bombs):
+            flags = int(bombs["flags"][i])
+            bomb.world_pos = (float(bombs["x"][i]), float(bombs["y"][i]), float(bombs["z"][i]))
+            bomb.timer, bomb.start_time = float(bombs["remaining"][i]), view.time
+            bomb.active = bool(flags & net.B_ACTIVE)
+            bomb.deactivated = bool(flags & net.B_DEACTIVATED)
+            bomb.exploded = bool(flags & net.B_EXPLODED)
+            bomb.carried = bool(flags & net.B_CARRIED)
+            if bomb.carried:
+                view.bomb_index.discard(i)
+            else:
+                view.bomb_index.move(i, bomb.world_pos[0], bomb.world_pos[2])
+        view.game_over = self.client.game_over
+        return view
+
+
+async def lag_proxy(listen_port, target_port, delay, jitter, seed=0):
+    """TCP proxy on localhost that holds every chunk for ``delay`` plus up
+    to ``jitter`` seconds, in order, both ways."""
+    rng = random.Random(seed)
+    loop = asyncio.get_running_loop()
+
+    async def pipe(reader, writer):
+        release = 0.0
+        try:
+            while True:
+                data = await reader.read(1 << 16)
+                if not data:
+                    break
+                release = max(release, loop.time() + delay + rng.uniform(0.0, jitter))
+                loop.call_at(release, writer.write, data)
+        except ConnectionError:
+            pass
+        loop.call_at(release, writer.close)
+
+    async def handle(reader, writer):
+        up_reader, up_writer = await asyncio.open_connection("127.0.0.1", target_port)
+        await asyncio.gather(pipe(reader, up_writer), pipe(up_reader, writer))
+
+    return await asyncio.start_server(handle, "127.0.0.1", listen_port)
+
+
+async def _bench(seconds, lag, jitter, fps, bots):
+    port = random.randrange(20000, 40000)
+    server = net.GameServer(sim.World(players=()))
+    serving = asyncio.ensure_future(server.run("127.0.0.1", port, duration=seconds + 1.0))
+    proxy = await lag_proxy(port + 1, port, lag / 2, jitter / 2)
+    await asyncio.sleep(0.1)
+    others = asyncio.gather(*[net.run_bot("127.0.0.1", port, seconds, seed=i) for i in range(bots)])
+
+    client = net.NetClient()
+    await client.connect("127.0.0.1", port + 1)
+    runtime = ClientRuntime(client)
+    receiver = asyncio.ensure_future(runtime.receive())
+    rng = random.Random(3)
+    frame = 1.0 / fps
+    start = prev = time.perf_counter()
+    bits = 0
+    npc_interp, npc_latest = [], []
+    while time.perf_counter() - start < seconds:
+        await asyncio.sleep(frame)
+        now = time.perf_counter()
+        if rng.random() < 0.02:
+            bits = rng.choice((sim.IN_FORWARD, sim.IN_FORWARD | sim.IN_LEFT, sim.IN_BACK, 0))
+        runtime.advance(now - prev, bits)
+        prev = now
+        view = runtime.update_view(now)
+        if not runtime.buffer.snapshots or not len(view.npcs):
+            continue
+        npc_interp.append((now, view.npcs.x[0], view.npcs.z[0]))
+        latest = client.state["npcs"]
+        npc_latest.append((now, latest["x"][0] * net.POS_SCALE, latest["z"][0] * net.POS_SCALE))
+    client.close()
+    receiver.cancel()
+    await others
+    await serving
+    proxy.close()
+    return runtime, np.array(npc_interp), np.array(npc_latest)
+
+def _jerk(track):
+    """RMS change in per-frame velocity of a rendered (t, x, z) track, m/s per frame."""
+    t, xz = track[:, 0], track[:, 1:]
+    v = np.diff(xz, axis=0) / np.diff(t)[:, None]
+    return float(np.sqrt((np.diff(v, axis=0) ** 2).sum(axis=1).mean()))
+
+def benchmark(seconds=6.0, lag=0.08, jitter=0.03, fps=120, bots=3):
+    runtime, interp, latest = asyncio.run(_bench(seconds, lag, jitter, fps, bots))
+    print(f"RTT {lag*1e3:.0f} ms ±{jitter*1e3:.0f} ms, render a {fps} fps, {bots} bots")
+    print(f"guardia dibujado desde el último snapshot: tirones {_jerk(latest):7.2f} m/s por frame")
+    print(f"guardia interpolado (retardo {runtime.buffer.delay*1e3:.0f} ms):  tirones {_jerk(interp):7.2f} m/s por frame, "
+          f"{runtime.buffer.starved} frames sin snapshot nuevo")
+    if runtime.corrections:
+        print(f"predicción: error medio al reconciliar {runtime.correction_sum / runtime.corrections * 100:.2f} cm "
+              f"en {runtime.corrections} snapshots; la entrada se ve en el frame siguiente en lugar de tras ~{lag*1e3:.0f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runtime de cliente de red")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("bench", help="measure interpolation and prediction against a local server")
+    p.add_argument("--seconds", type=float, default=6.0)
+    p.add_argument("--lag", type=float, default=0.08, help="round-trip time added by the proxy, seconds")
+    p.add_argument("--jitter", type=float, default=0.03, help="extra random round-trip delay, seconds")
+    p.add_argument("--fps", type=int, default=120)
+    args = parser.parse_args(argv)
+    benchmark(args.seconds, args.lag, args.jitter, args.fps)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
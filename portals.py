@@ -0,0 +1,148 @@
+"""Room/portal visibility for levels laid out like ``sim.build_rooms``.
+
+Every room floor is a cell: the box from the floor up to the top of its
+walls. Everything else is one "outside" cell. Portals are the openings
+between cells: the gaps in the wall runs along each room side (the doors)
+and, since rooms have no ceiling, the room's open top. Each frame the
+camera's frustum is walked through the portal graph from the camera's cell,
+narrowed by every portal it passes, so a cell is only visible through the
+openings that lead to it.
+"""
+import numpy as np
+
+from visibility import LOD_DISTANCES
+
+MIN_DOOR = 0.5      # wall gaps narrower than this (m) are seams, not doors
+PROBE = 0.5         # how far past a door to look for the cell beyond it (m)
+EPS = 1e-3
+
+
+def _gaps(intervals, a, b):
+    """The parts of ``[a, b]`` not covered by ``intervals``."""
+    out, pos = [], a
+    for lo, hi in sorted(intervals):
+        if lo > pos:
+            out.append((pos, min(lo, b)))
+        pos = max(pos, hi)
+        if pos >= b:
+            break
+    if pos < b:
+        out.append((pos, b))
+    return [(lo, hi) for lo, hi in out if hi - lo >= MIN_DOOR]
+
+
+class PortalGraph:
+    """Cells and portals of one level, built from its walls and room floors."""
+
+    def __init__(self, walls, room_floors):
+        rects = np.array([f[:4] for f in room_floors], dtype=np.float64).reshape(-1, 4)
+        w = np.asarray(walls, dtype=np.float64).reshape(-1, 6)
+        lo, hi = w[:, :3] - w[:, 3:] / 2, w[:, :3] + w[:, 3:] / 2
+        self.outside = len(rects)
+        self.mins = np.zeros((len(rects), 3))
+        self.maxs = np.zeros((len(rects), 3))
+        self.mins[:, [0, 2]], self.maxs[:, [0, 2]] = rects[:, [0, 1]], rects[:, [2, 3]]
+        for r, (x0, z0, x1, z1) in enumerate(rects.tolist()):
+            touching = ((lo[:, 0] <= x1 + EPS) & (hi[:, 0] >= x0 - EPS) &
+                        (lo[:, 2] <= z1 + EPS) & (hi[:, 2] >= z0 - EPS))
+            self.maxs[r, 1] = hi[touching, 1].max() if touching.any() else 0.0
+
+        self.portals = []       # (K, 3) corners
+        self.links = [[] for _ in range(len(rects) + 1)]    # cell -> [(portal, other cell)]
+        for r in range(len(rects)):
+            top = self.maxs[r, 1]
+            full = (lo[:, 1] <= EPS) & (hi[:, 1] >= top - EPS)
+            x0, _, z0 = self.mins[r]
+            x1, _, z1 = self.maxs[r]
+            # (fixed axis, value, outward sign, running axis, start, end)
+            for k, v, out, j, a, b in ((2, z0, -1, 0, x0, x1), (2, z1, 1, 0, x0, x1),
+                                       (0, x0, -1, 2, z0, z1), (0, x1, 1, 2, z0, z1)):
+                along = full & (lo[:, k] <= v + EPS) & (hi[:, k] >= v - EPS)
+                for g0, g1 in _gaps(zip(lo[along, j].tolist(), hi[along, j].tolist()), a, b):
+                    probe = np.zeros((1, 3))
+                    probe[0, k], probe[0, j], probe[0, 1] = v + out * PROBE, (g0 + g1) / 2, top / 2
+                    other = int(self.cell_of(probe)[0])
+                    if other == r or other < r:     # a door between two rooms is added once
+                        continue
+                    corners = np.zeros((4, 3))
+                    corners[:, k] = v
+                    corners[:, j] = (g0, g1, g1, g0)
+                    corners[:, 1] = (0.0, 0.0, top, top)
+                    self._link(r, other, corners)
+            roof = np.array([(x0, top, z0), (x1, top, z0), (x1, top, z1), (x0, top, z1)])
+            self._link(r, self.outside, roof)
+
+    def _link(self, a, b, corners):
+        self.portals.append(corners)
+        self.links[a].append((len(self.portals) - 1, b))
+        self.links[b].append((len(self.portals) - 1, a))
+
+    def cell_of(self, points):
+        """Cell index of each point ``(N, 3)``: a room, or ``outside``."""
+        p = np.asarray(points, dtype=np.float64).reshape(-1, 3)[:, None, :]
+        inside = ((self.mins <= p) & (p <= self.maxs)).all(axis=2)
+        return np.where(inside.any(axis=1), inside.argmax(axis=1), self.outside)
+
+    def overlaps(self, mins, maxs):
+        """``(N, cells)`` mask of the cells each box touches."""
+        mins = np.asarray(mins, dtype=np.float64)[:, None, :]
+        maxs = np.asarray(maxs, dtype=np.float64)[:, None, :]
+        rooms = ((mins <= self.maxs) & (maxs >= self.mins)).all(axis=2)
+        within = ((mins >= self.mins) & (maxs <= self.maxs)).all(axis=2)
+        return np.concatenate([rooms, ~within.any(axis=1, keepdims=True)], axis=1)
+
+    def view(self, frustum):
+        """What ``frustum`` sees of the level, as a PortalView."""
+        seen = {}
+
+        def walk(cell, fr, path):
+            seen.setdefault(cell, []).append(fr)
+            for portal, other in self.links[cell]:
+                if other not in path:
+                    narrow = fr.through(self.portals[portal])
+                    if narrow is not None:
+                        walk(other, narrow, path | {other})
+
+        start = int(self.cell_of(frustum.eye)[0])
+        walk(start, frustum, {start})
+        return PortalView(self, frustum, seen)
+
+
+class PortalView:
+    """The cells a camera sees and the narrowed frusta it sees each through.
+
+    Has the test methods of ``visibility.Frustum``: a volume passes if one
+    of the visible cells it touches sees it.
+    """
+
+    def __init__(self, graph, frustum, seen):
+        self.graph = graph
+        self.frustum = frustum
+        self.eye = frustum.eye
+        self.seen = seen        # cell -> [Frustum]
+
+    def _test(self, mins, maxs, test):
+        cells = self.graph.overlaps(mins, maxs)
+        out = np.zeros(len(cells), dtype=bool)
+        for cell, frusta in self.seen.items():
+            rows = np.flatnonzero(cells[:, cell] & ~out)
+            for fr in frusta:
+                if not len(rows):
+                    break
+                hit = test(fr, rows)
+                out[rows[hit]] = True
+                rows = rows[~hit]
+        return out
+
+    def spheres(self, centers, radii):
+        c = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+        r = np.broadcast_to(np.asarray(radii, dtype=np.float64), (len(c),))
+        ext = r[:, None]
+        return self._test(c - ext, c + ext, lambda fr, rows: fr.spheres(c[rows], r[rows]))
+
+    def boxes(self, mins, maxs):
+        mins, maxs = np.asarray(mins), np.asarray(maxs)
+        return self._test(mins, maxs, lambda fr, rows: fr.boxes(mins[rows], maxs[rows]))
+
+    def lod(self, centers, distances=LOD_DISTANCES):
+        return self.frustum.lod(centers, distances)
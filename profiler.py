@@ -0,0 +1,110 @@
+import csv
+import json
+import time
+
+import numpy as np
+
+SIM_PHASES = ("process_input", "carry_anim", "update_npc", "bombs")
+# Ticks run on the sim thread with their own profiler (see simthread.py).
+FRAME_PHASES = ("events", "draw", "hud", "swap", "poll")
+
+class NullProfiler:
+    """Stand-in used when profiling is off; every hook is an empty method."""
+
+    enabled = False
+
+    def begin_frame(self):
+        pass
+
+    def mark(self, phase):
+        pass
+
+    def gl_calls(self, phase, n):
+        pass
+
+    def end_frame(self):
+        pass
+
+NULL_PROFILER = NullProfiler()
+
+
+class FrameProfiler:
+    """Phase timings for the last ``capacity`` frames in a fixed ring buffer.
+
+    ``mark(phase)`` charges the time since the previous mark to ``phase``.
+    A phase may be marked several times per frame (once per sim tick); the
+    times add up.
+    """
+
+    enabled = True
+
+    def __init__(self, phases=FRAME_PHASES, capacity=4096):
+        self.phases = tuple(phases)
+        self.col = {p: i for i, p in enumerate(self.phases)}
+        self.capacity = capacity
+        self.times = np.zeros((capacity, len(self.phases)))
+        self.calls = np.zeros((capacity, len(self.phases)), dtype=np.int64)
+        self.frame_time = np.zeros(capacity)
+        self.frames = 0
+        self._row = 0
+        self._start = self._last = time.perf_counter()
+
+    def begin_frame(self):
+        self.times[self._row] = 0.0
+        self.calls[self._row] = 0
+        self._start = self._last = time.perf_counter()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.times[self._row, self.col[phase]] += now - self._last
+        self._last = now
+
+    def gl_calls(self, phase, n):
+        self.calls[self._row, self.col[phase]] += n
+
+    def end_frame(self):
+        self.frame_time[self._row] = time.perf_counter() - self._start
+        self.frames += 1
+        self._row = self.frames % self.capacity
+
+    def _filled(self):
+        n = min(self.frames, self.capacity)
+        return self.frame_time[:n], self.times[:n], self.calls[:n]
+
+    def summary(self):
+        frame, times, calls = self._filled()
+        if not len(frame):
+            return {"frames": 0}
+        ms = lambda a, q: float(np.percentile(a, q) * 1e3)
+        out = {"frames": self.frames,
+               "frame_ms": {"p50": ms(frame, 50), "p95": ms(frame, 95), "p99": ms(frame, 99)},
+               "phases": {}}
+        for p, i in self.col.items():
+            out["phases"][p] = {"p50_ms": ms(times[:, i], 50), "p95_ms": ms(times[:, i], 95),
+                                "p99_ms": ms(times[:, i], 99), "gl_calls_mean": float(calls[:, i].mean())}
+        return out
+
+    def title_suffix(self):
+        s = self.summary()
+        if not s["frames"]:
+            return ""
+        f = s["frame_ms"]
+        return f" | frame p50 {f['p50']:.1f}ms p95 {f['p95']:.1f}ms p99 {f['p99']:.1f}ms"
+
+    def dump(self, path):
+        """Write per-frame rows as CSV (``.csv``) or the summary plus rows as JSON."""
+        frame, times, calls = self._filled()
+        # Oldest frame first once the ring has wrapped.
+        order = np.roll(np.arange(len(frame)), -self._row) if self.frames > self.capacity else np.arange(len(frame))
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as f:
+                w = csv.writer(f)
+                w.writerow(["frame_ms"] + [f"{p}_ms" for p in self.phases] + [f"{p}_gl" for p in self.phases])
+                for r in order:
+                    w.writerow([f"{frame[r]*1e3:.4f}"] + [f"{t*1e3:.4f}" for t in times[r]] + list(calls[r]))
+        else:
+            rows = [{"frame_ms": frame[r] * 1e3,
+                     **{p: times[r, i] * 1e3 for p, i in self.col.items()},
+                     "gl_calls": {p: int(calls[r, i]) for p, i in self.col.items()}} for r in order]
+            with open(path, "w") as f:
+                json.dump({"summary": self.summary(), "frames": rows}, f, indent=1)
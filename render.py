@@ -0,0 +1,233 @@
+"""Everything the local game draws with OpenGL: the level, the characters
+and the HUD of one ``world`` (a ``simthread.SnapshotView`` or a
+``netclient.View``).
+
+This is the only module of the game that imports OpenGL, together with the
+``render_queue`` and ``text_overlay`` it draws through; ``main.py`` loads it
+once it has decided to open a window, so tools that only need the
+simulation never pay for it.
+"""
+import math
+
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.GLU import gluLookAt, gluPerspective
+
+from static_scene import VERTEX_STRIDE, load_static_scene
+from textures import load_mip_chain
+from render_queue import Material, RenderQueue, VBOMesh, ArrayMesh
+from meshes import CARGO_SIZE, HumanoidPose, humanoid_parts, cargo_parts, bake_instances
+from visibility import SPHERE_LODS, Frustum
+from portals import PortalGraph
+from interest import CAMERA_BACK
+from text_overlay import LINE_HEIGHT, TextOverlay, text_width
+
+WIN_W, WIN_H = 1280, 720
+FOVY, NEAR, FAR = 60.0, 0.1, 500.0
+
+world = None
+render_queue = None
+hud = None
+floor_tex = None
+
+def make_checkerboard_tex(size=256, checks=16):
+    levels = load_mip_chain("checkerboard", size=size, checks=checks)
+    tex_id = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, tex_id)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+    for level, img in enumerate(levels):
+        h, w = img.shape[:2]
+        glTexImage2D(GL_TEXTURE_2D, level, GL_RGB, w, h, 0, GL_RGB, GL_UNSIGNED_BYTE, np.ascontiguousarray(img))
+    glBindTexture(GL_TEXTURE_2D, 0)
+    return tex_id
+
+class StaticSceneGL:
+    """Static level geometry uploaded once into one VBO per material batch."""
+
+    def __init__(self, batches, level_version):
+        self.level_version = level_version
+        self.batches = batches
+        self.vbos = glGenBuffers(len(batches)) if batches else []
+        if len(batches) == 1:
+            self.vbos = [self.vbos]
+        for vbo, batch in zip(self.vbos, batches):
+            glBindBuffer(GL_ARRAY_BUFFER, vbo)
+            glBufferData(GL_ARRAY_BUFFER, batch.data.nbytes, batch.data, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def delete(self):
+        if self.vbos:
+            glDeleteBuffers(len(self.vbos), self.vbos)
+        self.vbos = []
+
+    def submit(self, queue, tex_id, view=None):
+        for vbo, batch in zip(self.vbos, self.batches):
+            ranges = None
+            if batch.chunks is not None and view is not None:
+                firsts, counts, mins, maxs = batch.chunks
+                seen = view.boxes(mins, maxs)
+                if not seen.any():
+                    continue
+                ranges = (firsts[seen], counts[seen])
+            mesh = VBOMesh(vbo, batch.count, VERTEX_STRIDE, textured=batch.textured, ranges=ranges)
+            queue.submit(Material.get(**batch.material), mesh, cull=batch.cull, texture=tex_id)
+
+static_scene = None
+
+def submit_static_scene(queue, view=None):
+    global static_scene
+    if static_scene is None or static_scene.level_version != world.level_version:
+        if static_scene is not None:
+            static_scene.delete()
+        batches = load_static_scene(world.bake_cache, world.walls, world.room_floors, world.pads, world.floor_size)
+        static_scene = StaticSceneGL(batches, world.level_version)
+    static_scene.submit(queue, floor_tex, view)
+
+portal_graph = None
+portal_version = None
+
+def level_view(frustum):
+    """``frustum`` walked through the level's portals (portals.PortalView)."""
+    global portal_graph, portal_version
+    if portal_graph is None or portal_version != world.level_version:
+        portal_graph = PortalGraph(world.walls, world.room_floors)
+        portal_version = world.level_version
+    return portal_graph.view(frustum)
+
+AGENT_COLORS = ((60, 140, 230), (110, 180, 255))
+PLAYER_COLORS = ((70, 170, 120), (130, 215, 165))
+NPC_COLORS = ((200, 60, 60), (245, 120, 120))
+
+def cargo_color(b):
+    if b.deactivated:
+        return (100, 220, 100)
+    elif b.exploded:
+        return (240, 60, 60)
+    return (240, 210, 80)
+
+def submit_instances(queue, groups):
+    for color, positions, normals in groups:
+        queue.submit(Material.get(color), ArrayMesh(positions, normals), cull=False)
+
+CHARACTER_CENTER_Y = 0.95
+CHARACTER_RADIUS = 1.2      # bounds the body, the pickup crouch and carried cargo
+CARGO_RADIUS = CARGO_SIZE * math.sqrt(3) / 2
+
+def submit_characters(queue, view=None):
+    """Characters and cargo; with ``view`` (a visibility.Frustum or
+    portals.PortalView), only what it sees, with body and head detail by
+    distance."""
+    own, agents, npcs = world.agent, list(world.agents.values()), world.npcs
+    pose = HumanoidPose.concat([
+        HumanoidPose.from_entities([(a, *(AGENT_COLORS if a is own else PLAYER_COLORS)) for a in agents]),
+        HumanoidPose(npcs.x, np.zeros(len(npcs)), npcs.z, npcs.yaw, npcs.leg_l, npcs.leg_r,
+                     torso_color=np.tile(NPC_COLORS[0], (len(npcs), 1)),
+                     head_color=np.tile(NPC_COLORS[1], (len(npcs), 1))),
+    ])
+    carrying = np.array([a.carrying_index is not None and a.anim_state == 'none' for a in agents] +
+                        [False] * len(npcs), dtype=bool)
+    if view is None:
+        parts, roots = humanoid_parts(pose)
+    else:
+        centers = np.stack([pose.x, pose.y + CHARACTER_CENTER_Y, pose.z], axis=1)
+        seen = np.flatnonzero(view.spheres(centers, CHARACTER_RADIUS))
+        pose, carrying = pose.take(seen), carrying[seen]
+        parts, roots = humanoid_parts(pose, view.lod(centers[seen]), SPHERE_LODS)
+        agents = [agents[i] if i < len(agents) else None for i in seen.tolist()]
+
+    carriers = np.flatnonzero(carrying).tolist()
+    if carriers:
+        parts += cargo_parts([(0.0, 1.1, 0.28)] * len(carriers),
+                             [cargo_color(world.bombs[agents[i].carrying_index]) for i in carriers],
+                             parent=roots[carriers])
+
+    ground = [b for b in world.bombs if not b.carried]
+    if ground and view is not None:
+        seen = view.spheres([b.world_pos for b in ground], CARGO_RADIUS)
+        ground = [b for b, s in zip(ground, seen.tolist()) if s]
+    if ground:
+        parts += cargo_parts([b.world_pos for b in ground], [cargo_color(b) for b in ground])
+
+    submit_instances(queue, bake_instances(parts))
+
+def setup_opengl():
+    glViewport(0, 0, WIN_W, WIN_H)
+    glEnable(GL_DEPTH_TEST)
+    glEnable(GL_CULL_FACE); glCullFace(GL_BACK)
+
+    glEnable(GL_LIGHTING); glEnable(GL_LIGHT0)
+    glLightfv(GL_LIGHT0, GL_POSITION, (GLfloat * 4)(0.6, 1.0, 0.3, 0.0))
+    glLightfv(GL_LIGHT0, GL_DIFFUSE, (GLfloat * 4)(1.0, 1.0, 1.0, 1.0))
+    glLightfv(GL_LIGHT0, GL_SPECULAR, (GLfloat * 4)(0.9, 0.9, 0.9, 1.0))
+    glLightModelfv(GL_LIGHT_MODEL_AMBIENT, (GLfloat * 4)(0.22,0.22,0.24,1.0))
+    glLightModeli(GL_LIGHT_MODEL_TWO_SIDE, GL_TRUE)
+
+    glEnable(GL_NORMALIZE)
+    glShadeModel(GL_SMOOTH)
+    glClearColor(0.62, 0.70, 0.78, 1.0)
+
+def set_projection():
+    glMatrixMode(GL_PROJECTION); glLoadIdentity()
+    gluPerspective(FOVY, WIN_W/float(WIN_H), NEAR, FAR)
+    glMatrixMode(GL_MODELVIEW)
+
+def set_camera():
+    """Load the chase camera behind the local player and return its Frustum."""
+    agent = world.agent
+    glLoadIdentity()
+    ex = agent.x - CAMERA_BACK*math.sin(math.radians(agent.yaw))
+    ey = 7.5
+    ez = agent.z - CAMERA_BACK*math.cos(math.radians(agent.yaw))
+    cx, cy, cz = agent.x, 1.0, agent.z
+    gluLookAt(ex,ey,ez, cx,cy,cz, 0,1,0)
+    return Frustum.from_camera((ex, ey, ez), (cx, cy, cz), FOVY, WIN_W/float(WIN_H), NEAR, FAR)
+
+CAMERA_GL_CALLS = 2     # glLoadIdentity and gluLookAt in set_camera
+
+def draw_scene():
+    """Draw the level and characters; returns the GL calls issued."""
+    glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+    view = level_view(set_camera())
+
+    submit_static_scene(render_queue, view)
+    submit_characters(render_queue, view)
+    render_queue.flush()
+    return 1 + CAMERA_GL_CALLS + render_queue.stats["gl_calls"]
+
+def init(view):
+    """Set up the current GL context to draw ``view``."""
+    global world, floor_tex, render_queue, hud, static_scene
+    world = view
+    setup_opengl()
+    set_projection()
+    floor_tex = make_checkerboard_tex()
+    render_queue = RenderQueue()
+    hud = TextOverlay(WIN_W, WIN_H)
+    static_scene = None
+
+HUD_SCALE = 2
+HUD_X, HUD_Y = 12, 12
+HUD_MAX_LINES = 8
+
+def draw_hud(lines):
+    """Update the HUD labels (only the ones whose text changed get laid out
+    again) and draw them; returns the GL calls issued."""
+    step = LINE_HEIGHT * HUD_SCALE
+    width = max(text_width(line, HUD_SCALE) for line in lines)
+    hud.panel("panel", HUD_X - 6, HUD_Y - 6, width + 12, len(lines) * step + 6)
+    for i in range(HUD_MAX_LINES):
+        if i < len(lines):
+            hud.text(f"line{i}", lines[i], HUD_X, HUD_Y + i * step, HUD_SCALE)
+        else:
+            hud.remove(f"line{i}")
+    if world.game_over:
+        hud.text("game_over", "¡Fin del Juego!", WIN_W // 2, WIN_H // 2 - 40, scale=5, align="center")
+        hud.text("game_over_hint", "Presiona R para reiniciar", WIN_W // 2, WIN_H // 2 + 20, align="center")
+    else:
+        hud.remove("game_over")
+        hud.remove("game_over_hint")
+    return hud.draw()
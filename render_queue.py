@@ -0,0 +1,184 @@
+import ctypes
+
+import numpy as np
+from OpenGL.GL import (
+    GL_AMBIENT, GL_ARRAY_BUFFER, GL_CULL_FACE, GL_DIFFUSE, GL_FLOAT, GL_FRONT_AND_BACK,
+    GL_NORMAL_ARRAY, GL_QUADS, GL_SHININESS, GL_SPECULAR, GL_TEXTURE_2D,
+    GL_TEXTURE_COORD_ARRAY, GL_VERTEX_ARRAY,
+    glBindBuffer, glBindTexture, glDisable, glDisableClientState, glDrawArrays, glEnable,
+    glEnableClientState, glMaterialf, glMaterialfv, glMultiDrawArrays, glMultMatrixf, glNormalPointer,
+    glPopMatrix, glPushMatrix, glTexCoordPointer, glVertexPointer,
+)
+
+class Material:
+    """Fixed-function material with its GL parameter arrays built once."""
+
+    _cache = {}
+    _next_id = 0
+
+    def __init__(self, diffuse, ambient, specular, shininess):
+        self.id = Material._next_id
+        Material._next_id += 1
+        self.ambient = np.array([*(c/255.0 for c in ambient), 1.0], dtype=np.float32)
+        self.diffuse = np.array([*(c/255.0 for c in diffuse), 1.0], dtype=np.float32)
+        self.specular = np.array([*(c/255.0 for c in specular), 1.0], dtype=np.float32)
+        self.shininess = float(shininess)
+
+    @classmethod
+    def get(cls, diffuse, ambient=None, specular=(50,50,50), shininess=48):
+        """Interned material: equal parameters always return the same object."""
+        key = (tuple(diffuse), None if ambient is None else tuple(ambient), tuple(specular), shininess)
+        mat = cls._cache.get(key)
+        if mat is None:
+            if ambient is None:
+                ambient = tuple([c*0.45 for c in diffuse])
+            mat = cls._cache[key] = cls(diffuse, ambient, specular, shininess)
+        return mat
+
+
+class VBOMesh:
+    """Interleaved position/normal/texcoord quads living in a GL buffer.
+    ``ranges`` (``(firsts, counts)`` int32 arrays) draws only those vertex
+    ranges, in one ``glMultiDrawArrays``."""
+
+    def __init__(self, vbo, count, stride, textured=False, ranges=None):
+        self.vbo = vbo
+        self.count = count
+        self.stride = stride
+        self.textured = textured
+        self.ranges = ranges
+
+class ArrayMesh:
+    """Client-side quad arrays, re-sent every draw (for per-frame geometry)."""
+
+    textured = False
+
+    def __init__(self, positions, normals):
+        self.positions = positions
+        self.normals = normals
+        self.count = len(positions)
+
+
+class StateCache:
+    """Shadow copy of the GL state the queue touches. Calls are only issued
+    when the requested value differs from the one last set."""
+
+    def __init__(self):
+        self.calls = 0
+        self.invalidate()
+
+    def invalidate(self):
+        self.material = None
+        self.ambient = self.diffuse = self.specular = self.shininess = None
+        self.cull = None
+        self.texture = None
+        self.arrays = {}
+        self.buffer = None
+
+    def set_material(self, mat):
+        if mat is self.material:
+            return
+        if self.ambient is None or not np.array_equal(self.ambient, mat.ambient):
+            glMaterialfv(GL_FRONT_AND_BACK, GL_AMBIENT, mat.ambient); self.calls += 1
+            self.ambient = mat.ambient
+        if self.diffuse is None or not np.array_equal(self.diffuse, mat.diffuse):
+            glMaterialfv(GL_FRONT_AND_BACK, GL_DIFFUSE, mat.diffuse); self.calls += 1
+            self.diffuse = mat.diffuse
+        if self.specular is None or not np.array_equal(self.specular, mat.specular):
+            glMaterialfv(GL_FRONT_AND_BACK, GL_SPECULAR, mat.specular); self.calls += 1
+            self.specular = mat.specular
+        if self.shininess != mat.shininess:
+            glMaterialf(GL_FRONT_AND_BACK, GL_SHININESS, mat.shininess); self.calls += 1
+            self.shininess = mat.shininess
+        self.material = mat
+
+    def set_cull(self, on):
+        if on != self.cull:
+            (glEnable if on else glDisable)(GL_CULL_FACE); self.calls += 1
+            self.cull = on
+
+    def set_texture(self, tex_id):
+        if tex_id == self.texture:
+            return
+        if tex_id:
+            if not self.texture:
+                glEnable(GL_TEXTURE_2D); self.calls += 1
+            glBindTexture(GL_TEXTURE_2D, tex_id); self.calls += 1
+        else:
+            glBindTexture(GL_TEXTURE_2D, 0); glDisable(GL_TEXTURE_2D); self.calls += 2
+        self.texture = tex_id
+
+    def set_array(self, kind, on):
+        if self.arrays.get(kind) != on:
+            (glEnableClientState if on else glDisableClientState)(kind); self.calls += 1
+            self.arrays[kind] = on
+
+    def bind_buffer(self, vbo):
+        if vbo != self.buffer:
+            glBindBuffer(GL_ARRAY_BUFFER, vbo); self.calls += 1
+            self.buffer = vbo
+
+
+class RenderQueue:
+    """Collects draw records for a frame and emits them sorted by state.
+
+    Records are ``(material, cull, texture, mesh, transform)``. ``flush``
+    orders them by texture, culling and material so consecutive draws share
+    as much state as possible, then restores the defaults the rest of the
+    frame expects (culling on, no texture, no client arrays).
+    """
+
+    def __init__(self):
+        self.items = []
+        self.state = StateCache()
+        self.stats = {"draw_calls": 0, "gl_calls": 0, "vertices": 0}
+
+    def submit(self, material, mesh, cull=True, texture=0, transform=None):
+        self.items.append((texture or 0, cull, material.id, len(self.items), material, mesh, transform))
+
+    def flush(self):
+        st = self.state
+        st.invalidate()
+        st.calls = 0
+        draws = vertices = 0
+        self.items.sort(key=lambda it: it[:4])
+        st.set_array(GL_VERTEX_ARRAY, True)
+        st.set_array(GL_NORMAL_ARRAY, True)
+        for texture, cull, _, _, material, mesh, transform in self.items:
+            st.set_texture(texture if mesh.textured else 0)
+            st.set_cull(cull)
+            st.set_material(material)
+            st.set_array(GL_TEXTURE_COORD_ARRAY, mesh.textured)
+            if isinstance(mesh, VBOMesh):
+                st.bind_buffer(mesh.vbo)
+                glVertexPointer(3, GL_FLOAT, mesh.stride, ctypes.c_void_p(0))
+                glNormalPointer(GL_FLOAT, mesh.stride, ctypes.c_void_p(12))
+                st.calls += 2
+                if mesh.textured:
+                    glTexCoordPointer(2, GL_FLOAT, mesh.stride, ctypes.c_void_p(24)); st.calls += 1
+            else:
+                st.bind_buffer(0)
+                glVertexPointer(3, GL_FLOAT, 0, mesh.positions)
+                glNormalPointer(GL_FLOAT, 0, mesh.normals)
+                st.calls += 2
+            if transform is not None:
+                glPushMatrix(); glMultMatrixf(np.ascontiguousarray(transform.T, dtype=np.float32)); st.calls += 2
+            ranges = getattr(mesh, "ranges", None)
+            if ranges is not None:
+                glMultiDrawArrays(GL_QUADS, ranges[0], ranges[1], len(ranges[0]))
+                vertices += int(ranges[1].sum())
+            else:
+                glDrawArrays(GL_QUADS, 0, mesh.count)
+                vertices += mesh.count
+            draws += 1
+            if transform is not None:
+                glPopMatrix(); st.calls += 1
+        st.bind_buffer(0)
+        st.set_array(GL_TEXTURE_COORD_ARRAY, False)
+        st.set_array(GL_NORMAL_ARRAY, False)
+        st.set_array(GL_VERTEX_ARRAY, False)
+        st.set_texture(0)
+        st.set_cull(True)
+        self.items.clear()
+        self.stats = {"draw_calls": draws, "gl_calls": st.calls + draws, "vertices": vertices}
+        return self.stats
@@ -0,0 +1,225 @@
+"""Compact binary input recordings and headless replay.
+
+A recording is a small header followed by a stream of records:
+
+* input change: tick delta since the previous change (varint) + input bitmask,
+  written only when the per-tick bitmask differs from the last one;
+* keyframe: tick, flags and a zlib-compressed ``World.snapshot()``. One is
+  written every ``keyframe_every`` ticks (``KEYFRAME_SECONDS`` of game time
+  by default) so a replay can seek without simulating from tick 0, and one
+  whenever the world is reset, since resets are not part of the input
+  bitmask;
+* end: the tick the recording stopped at.
+
+    python replay.py session.m4r              # replay headless as fast as possible
+    python replay.py session.m4r --seek 3600  # jump to a tick via the nearest keyframe
+    python replay.py session.m4r --verify     # check every keyframe against the re-simulated state
+"""
+import argparse
+import io
+import json
+import struct
+import sys
+import time
+import zlib
+
+import sim
+
+MAGIC = b"M4RP"
+VERSION = 3
+HEADER = struct.Struct("<4sBd")
+
+REC_INPUT = 1
+REC_KEYFRAME = 2
+REC_END = 3
+
+KF_RESET = 1
+KEYFRAME_SECONDS = 10.0
+
+def write_varint(f, n):
+    while n >= 0x80:
+        f.write(bytes((n & 0x7F | 0x80,)))
+        n >>= 7
+    f.write(bytes((n,)))
+
+def read_varint(f):
+    n = shift = 0
+    while True:
+        b = f.read(1)
+        if not b:
+            raise EOFError
+        n |= (b[0] & 0x7F) << shift
+        if b[0] < 0x80:
+            return n
+        shift += 7
+
+def encode_snapshot(snap):
+    return zlib.compress(json.dumps(snap, separators=(",", ":")).encode())
+
+def decode_snapshot(data):
+    return json.loads(zlib.decompress(data))
+
+
+class Recorder:
+    """Writes the inputs of every tick a World is stepped with.
+
+    Call ``record(world, inputs)`` right before each ``world.step(inputs)``
+    (``FixedStepper.recorder`` does this) and ``reset(world)`` after every
+    ``world.reset()``.
+    """
+
+    def __init__(self, path, world, dt=sim.TICK_DT, keyframe_every=None):
+        self.f = open(path, "wb")
+        self.f.write(HEADER.pack(MAGIC, VERSION, dt))
+        self.keyframe_every = keyframe_every or max(1, round(KEYFRAME_SECONDS / dt))
+        self.last_tick = 0
+        self.last_inputs = 0
+        self.last_keyframe = None
+        self.keyframe(world, KF_RESET)
+
+    def keyframe(self, world, flags=0):
+        data = encode_snapshot(world.snapshot())
+        self.f.write(bytes((REC_KEYFRAME,)))
+        write_varint(self.f, world.tick)
+        self.f.write(bytes((flags,)))
+        write_varint(self.f, len(data))
+        self.f.write(data)
+        self.last_keyframe = world.tick
+
+    def reset(self, world):
+        self.keyframe(world, KF_RESET)
+
+    def record(self, world, inputs):
+        tick = world.tick
+        if tick % self.keyframe_every == 0 and self.last_keyframe != tick:
+            self.keyframe(world)
+        if inputs != self.last_inputs:
+            self.f.write(bytes((REC_INPUT,)))
+            write_varint(self.f, tick - self.last_tick)
+            self.f.write(bytes((inputs,)))
+            self.last_tick = tick
+            self.last_inputs = inputs
+
+    def close(self, world):
+        self.f.write(bytes((REC_END,)))
+        write_varint(self.f, world.tick)
+        self.f.close()
+
+
+class Recording:
+    """A parsed recording: input changes, keyframes and the end tick."""
+
+    def __init__(self, path):
+        with open(path, "rb") as fh:
+            raw = fh.read()
+        magic, version, self.dt = HEADER.unpack_from(raw)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a version {VERSION} recording")
+        f = io.BytesIO(raw[HEADER.size:])
+        self.inputs = []      # (tick, bitmask), ticks ascending
+        self.keyframes = []   # (tick, flags, compressed snapshot), in file order
+        self.end_tick = None
+        tick = 0
+        try:
+            while True:
+                kind = f.read(1)
+                if not kind:
+                    break
+                if kind[0] == REC_INPUT:
+                    tick += read_varint(f)
+                    self.inputs.append((tick, f.read(1)[0]))
+                elif kind[0] == REC_KEYFRAME:
+                    kf_tick = read_varint(f)
+                    flags = f.read(1)[0]
+                    self.keyframes.append((kf_tick, flags, f.read(read_varint(f))))
+                elif kind[0] == REC_END:
+                    self.end_tick = read_varint(f)
+                    break
+                else:
+                    raise ValueError(f"{path}: unknown record type {kind[0]}")
+        except (EOFError, IndexError):
+            pass   # truncated file, e.g. the game crashed; keep what was read
+        if self.end_tick is None:
+            last = [t for t, _ in self.inputs[-1:]] + [t for t, _, _ in self.keyframes[-1:]]
+            self.end_tick = max(last, default=0)
+        self.start_tick = self.keyframes[0][0]
+
+
+class Replay:
+    """Re-simulates a Recording on a headless World."""
+
+    def __init__(self, recording, world=None):
+        self.rec = recording
+        self.world = world if world is not None else sim.World()
+        self.seek(recording.start_tick)
+
+    def _load(self, kf_index):
+        self.world.restore(decode_snapshot(self.rec.keyframes[kf_index][2]))
+        self._kf = kf_index + 1
+        self._in = 0
+        while self._in < len(self.rec.inputs) and self.rec.inputs[self._in][0] <= self.world.tick:
+            self._in += 1
+        self.inputs = self.rec.inputs[self._in - 1][1] if self._in else 0
+
+    def seek(self, tick):
+        """Restore the last keyframe at or before ``tick`` and simulate the rest."""
+        best = max((i for i, (t, _, _) in enumerate(self.rec.keyframes) if t <= tick), default=0)
+        self._load(best)
+        return self.run(tick)
+
+    def run(self, until=None, verify=False):
+        """Step until tick ``until`` (default: the end of the recording).
+
+        With ``verify`` every periodic keyframe passed on the way is compared
+        with the re-simulated state; a ``RuntimeError`` reports the first
+        tick where they differ.
+        """
+        until = self.rec.end_tick if until is None else until
+        world, rec, dt = self.world, self.rec, self.rec.dt
+        events = []
+        while world.tick < until:
+            tick = world.tick
+            while self._kf < len(rec.keyframes) and rec.keyframes[self._kf][0] <= tick:
+                _, flags, data = rec.keyframes[self._kf]
+                self._kf += 1
+                if flags & KF_RESET:
+                    world.restore(decode_snapshot(data))
+                elif verify and _plain(world.snapshot()) != decode_snapshot(data):
+                    raise RuntimeError(f"replay diverged from the recording at tick {tick}")
+            if self._in < len(rec.inputs) and rec.inputs[self._in][0] == tick:
+                self.inputs = rec.inputs[self._in][1]
+                self._in += 1
+            events.extend(world.step(self.inputs, dt))
+        return events
+
+def _plain(snap):
+    """``snap`` as it reads back from a keyframe (tuples become lists)."""
+    return json.loads(json.dumps(snap))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded session headless")
+    parser.add_argument("path")
+    parser.add_argument("--seek", type=int, help="start from this tick instead of the beginning")
+    parser.add_argument("--verify", action="store_true", help="compare the replay with every keyframe")
+    args = parser.parse_args(argv)
+
+    rec = Recording(args.path)
+    t = time.perf_counter()
+    replay = Replay(rec)
+    if args.seek is not None:
+        replay.seek(args.seek)
+    start = replay.world.tick
+    events = replay.run(verify=args.verify)
+    elapsed = time.perf_counter() - t
+    for kind, i in events:
+        print(kind if i is None else f"{kind} {i}")
+    ticks = replay.world.tick - start
+    print(f"{ticks} ticks ({ticks * rec.dt:.1f}s de juego) en {elapsed:.3f}s, "
+          f"{len(rec.inputs)} cambios de input, {len(rec.keyframes)} keyframes")
+    if args.verify:
+        print("Replay idéntico a la grabación.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,933 @@
+import math
+
+import numpy as np
+
+from collision import WallGrid
+from level import BakeCache, default_level
+from navgrid import NavGrid
+from profiler import NULL_PROFILER
+from spatial import PointHash, RectSet
+from timers import TimerQueue
+
+WALK_SPEED = 3.4
+TURN_SPEED = 120.0
+LEG_SWING_DEG = 28.0
+LEG_SWING_SPEED = 6.0
+SMOOTH_RETURN = 8.0
+AGENT_RADIUS = 0.35
+PICKUP_RANGE = 1.1
+
+TICK_RATE = 60
+TICK_DT = 1.0 / TICK_RATE
+MAX_FRAME_DT = 0.25
+
+# Moves longer than MAX_STEP (m) in one tick are split into equal sub-steps,
+# at most MAX_SUBSTEPS, so a long tick turns, slides along walls and reaches
+# waypoints the way that many short ticks would. Player collision tests
+# sweep the path, so even a capped sub-step cannot tunnel through a wall.
+MAX_STEP = 0.25
+MAX_SUBSTEPS = 16
+
+# Input bitmask, one bit per logical key. IN_ACTION is edge-triggered (a press).
+IN_FORWARD = 1 << 0
+IN_BACK = 1 << 1
+IN_LEFT = 1 << 2
+IN_RIGHT = 1 << 3
+IN_ACTION = 1 << 4
+
+
+class Bomb:
+    __slots__ = ("active", "start_time", "timer", "deactivated", "exploded", "carried", "world_pos")
+
+    def __init__(self, x=0.0, z=-1.5, timer=120.0, start_time=0.0):
+        self.active = True
+        self.start_time = start_time
+        self.timer = timer
+        self.deactivated = False
+        self.exploded = False
+        self.carried = False
+        self.world_pos = (x, 0.18, z)
+
+    def remaining(self, now):
+        """Seconds left. A carried bomb's timer is paused: ``timer`` then
+        holds what was left at pickup."""
+        if self.deactivated or not self.active:
+            return 0.0
+        if self.carried:
+            return max(0, self.timer)
+        return max(0, self.timer - (now - self.start_time))
+
+def cargo_in_deactivation_area(cx, cz, pads):
+    """``pads`` is a ``spatial.RectSet`` (a World's ``pad_index``)."""
+    return pads.contains(cx, cz)
+
+def distance_to_nearest_deactivation(x, z, pads):
+    return pads.nearest_center(x, z)
+
+
+class AgentState:
+    __slots__ = ("x", "y", "z", "yaw", "state", "carrying_index", "leg_l", "leg_r", "_t",
+                 "anim_state", "anim_t", "anim_duration", "anim_obj_index", "anim_start_pos", "anim_end_pos")
+
+    def __init__(self):
+        self.x, self.y, self.z = 0.0, 0.0, 0.0
+        self.yaw = 0.0
+        self.state = 'idle'
+        self.carrying_index = None
+        self.leg_l = 0.0
+        self.leg_r = 0.0
+        self._t = 0.0
+
+        self.anim_state = 'none'
+        self.anim_t = 0.0
+        self.anim_duration = 0.4
+        self.anim_obj_index = None
+        self.anim_start_pos = (0,0,0)
+        self.anim_end_pos = (0,0,0)
+
+class NPCState:
+    """A guard spawn. ``spec`` is an entry of a level's ``guards`` list."""
+    __slots__ = ("x", "y", "z", "yaw", "state", "leg_l", "leg_r", "_t", "speed",
+                 "path", "current_idx", "mode", "return_idx")
+
+    def __init__(self, spec):
+        self.x, self.y, self.z = float(spec["x"]), 0.0, float(spec["z"])
+        self.yaw = 0.0
+        self.state = 'idle'
+        self.leg_l = 0.0
+        self.leg_r = 0.0
+        self._t = 0.0
+        self.speed = float(spec.get("speed", 2.6))
+
+        self.path = [(float(x), float(z)) for x, z in spec["path"]]
+        self.current_idx = spec.get("start", 0)
+        self.mode = "roam"
+        self.return_idx = self.current_idx
+
+def spawn_agent(pid):
+    """Fresh player ``pid``: the local player (0) starts at the center room's
+    south side, the others in a row beside it."""
+    agent = AgentState()
+    k = pid % 8
+    agent.x = 1.5 * ((k + 1) // 2 if k % 2 else -(k // 2))
+    agent.z = -3.0
+    return agent
+
+def get_agent_back_world_pos(agent):
+
+    rad = math.radians(agent.yaw)
+    s, c = math.sin(rad), math.cos(rad)
+
+    back_dist = 0.28
+    bx = agent.x - s * back_dist
+    bz = agent.z - c * back_dist
+    by = agent.y + 1.1
+    return (bx, by, bz)
+
+def build_rooms(walls, room_floors, level):
+    """Fill ``walls`` and ``room_floors`` with the static geometry of ``level``."""
+    walls[:] = level.walls
+    room_floors[:] = level.room_floors
+
+def is_inside_any_room(x, z, rooms):
+    for x0, z0, x1, z1 in rooms:
+        if x0 <= x <= x1 and z0 <= z <= z1:
+            return True
+    return False
+
+def inside_any_room(x, z, rooms):
+    """Vectorized room test: boolean array shaped like ``x`` and ``z``."""
+    r = np.asarray(rooms, dtype=np.float64).reshape(-1, 4)
+    x, z = x[..., None], z[..., None]
+    return ((r[:, 0] <= x) & (x <= r[:, 2]) & (r[:, 1] <= z) & (z <= r[:, 3])).any(axis=-1)
+
+def substeps(distance):
+    """How many sub-steps a move of ``distance`` in one tick is split into."""
+    if distance <= MAX_STEP:
+        return 1
+    return min(MAX_SUBSTEPS, math.ceil(distance / MAX_STEP))
+
+def move_with_collisions(agent, dx, dz, collision):
+    # Each axis moves on its own; a move shorter than the thinnest wall can
+    # only end inside one, never cross it, so the point test is enough.
+    test = collision.blocked if abs(dx) < collision.thinnest and abs(dz) < collision.thinnest else None
+    new_x = agent.x + dx
+    if not (test(new_x, agent.z) if test else collision.crossed(agent.x, agent.z, new_x, agent.z)):
+        agent.x = new_x
+    new_z = agent.z + dz
+    if not (test(agent.x, new_z) if test else collision.crossed(agent.x, agent.z, agent.x, new_z)):
+        agent.z = new_z
+
+
+def clamp(v, a, b):
+    return max(a, min(b, v))
+
+def process_input(agent, inputs, dt, collision, split=True):
+    if split and WALK_SPEED * dt > MAX_STEP:
+        n = substeps(WALK_SPEED * dt)
+        for _ in range(n):
+            process_input(agent, inputs, dt / n, collision, False)
+        return
+    moving = False
+    yaw = agent.yaw
+    if inputs & IN_LEFT:
+        yaw += TURN_SPEED * dt
+    if inputs & IN_RIGHT:
+        yaw -= TURN_SPEED * dt
+    agent.yaw = yaw % 360.0
+
+    fx = math.sin(math.radians(agent.yaw))
+    fz = math.cos(math.radians(agent.yaw))
+    dx = dz = 0.0
+    if inputs & IN_FORWARD:
+        dx += fx * WALK_SPEED * dt; dz += fz * WALK_SPEED * dt; moving = True
+    if inputs & IN_BACK:
+        dx -= fx * WALK_SPEED * dt; dz -= fz * WALK_SPEED * dt; moving = True
+
+    move_with_collisions(agent, dx, dz, collision)
+    agent.state = 'walk' if moving else 'idle'
+
+def animate_legs(entity, dt):
+    if entity.state == 'walk':
+        entity._t += dt
+        ang = math.sin(entity._t * LEG_SWING_SPEED) * LEG_SWING_DEG
+        entity.leg_l = ang
+        entity.leg_r = -ang
+    else:
+        entity.leg_l += (0 - entity.leg_l) * min(1.0, SMOOTH_RETURN*dt)
+        entity.leg_r += (0 - entity.leg_r) * min(1.0, SMOOTH_RETURN*dt)
+
+MODE_ROAM, MODE_CHASE, MODE_RETURN = 0, 1, 2
+MODE_NAMES = ('roam', 'chase', 'return')
+
+class NPCManager:
+    """Every NPC of a World stored as parallel arrays.
+
+    ``update`` runs the roam/chase/return state machine, steering and leg
+    animation of all NPCs with a fixed number of NumPy operations, so the
+    Python cost of a tick does not grow with the NPC count. Up to
+    ``SCALAR_LIMIT`` NPCs that fixed cost is more than stepping each one with
+    plain floats, so small crowds (the normal game has one guard) take the
+    per-NPC path instead; both give the same results. Each NPC patrols its
+    own path; paths are padded with ``inf`` to the longest one.
+    """
+
+    SCALAR_LIMIT = 32
+
+    DTYPES = {"x": np.float64, "z": np.float64, "yaw": np.float64, "walk": bool,
+              "leg_l": np.float64, "leg_r": np.float64, "t": np.float64, "speed": np.float64,
+              "mode": np.int8, "path_idx": np.int64, "return_idx": np.int64, "path_len": np.int64}
+
+    def __init__(self, rooms):
+        self.rooms = rooms      # guards chase a player only when both are in a room
+        for name, dtype in self.DTYPES.items():
+            setattr(self, name, np.zeros(0, dtype=dtype))
+        self.paths = np.zeros((0, 0, 2))
+        self._path_lists = None
+        self.max_speed = 0.0
+
+    def __len__(self):
+        return len(self.x)
+
+
+    def add(self, npcs):
+        """Append the NPCs described by a list of ``NPCState``; returns their indices."""
+        n, k = len(self.x), len(npcs)
+        width = max([self.paths.shape[1]] + [len(npc.path) for npc in npcs])
+        paths = np.full((n + k, width, 2), np.inf)
+        paths[:n, :self.paths.shape[1]] = self.paths
+        for j, npc in enumerate(npcs):
+            paths[n + j, :len(npc.path)] = npc.path
+        self.paths = paths
+        self._path_lists = None
+        columns = {"x": [npc.x for npc in npcs], "z": [npc.z for npc in npcs],
+                   "yaw": [npc.yaw for npc in npcs], "walk": [npc.state == 'walk' for npc in npcs],
+                   "leg_l": [npc.leg_l for npc in npcs], "leg_r": [npc.leg_r for npc in npcs],
+                   "t": [npc._t for npc in npcs], "speed": [npc.speed for npc in npcs],
+                   "mode": [MODE_NAMES.index(npc.mode) for npc in npcs],
+                   "path_idx": [npc.current_idx for npc in npcs],
+                   "return_idx": [npc.return_idx for npc in npcs],
+                   "path_len": [len(npc.path) for npc in npcs]}
+        for name, dtype in self.DTYPES.items():
+            setattr(self, name, np.concatenate([getattr(self, name), np.array(columns[name], dtype=dtype)]))
+        self.max_speed = float(self.speed.max()) if len(self.speed) else 0.0
+        return range(n, n + k)
+
+    def update(self, agent_x, agent_z, dt, nav=None, split=True):
+        """Step every NPC. With a ``NavGrid``, chasing and returning NPCs
+        steer along the shared flow field toward their target instead of
+        walking straight through walls. A long ``dt`` is run as sub-steps,
+        so the field is read (and waypoints reached) every ``MAX_STEP``."""
+        if split and self.max_speed * dt > MAX_STEP:
+            k = substeps(self.max_speed * dt)
+            for _ in range(k):
+                self.update(agent_x, agent_z, dt / k, nav, False)
+            return
+        n = len(self.x)
+        if n <= self.SCALAR_LIMIT:
+            if self._path_lists is None:
+                self._path_lists = [[tuple(p) for p in row[:k]]
+                                    for row, k in zip(self.paths.tolist(), self.path_len.tolist())]
+            player_in_room = is_inside_any_room(agent_x, agent_z, self.rooms)
+            for i in range(n):
+                self._update_one(i, agent_x, agent_z, player_in_room, dt, nav)
+            return
+        player_in_room = inside_any_room(np.array(agent_x), np.array(agent_z), self.rooms)
+        both = player_in_room & inside_any_room(self.x, self.z, self.rooms)
+
+        self.mode[(self.mode == MODE_ROAM) & both] = MODE_CHASE
+        to_return = (self.mode == MODE_CHASE) & ~both
+        if to_return.any():
+            self.mode[to_return] = MODE_RETURN
+            path = self.paths[to_return]
+            d = np.hypot(path[..., 0] - self.x[to_return, None], path[..., 1] - self.z[to_return, None])
+            self.return_idx[to_return] = d.argmin(axis=1)
+
+        roam = self.mode == MODE_ROAM
+        chase = self.mode == MODE_CHASE
+        ret = self.mode == MODE_RETURN
+        tgt = self.paths[np.arange(n), np.where(ret, self.return_idx, self.path_idx)]
+        dx = np.where(chase, agent_x, tgt[:, 0]) - self.x
+        dz = np.where(chase, agent_z, tgt[:, 1]) - self.z
+        dist = np.hypot(dx, dz)
+        mv = dist >= 0.001
+        safe = np.where(mv, dist, 1.0)
+        dir_x, dir_z = dx / safe, dz / safe
+        if nav is not None:
+            self._steer_by_flow(nav, chase, agent_x, agent_z, dir_x, dir_z)
+            # Returning NPCs each read their own waypoint's field; there are
+            # few of them, so one cached lookup apiece beats grouping.
+            for i in np.nonzero(ret)[0].tolist():
+                field = nav.flow_to(*tgt[i].tolist())
+                flow = field.direction(self.x.item(i), self.z.item(i)) if field is not None else None
+                if flow is not None:
+                    dir_x[i], dir_z[i] = flow
+        step = self.speed * dt
+        self.x = np.where(mv, self.x + dir_x * step, self.x)
+        self.z = np.where(mv, self.z + dir_z * step, self.z)
+        self.yaw = np.where(mv, np.degrees(np.arctan2(dir_x, dir_z)), self.yaw)
+
+        self.walk[:] = True
+        arrived = dist < 0.15
+        hit = roam & arrived
+        self.path_idx[hit] = (self.path_idx[hit] + 1) % self.path_len[hit]
+        self.walk[hit] = False
+        back = ret & arrived
+        self.path_idx[back] = self.return_idx[back]
+        self.mode[back] = MODE_ROAM
+        self.walk[back] = False
+
+        self.animate_legs(dt)
+
+    def _steer_by_flow(self, nav, sel, tx, tz, dir_x, dir_z):
+        if not sel.any():
+            return
+        field = nav.flow_to(tx, tz)
+        if field is None:
+            return
+        rows = np.nonzero(sel)[0]
+        fx, fz, ok = field.directions(self.x[rows], self.z[rows])
+        dir_x[rows[ok]] = fx[ok]
+        dir_z[rows[ok]] = fz[ok]
+
+    def _update_one(self, i, agent_x, agent_z, player_in_room, dt, nav=None):
+        x, z, mode = self.x.item(i), self.z.item(i), self.mode.item(i)
+        path_idx, return_idx = self.path_idx.item(i), self.return_idx.item(i)
+        path = self._path_lists[i]
+        both = player_in_room and is_inside_any_room(x, z, self.rooms)
+        if mode == MODE_ROAM and both:
+            mode = MODE_CHASE
+        elif mode == MODE_CHASE and not both:
+            mode = MODE_RETURN
+            best_d = 1e9
+            for k, (px, pz) in enumerate(path):
+                d = math.hypot(px - x, pz - z)
+                if d < best_d:
+                    best_d, return_idx = d, k
+
+        if mode == MODE_CHASE:
+            tx, tz = agent_x, agent_z
+        else:
+            tx, tz = path[return_idx if mode == MODE_RETURN else path_idx]
+        dx, dz = tx - x, tz - z
+        dist = math.hypot(dx, dz)
+        if dist >= 0.001:
+            dir_x, dir_z = dx / dist, dz / dist
+            if nav is not None and mode != MODE_ROAM:
+                field = nav.flow_to(tx, tz)
+                flow = field.direction(x, z) if field is not None else None
+                if flow is not None:
+                    dir_x, dir_z = flow
+            step = self.speed.item(i) * dt
+            self.x[i] = x + dir_x * step
+            self.z[i] = z + dir_z * step
+            self.yaw[i] = math.degrees(math.atan2(dir_x, dir_z))
+
+        walk = True
+        if dist < 0.15 and mode != MODE_CHASE:
+            if mode == MODE_ROAM:
+                path_idx = (path_idx + 1) % len(path)
+            else:
+                path_idx, mode = return_idx, MODE_ROAM
+            walk = False
+        self.mode[i], self.path_idx[i], self.return_idx[i], self.walk[i] = mode, path_idx, return_idx, walk
+
+        if walk:
+            t = self.t.item(i) + dt
+            ang = math.sin(t * LEG_SWING_SPEED) * LEG_SWING_DEG
+            self.t[i], self.leg_l[i], self.leg_r[i] = t, ang, -ang
+        else:
+            k = min(1.0, SMOOTH_RETURN*dt)
+            leg_l, leg_r = self.leg_l.item(i), self.leg_r.item(i)
+            self.leg_l[i], self.leg_r[i] = leg_l - leg_l * k, leg_r - leg_r * k
+
+    def animate_legs(self, dt):
+        w = self.walk
+        self.t[w] += dt
+        ang = np.sin(self.t[w] * LEG_SWING_SPEED) * LEG_SWING_DEG
+        self.leg_l[w] = ang
+        self.leg_r[w] = -ang
+        k = min(1.0, SMOOTH_RETURN*dt)
+        self.leg_l[~w] -= self.leg_l[~w] * k
+        self.leg_r[~w] -= self.leg_r[~w] * k
+
+    def touching(self, x, z, radius=0.7):
+        """Boolean mask of the NPCs closer than ``radius`` to ``(x, z)``."""
+        return np.hypot(x - self.x, z - self.z) < radius
+
+    def any_touching(self, x, z, radius=0.7):
+        if len(self.x) <= self.SCALAR_LIMIT:
+            for nx, nz in zip(self.x.tolist(), self.z.tolist()):
+                if math.hypot(x - nx, z - nz) < radius:
+                    return True
+            return False
+        return bool(self.touching(x, z, radius).any())
+
+    def state(self):
+        out = {name: getattr(self, name).tolist() for name in self.DTYPES}
+        out["paths"] = self.paths.tolist()
+        return out
+
+    def load(self, state):
+        self.load_columns({name: state[name] for name in self.DTYPES}, state["paths"])
+
+    def load_columns(self, columns, paths):
+        """Take the NPCs from ``columns`` (name -> sequence, as in ``DTYPES``)
+        and their padded ``paths``; everything is copied."""
+        for name, dtype in self.DTYPES.items():
+            setattr(self, name, np.array(columns[name], dtype=dtype))
+        self.paths = np.array(paths, dtype=np.float64).reshape(len(self.x), -1, 2) \
+            if len(self.x) else np.zeros((0, 0, 2))
+        self._path_lists = None
+        self.max_speed = float(self.speed.max()) if len(self.speed) else 0.0
+
+
+class SimClock:
+    """Simulation time. Only ``World.step`` advances it; game logic reads the
+    time from here and never from the OS clock, so a run depends only on its
+    inputs."""
+    __slots__ = ("time", "tick")
+
+    def __init__(self, time=0.0, tick=0):
+        self.time = time
+        self.tick = tick
+
+    def advance(self, dt):
+        self.time += dt
+        self.tick += 1
+
+
+AGENT_STATES = ('idle', 'walk')
+ANIM_STATES = ('none', 'pickup', 'drop')
+
+# Record layouts of a PackedWorld, little-endian and unpadded. Bomb indices
+# that may be None are stored as -1.
+PACK_VERSION = 1
+PACK_HEADER = np.dtype([("version", "<u4"), ("agents", "<u4"), ("bombs", "<u4"), ("npcs", "<u4"),
+                        ("path_width", "<u4"), ("game_over", "?"), ("tick", "<i8"), ("time", "<f8")])
+PACK_AGENT = np.dtype([("pid", "<i8"), ("x", "<f8"), ("y", "<f8"), ("z", "<f8"), ("yaw", "<f8"),
+                       ("state", "<i1"), ("carrying_index", "<i4"), ("leg_l", "<f8"), ("leg_r", "<f8"),
+                       ("t", "<f8"), ("anim_state", "<i1"), ("anim_t", "<f8"), ("anim_duration", "<f8"),
+                       ("anim_obj_index", "<i4"), ("start_x", "<f8"), ("start_y", "<f8"), ("start_z", "<f8"),
+                       ("end_x", "<f8"), ("end_y", "<f8"), ("end_z", "<f8")])
+PACK_BOMB = np.dtype([("x", "<f8"), ("y", "<f8"), ("z", "<f8"), ("start_time", "<f8"), ("timer", "<f8"),
+                      ("active", "?"), ("deactivated", "?"), ("exploded", "?"), ("carried", "?")])
+PACK_NPC = np.dtype([(name, np.dtype(dtype).newbyteorder("<")) for name, dtype in NPCManager.DTYPES.items()])
+
+
+class PackedWorld:
+    """The dynamic state of a World (clock, players, bombs and guards) in
+    one contiguous byte buffer: a header, then one fixed-size record per
+    player, bomb and guard, then the guards' padded paths.
+
+    ``header``, ``agents``, ``bombs``, ``npcs`` and ``paths`` are NumPy
+    views into ``buf``, so ``copy`` and ``tobytes``/``frombytes`` are one
+    memcpy each, whatever the number of bombs and guards. ``World.pack``
+    fills one and ``World.unpack`` loads one.
+    """
+
+    __slots__ = ("buf", "layout", "header", "agents", "bombs", "npcs", "paths")
+
+    SECTIONS = (("agents", PACK_AGENT), ("bombs", PACK_BOMB), ("npcs", PACK_NPC), ("paths", np.dtype("<f8")))
+
+    def __init__(self, buf, layout=None):
+        if layout is None:
+            layout = self._layout(buf)
+        self.buf, self.layout = buf, layout
+        self.header = buf[:PACK_HEADER.itemsize].view(PACK_HEADER)
+        for (name, dtype), (start, end) in zip(self.SECTIONS, layout[1:]):
+            setattr(self, name, buf[start:end].view(dtype))
+        self.paths = self.paths.reshape(layout[0])
+
+    @classmethod
+    def _layout(cls, buf):
+        """``(paths shape, (start, end) of each section)`` read from the header."""
+        if len(buf) < PACK_HEADER.itemsize:
+            raise ValueError("packed world too short")
+        version, agents, bombs, npcs, width = buf[:20].view("<u4").tolist()
+        if version != PACK_VERSION:
+            raise ValueError(f"packed world version {version}, expected {PACK_VERSION}")
+        layout, offset = [(npcs, width, 2)], PACK_HEADER.itemsize
+        for (_, dtype), count in zip(cls.SECTIONS, (agents, bombs, npcs, npcs * width * 2)):
+            layout.append((offset, offset + count * dtype.itemsize))
+            offset += count * dtype.itemsize
+        if offset != len(buf):
+            raise ValueError(f"packed world is {len(buf)} bytes, its header says {offset}")
+        return tuple(layout)
+
+    @classmethod
+    def empty(cls, agents, bombs, npcs, path_width):
+        size = (PACK_HEADER.itemsize + agents * PACK_AGENT.itemsize + bombs * PACK_BOMB.itemsize
+                + npcs * (PACK_NPC.itemsize + path_width * 16))
+        buf = np.zeros(size, dtype=np.uint8)
+        buf[:PACK_HEADER.itemsize].view(PACK_HEADER)[0] = (PACK_VERSION, agents, bombs, npcs, path_width, False, 0, 0.0)
+        return cls(buf)
+
+    @classmethod
+    def frombytes(cls, data):
+        """Read ``tobytes`` output (a copy; ``data`` may be any buffer)."""
+        return cls(np.frombuffer(data, dtype=np.uint8).copy())
+
+    def tobytes(self):
+        return self.buf.tobytes()
+
+    def copy(self):
+        return PackedWorld(self.buf.copy(), self.layout)
+
+    @property
+    def shape(self):
+        """``(players, bombs, guards, path width)``."""
+        npcs, width, _ = self.layout[0]
+        return len(self.agents), len(self.bombs), npcs, width
+
+    @property
+    def nbytes(self):
+        return self.buf.nbytes
+
+
+class World:
+    """Headless game state. No window or GL context is needed to step it."""
+
+    def __init__(self, bomb_spawns=None, clock=None, guards=None, navigation=True, players=(0,), level=None):
+        """``level`` is a ``level.Level`` (default: the built-in one); bombs
+        and guards default to its first-round spawns and patrols."""
+        self.navigation = navigation
+        self.level = level if level is not None else default_level()
+        self.pads = self.level.pads
+        self.pad_index = RectSet.of_pads(self.pads)
+        self.floor_size = self.level.floor_size
+        self.walls = []
+        self.room_floors = []
+        self.level_version = 0
+        self.rebuild_level()
+        self.clock = clock if clock is not None else SimClock()
+        self.profiler = NULL_PROFILER
+        self.agents = dict.fromkeys(players)
+        self.reset(self.level.first_spawns if bomb_spawns is None else bomb_spawns, guards)
+
+    @property
+    def agent(self):
+        """The local player, id 0."""
+        return self.agents[0]
+
+    @property
+    def time(self):
+        return self.clock.time
+
+    @property
+    def tick(self):
+        return self.clock.tick
+
+    def rebuild_level(self, extra_walls=()):
+        """Regenerate the static level, plus any ``extra_walls``. Bumps
+        ``level_version`` so cached collision and render data built from the
+        old walls can be dropped. The collision and nav grids come from the
+        bake cache (``bake_cache``) when this geometry has been seen before."""
+        build_rooms(self.walls, self.room_floors, self.level)
+        self.walls.extend(extra_walls)
+        self.bake_cache = BakeCache.of(self.walls, self.room_floors, self.pads, self.floor_size)
+        self.collision = WallGrid.baked(self.bake_cache, self.walls, AGENT_RADIUS)
+        self.nav = NavGrid.baked(self.bake_cache, self.walls) if self.navigation else None
+        self.level_version += 1
+
+    def reset(self, bomb_spawns=None, guards=None):
+        """Start a new round. ``guards`` is a list of ``NPCState`` spawns
+        (default: the level's patrols). Every player respawns."""
+        if bomb_spawns is None:
+            bomb_spawns = self.level.round_spawns
+        self.agents = {pid: spawn_agent(pid) for pid in self.agents}
+        self.npcs = NPCManager(self.level.rooms)
+        self.npcs.add([NPCState(g) for g in self.level.guards] if guards is None else guards)
+        self.game_over = False
+        self.bombs = [Bomb(x=x, z=z, timer=timer, start_time=self.time) for x, z, timer in bomb_spawns]
+        self.schedule_bombs()
+        self.index_bombs()
+
+    def schedule_bombs(self):
+        """Rebuild the bomb expiry queue from the bombs' own timer fields."""
+        bombs = self.bombs
+        self.timers = TimerQueue()
+        self.bomb_timers = [None] * len(bombs)
+        live = [i for i, b in enumerate(bombs) if b.active and not b.deactivated and not b.exploded]
+        for i, t in zip(live, self.timers.schedule_many((bombs[i].start_time + bombs[i].timer, i) for i in live)):
+            self.bomb_timers[i] = t
+            if bombs[i].carried:
+                self.timers.pause(t, bombs[i].start_time)
+
+    def index_bombs(self):
+        """Drop ``bomb_index``; it is rebuilt from the bombs on next use."""
+        self._bomb_index = None
+
+    @property
+    def bomb_index(self):
+        """Every bomb not being carried, by position (a ``spatial.PointHash``).
+        Built on first use after a reset, then kept up to date as bombs move."""
+        if self._bomb_index is None:
+            self._bomb_index = PointHash()
+            self._bomb_index.add_many((i, b.world_pos[0], b.world_pos[2])
+                                      for i, b in enumerate(self.bombs) if not b.carried)
+        return self._bomb_index
+
+    def move_bomb(self, idx, pos):
+        self.bombs[idx].world_pos = pos
+        if self._bomb_index is not None and idx in self._bomb_index:
+            self._bomb_index.move(idx, pos[0], pos[2])
+
+    def set_carried(self, idx, carried):
+        """Mark bomb ``idx`` carried or not, pausing or resuming its timer.
+        Carried bombs leave ``bomb_index``."""
+        b = self.bombs[idx]
+        if b.carried == carried:
+            return
+        b.carried = carried
+        if self._bomb_index is not None:
+            if carried:
+                self._bomb_index.discard(idx)
+            else:
+                self._bomb_index.move(idx, b.world_pos[0], b.world_pos[2])
+        t = self.bomb_timers[idx]
+        if t is None:
+            return
+        now = self.clock.time
+        if carried:
+            self.timers.pause(t, now)
+            b.timer = t.remaining
+        else:
+            self.timers.resume(t, now)
+        b.start_time = now
+
+    def snapshot(self):
+        """Full dynamic state as plain Python values (the level is not
+        included). ``restore`` brings a World back to it bit-for-bit."""
+        return {
+            "time": self.clock.time, "tick": self.clock.tick, "game_over": self.game_over,
+            "agents": [[pid, {f: getattr(a, f) for f in AgentState.__slots__}] for pid, a in self.agents.items()],
+            "npcs": self.npcs.state(),
+            "bombs": [{f: getattr(b, f) for f in Bomb.__slots__} for b in self.bombs],
+        }
+
+    def restore(self, snap):
+        self.clock.time, self.clock.tick = snap["time"], snap["tick"]
+        self.game_over = snap["game_over"]
+        self.agents = {}
+        for pid, fields in snap["agents"]:
+            a = self.agents[pid] = AgentState()
+            for f, v in fields.items():
+                setattr(a, f, v)
+            a.anim_start_pos = tuple(a.anim_start_pos)
+            a.anim_end_pos = tuple(a.anim_end_pos)
+        self.npcs = NPCManager(self.level.rooms)
+        self.npcs.load(snap["npcs"])
+        self.bombs = []
+        for fields in snap["bombs"]:
+            b = Bomb()
+            for f, v in fields.items():
+                setattr(b, f, v)
+            b.world_pos = tuple(b.world_pos)
+            self.bombs.append(b)
+        self.schedule_bombs()
+        self.index_bombs()
+
+    def pack(self, out=None):
+        """The dynamic state as a PackedWorld (written into ``out`` when it
+        has room for exactly this many players, bombs and guards).
+        ``unpack`` brings a World back to it bit-for-bit."""
+        npcs = self.npcs
+        shape = (len(self.agents), len(self.bombs), len(npcs), npcs.paths.shape[1])
+        if out is None or out.shape != shape:
+            out = PackedWorld.empty(*shape)
+        h = out.header
+        h["game_over"], h["tick"], h["time"] = self.game_over, self.clock.tick, self.clock.time
+        out.agents[:] = [(pid, a.x, a.y, a.z, a.yaw, AGENT_STATES.index(a.state),
+                          -1 if a.carrying_index is None else a.carrying_index, a.leg_l, a.leg_r, a._t,
+                          ANIM_STATES.index(a.anim_state), a.anim_t, a.anim_duration,
+                          -1 if a.anim_obj_index is None else a.anim_obj_index, *a.anim_start_pos, *a.anim_end_pos)
+                         for pid, a in self.agents.items()]
+        out.bombs[:] = [(*b.world_pos, b.start_time, b.timer, b.active, b.deactivated, b.exploded, b.carried)
+                        for b in self.bombs]
+        for name in NPCManager.DTYPES:
+            out.npcs[name] = getattr(npcs, name)
+        out.paths[...] = npcs.paths
+        return out
+
+    def unpack(self, packed):
+        """Load the state of a PackedWorld (see ``pack``). Players, bombs and
+        guards are rebuilt; the level stays as it is."""
+        h = packed.header[0]
+        self.clock.time, self.clock.tick = float(h["time"]), int(h["tick"])
+        self.game_over = bool(h["game_over"])
+        self.agents = {}
+        for (pid, x, y, z, yaw, state, carrying, leg_l, leg_r, t, anim, anim_t, anim_duration, obj,
+             sx, sy, sz, ex, ey, ez) in packed.agents.tolist():
+            a = self.agents[pid] = AgentState()
+            a.x, a.y, a.z, a.yaw, a.state = x, y, z, yaw, AGENT_STATES[state]
+            a.carrying_index = None if carrying < 0 else carrying
+            a.leg_l, a.leg_r, a._t = leg_l, leg_r, t
+            a.anim_state, a.anim_t, a.anim_duration = ANIM_STATES[anim], anim_t, anim_duration
+            a.anim_obj_index = None if obj < 0 else obj
+            a.anim_start_pos, a.anim_end_pos = (sx, sy, sz), (ex, ey, ez)
+        self.bombs = []
+        for x, y, z, start_time, timer, active, deactivated, exploded, carried in packed.bombs.tolist():
+            b = Bomb()
+            b.world_pos, b.start_time, b.timer = (x, y, z), start_time, timer
+            b.active, b.deactivated, b.exploded, b.carried = active, deactivated, exploded, carried
+            self.bombs.append(b)
+        self.npcs = NPCManager(self.level.rooms)
+        self.npcs.load_columns({name: packed.npcs[name] for name in NPCManager.DTYPES}, packed.paths)
+        self.schedule_bombs()
+        self.index_bombs()
+
+    def clone(self):
+        """An independent World in this one's state, to play forward (say,
+        while searching over actions) without touching this one. The level
+        (walls, collision and nav grids) is shared, so neither should
+        ``rebuild_level``."""
+        world = object.__new__(World)
+        vars(world).update(vars(self))
+        world.clock = SimClock()
+        world.unpack(self.pack())
+        return world
+
+    def add_player(self, pid):
+        """Spawn player ``pid`` into the running round."""
+        agent = self.agents[pid] = spawn_agent(pid)
+        return agent
+
+    def remove_player(self, pid):
+        """Take ``pid`` out of the game; a bomb it holds falls where it stands."""
+        agent = self.agents.pop(pid)
+        idx = agent.carrying_index if agent.carrying_index is not None else agent.anim_obj_index
+        if idx is not None:
+            self.set_carried(idx, False)
+            self.move_bomb(idx, agent.anim_end_pos if agent.anim_state == 'drop' else (agent.x, 0.18, agent.z))
+
+    def npc_target(self):
+        """The player the guards chase: the one nearest to the first guard,
+        preferring players inside a room. None when nobody is playing."""
+        agents = list(self.agents.values())
+        if len(agents) <= 1 or not len(self.npcs):
+            return agents[0] if agents else None
+        gx, gz = self.npcs.x.item(0), self.npcs.z.item(0)
+        return min(agents, key=lambda a: (not is_inside_any_room(a.x, a.z, self.level.rooms), math.hypot(a.x - gx, a.z - gz)))
+
+    def handle_action(self, agent):
+        bombs = self.bombs
+        # Don't allow new action if currently animating
+        if agent.anim_state != 'none':
+            return
+
+        # --- DROP LOGIC ---
+        if agent.carrying_index is not None:
+            idx = agent.carrying_index
+            b = bombs[idx]
+
+            # 1. Calculate drop destination
+            fx = math.sin(math.radians(agent.yaw))
+            fz = math.cos(math.radians(agent.yaw))
+            drop_target = (agent.x + fx * 0.6, 0.18, agent.z + fz * 0.6)
+
+            # 2. Setup Animation
+            agent.anim_state = 'drop'
+            agent.anim_t = 0.0
+            agent.anim_obj_index = idx
+            agent.anim_start_pos = get_agent_back_world_pos(agent)
+            agent.anim_end_pos = drop_target
+
+            agent.carrying_index = None
+            self.set_carried(idx, False)
+
+        else:
+            hit = self.bomb_index.nearest(agent.x, agent.z, PICKUP_RANGE,
+                                          lambda i: not (bombs[i].deactivated or bombs[i].exploded))
+            if hit is not None:
+                best_idx = hit[1]
+                agent.anim_state = 'pickup'
+                agent.anim_t = 0.0
+                agent.anim_obj_index = best_idx
+                agent.anim_start_pos = bombs[best_idx].world_pos
+
+                self.set_carried(best_idx, True)
+
+    def update_carry_anim(self, agent, dt, events):
+        if agent.anim_state == 'none':
+            return
+        agent.anim_t += dt / agent.anim_duration
+
+        # Calculate current animation position (Linear Interpolation)
+        t = min(1.0, agent.anim_t)
+
+        # Add a small arc (Lift) using Sine
+        lift_height = 0.5 * math.sin(t * math.pi)
+
+        start = agent.anim_start_pos
+
+        if agent.anim_state == 'pickup':
+            end = get_agent_back_world_pos(agent) # Track moving agent
+        else:
+            end = agent.anim_end_pos # Fixed ground spot
+
+        # Lerp coordinates
+        cur_x = start[0] + (end[0] - start[0]) * t
+        cur_y = start[1] + (end[1] - start[1]) * t + lift_height
+        cur_z = start[2] + (end[2] - start[2]) * t
+
+        b_idx = agent.anim_obj_index
+        if b_idx is not None:
+            self.move_bomb(b_idx, (cur_x, cur_y, cur_z))
+
+        # --- ANIMATION FINISHED ---
+        if agent.anim_t >= 1.0:
+            if agent.anim_state == 'pickup':
+                agent.carrying_index = agent.anim_obj_index
+
+            elif agent.anim_state == 'drop':
+                # Check Deactivation Logic here (at end of drop)
+                b = self.bombs[agent.anim_obj_index]
+                self.move_bomb(agent.anim_obj_index, agent.anim_end_pos) # Ensure exact landing
+                cx, _, cz = b.world_pos
+                if self.pad_index.contains(cx, cz):
+                    b.deactivated = True
+                    b.active = False
+                    self.timers.cancel(self.bomb_timers[agent.anim_obj_index])
+                    self.bomb_timers[agent.anim_obj_index] = None
+                    events.append(("deactivated", agent.anim_obj_index))
+
+            agent.anim_state = 'none'
+            agent.anim_obj_index = None
+
+    def step(self, inputs, dt=TICK_DT):
+        """Advance the world by one tick and return the events it produced.
+
+        ``inputs`` is an ``IN_*`` bitmask for the local player, or a dict of
+        bitmasks by player id. Events are ``(kind, index)`` tuples:
+        ``("deactivated", i)``, ``("exploded", i)`` and ``("caught", player_id)``.
+        """
+        prof = self.profiler
+        events = []
+        self.clock.advance(dt)
+
+        if not self.game_over:
+            if not isinstance(inputs, dict):
+                inputs = {0: inputs}
+            for pid, agent in self.agents.items():
+                bits = inputs.get(pid, 0)
+                if bits & IN_ACTION:
+                    self.handle_action(agent)
+                process_input(agent, bits, dt, self.collision)
+            prof.mark("process_input")
+            for agent in self.agents.values():
+                self.update_carry_anim(agent, dt, events)
+                animate_legs(agent, dt)
+            prof.mark("carry_anim")
+
+            target = self.npc_target()
+            if target is not None:
+                self.npcs.update(target.x, target.z, dt, self.nav)
+            else:
+                self.npcs.update(math.inf, math.inf, dt, self.nav)
+
+            for pid, agent in self.agents.items():
+                if self.npcs.any_touching(agent.x, agent.z):
+                    self.game_over = True
+                    for a in self.agents.values():
+                        a.state = 'idle'
+                    self.npcs.walk[:] = False
+                    events.append(("caught", pid))
+                    break
+            prof.mark("update_npc")
+
+        for i in sorted(self.timers.pop_due(self.clock.time)):
+            b = self.bombs[i]
+            b.exploded = True
+            b.active = False
+            self.bomb_timers[i] = None
+            self.game_over = True
+            events.append(("exploded", i))
+        prof.mark("bombs")
+
+        return events
+
+
+class FixedStepper:
+    """Accumulates variable frame time and steps a World at a fixed tick."""
+
+    def __init__(self, world, dt=TICK_DT, max_frame_dt=MAX_FRAME_DT):
+        self.world = world
+        self.dt = dt
+        self.max_frame_dt = max_frame_dt
+        self.accumulator = 0.0
+        self.recorder = None
+        self._action = False
+
+    def queue_action(self):
+        self._action = True
+
+    @property
+    def alpha(self):
+        return self.accumulator / self.dt
+
+    def advance(self, frame_dt, inputs):
+        self.accumulator += min(frame_dt, self.max_frame_dt)
+        events = []
+        while self.accumulator >= self.dt:
+            tick_inputs = inputs & ~IN_ACTION
+            if self._action:
+                tick_inputs |= IN_ACTION
+                self._action = False
+            if self.recorder is not None:
+                self.recorder.record(self.world, tick_inputs)
+            events.extend(self.world.step(tick_inputs, self.dt))
+            self.accumulator -= self.dt
+        return events
+
+
+def run_headless(world, inputs, ticks, dt=TICK_DT):
+    """Step ``world`` for ``ticks`` ticks as fast as possible.
+
+    ``inputs`` is either a constant bitmask or a callable ``f(world) -> bitmask``.
+    """
+    events = []
+    for _ in range(ticks):
+        bits = inputs(world) if callable(inputs) else inputs
+        events.extend(world.step(bits, dt))
+    return events
@@ -0,0 +1,222 @@
+"""The simulation on its own thread, for local play.
+
+``SimThread`` steps a ``World`` at a fixed tick rate on a worker thread.
+After every tick it publishes a read-only ``WorldSnapshot`` of the agents,
+NPCs and bombs. The last two snapshots are kept as one ``(previous,
+current)`` tuple that is replaced in a single assignment, so the render
+loop always reads a consistent pair without locking. It draws a
+``SnapshotView`` interpolated between the two.
+
+Input goes the other way through an ``InputQueue``. Because neither side
+waits for the other, a slow frame (or vsync) no longer slows the game
+clock, a slow tick no longer drops frames, and the tick rate and frame rate
+can be set separately.
+"""
+import collections
+import threading
+import time
+from types import MappingProxyType
+
+import numpy as np
+
+import sim
+from netclient import NPCView, lerp_angle
+from profiler import NULL_PROFILER
+from spatial import PointHash
+
+AGENT_FIELDS = ("x", "y", "z", "yaw", "leg_l", "leg_r", "state", "anim_state", "anim_t", "carrying_index")
+NPC_FIELDS = ("x", "z", "yaw", "leg_l", "leg_r")
+BOMB_FIELDS = ("world_pos", "active", "timer", "start_time", "deactivated", "exploded", "carried")
+
+AgentSnapshot = collections.namedtuple("AgentSnapshot", AGENT_FIELDS)
+BombSnapshot = collections.namedtuple("BombSnapshot", BOMB_FIELDS)
+
+
+class InputQueue:
+    """Input from the window thread to the sim thread, without locks.
+
+    ``held`` is the bitmask of held movement keys, one int replaced whole.
+    One-off commands (``"action"``, ``"reset"``) go through a ``deque``,
+    whose ``append`` and ``popleft`` are atomic.
+    """
+
+    def __init__(self):
+        self.held = 0
+        self.commands = collections.deque()
+
+    def push(self, command):
+        self.commands.append(command)
+
+    def drain(self):
+        out = []
+        while self.commands:
+            out.append(self.commands.popleft())
+        return out
+
+
+def _frozen(a):
+    a = np.array(a, dtype=np.float64)
+    a.flags.writeable = False
+    return a
+
+
+class WorldSnapshot:
+    """What is drawn of a World after one tick, copied and read-only.
+
+    ``stamp`` is the wall-clock time the tick was due. ``round`` counts
+    resets, so interpolation never blends across one.
+    """
+
+    __slots__ = ("tick", "time", "stamp", "round", "game_over", "agents", "npcs", "bombs")
+
+    def __init__(self, world, stamp, round=0):
+        self.tick, self.time, self.game_over = world.tick, world.time, world.game_over
+        self.stamp, self.round = stamp, round
+        self.agents = MappingProxyType({pid: AgentSnapshot(*(getattr(a, f) for f in AGENT_FIELDS))
+                                        for pid, a in world.agents.items()})
+        self.npcs = MappingProxyType({f: _frozen(getattr(world.npcs, f)) for f in NPC_FIELDS})
+        self.bombs = tuple(BombSnapshot(*(getattr(b, f) for f in BOMB_FIELDS)) for b in world.bombs)
+
+
+class SnapshotView:
+    """What the local game draws: the attributes of ``World`` that
+    ``main.py`` reads, filled from snapshots (see ``netclient.View``). The
+    level is shared with the World, which never changes it during play."""
+
+    def __init__(self, world):
+        for name in ("walls", "room_floors", "pads", "pad_index", "floor_size", "bake_cache", "level_version"):
+            setattr(self, name, getattr(world, name))
+        self.own_id = 0
+        self.agents = {}
+        self.npcs = NPCView()
+        self.bombs = []
+        self.bomb_index = PointHash()
+        self.game_over = False
+        self.time = 0.0
+
+    @property
+    def agent(self):
+        return self.agents[self.own_id]
+
+
+class SimThread:
+    """Steps ``world`` every ``dt`` seconds of ``clock`` on a worker thread.
+
+    It has the interface of ``netclient.ClientRuntime``: ``queue_action()``,
+    ``advance(frame_dt, inputs)`` (which only hands over the held keys and
+    returns the events of the ticks run since the last call),
+    ``update_view(now)`` and ``close()``. ``request_reset()`` restarts the
+    round once the game is over.
+    """
+
+    def __init__(self, world, dt=sim.TICK_DT, clock=time.perf_counter, recorder=None, profiler=NULL_PROFILER):
+        self.world = world
+        self.dt = dt
+        self.clock = clock
+        self.recorder = recorder
+        self.profiler = profiler
+        world.profiler = profiler
+        self.inputs = InputQueue()
+        self.events = collections.deque()
+        self.view = SnapshotView(world)
+        self.round = 0
+        snap = WorldSnapshot(world, clock())
+        self.pair = (snap, snap)
+        self.update_view(snap.stamp)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sim", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def queue_action(self):
+        self.inputs.push("action")
+
+    def request_reset(self):
+        self.inputs.push("reset")
+
+    def advance(self, frame_dt, inputs):
+        self.inputs.held = inputs & ~sim.IN_ACTION
+        out = []
+        while self.events:
+            out.append(self.events.popleft())
+        return out
+
+    def _run(self):
+        next_tick = self.clock()
+        while not self._stop.is_set():
+            now = self.clock()
+            if now - next_tick > sim.MAX_FRAME_DT:
+                next_tick = now     # fell too far behind; drop the backlog
+            while next_tick <= now:
+                self.tick(next_tick)
+                next_tick += self.dt
+            self._stop.wait(max(0.0, next_tick - self.clock()))
+
+    def tick(self, stamp):
+        """Run one tick due at ``stamp`` and publish its snapshot."""
+        world = self.world
+        bits = self.inputs.held
+        for command in self.inputs.drain():
+            if command == "action":
+                bits |= sim.IN_ACTION
+            elif command == "reset" and world.game_over:
+                world.reset()
+                self.round += 1
+                if self.recorder is not None:
+                    self.recorder.reset(world)
+        if self.recorder is not None:
+            self.recorder.record(world, bits)
+        self.profiler.begin_frame()
+        self.events.extend(world.step(bits, self.dt))
+        self.profiler.end_frame()
+        self.pair = (self.pair[1], WorldSnapshot(world, stamp, self.round))
+
+    def update_view(self, now):
+        """Refresh ``view`` for drawing at ``now``: one tick behind the
+        newest snapshot, blended from the one before it."""
+        a, b = self.pair
+        t = 1.0
+        if a.round == b.round and b.stamp > a.stamp:
+            t = min(1.0, max(0.0, (now - self.dt - a.stamp) / (b.stamp - a.stamp)))
+        view = self.view
+
+        agents = {}
+        for pid, cur in b.agents.items():
+            old = a.agents.get(pid, cur)
+            agent = view.agents.get(pid) or sim.AgentState()
+            agent.x, agent.y, agent.z = (o + (c - o) * t for o, c in zip((old.x, old.y, old.z), (cur.x, cur.y, cur.z)))
+            agent.yaw = lerp_angle(old.yaw, cur.yaw, t)
+            agent.leg_l = old.leg_l + (cur.leg_l - old.leg_l) * t
+            agent.leg_r = old.leg_r + (cur.leg_r - old.leg_r) * t
+            agent.state, agent.anim_state, agent.carrying_index = cur.state, cur.anim_state, cur.carrying_index
+            agent.anim_t = old.anim_t + (cur.anim_t - old.anim_t) * t if old.anim_state == cur.anim_state else cur.anim_t
+            agents[pid] = agent
+        view.agents = agents
+
+        n, na = b.npcs, a.npcs if len(a.npcs["x"]) == len(b.npcs["x"]) else b.npcs
+        for f in NPC_FIELDS:
+            setattr(view.npcs, f, lerp_angle(na[f], n[f], t) if f == "yaw" else na[f] + (n[f] - na[f]) * t)
+
+        bombs = a.bombs if len(a.bombs) == len(b.bombs) else b.bombs
+        if len(view.bombs) != len(b.bombs):
+            view.bombs = [sim.Bomb() for _ in b.bombs]
+            view.bomb_index = PointHash()
+        for i, (bomb, old, cur) in enumerate(zip(view.bombs, bombs, b.bombs)):
+            bomb.world_pos = tuple(o + (c - o) * t for o, c in zip(old.world_pos, cur.world_pos))
+            bomb.active, bomb.timer, bomb.start_time = cur.active, cur.timer, cur.start_time
+            bomb.deactivated, bomb.exploded, bomb.carried = cur.deactivated, cur.exploded, cur.carried
+            if bomb.carried:
+                view.bomb_index.discard(i)
+            else:
+                view.bomb_index.move(i, bomb.world_pos[0], bomb.world_pos[2])
+
+        view.time = a.time + (b.time - a.time) * t
+        view.game_over = b.game_over
+        return view
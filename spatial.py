@@ -0,0 +1,179 @@
+"""Spatial indexes for the things players interact with.
+
+``PointHash`` holds movable points (bombs) by id and only re-buckets a point
+when it crosses into another cell. ``RectSet`` holds static rectangles
+(deactivation pads) with their bounds and centers computed once. Both answer
+their queries from the few cells around the query point, so their cost does
+not grow with the number of bombs or pads in the level.
+"""
+import heapq
+import math
+
+POINT_CELL = 4.0
+RECT_CELL = 8.0
+
+
+def _ring(cx, cz, m):
+    """The cells at Chebyshev distance ``m`` from ``(cx, cz)``."""
+    if m == 0:
+        yield cx, cz
+        return
+    for dx in range(-m, m + 1):
+        yield cx + dx, cz - m
+        yield cx + dx, cz + m
+    for dz in range(-m + 1, m):
+        yield cx - m, cz + dz
+        yield cx + m, cz + dz
+
+
+class PointHash:
+    """Points keyed by an integer id, bucketed in square cells."""
+
+    def __init__(self, cell=POINT_CELL):
+        self.cell = cell
+        self.pos = {}       # id -> (x, z)
+        self.key = {}       # id -> cell
+        self.cells = {}     # cell -> set of ids
+        # Cell bounds of every point ever added; they only grow.
+        self.x0 = self.z0 = math.inf
+        self.x1 = self.z1 = -math.inf
+
+    def __len__(self):
+        return len(self.pos)
+
+    def __contains__(self, i):
+        return i in self.pos
+
+    def _cell(self, x, z):
+        return math.floor(x / self.cell), math.floor(z / self.cell)
+
+    def move(self, i, x, z):
+        """Add point ``i`` at ``(x, z)``, or move it there."""
+        self.pos[i] = (x, z)
+        key = self._cell(x, z)
+        old = self.key.get(i)
+        if old == key:
+            return
+        if old is not None:
+            self._unbucket(i, old)
+        self._bucket(i, key)
+
+    def add_many(self, points):
+        """``move`` for each ``(id, x, z)`` of ``points``, for ids not yet present."""
+        cell, floor, pos, keys, cells = self.cell, math.floor, self.pos, self.key, self.cells
+        for i, x, z in points:
+            pos[i] = (x, z)
+            key = keys[i] = (floor(x / cell), floor(z / cell))
+            ids = cells.get(key)
+            if ids is None:
+                cells[key] = {i}
+            else:
+                ids.add(i)
+        if keys:
+            kx = [k[0] for k in keys.values()]
+            kz = [k[1] for k in keys.values()]
+            self.x0, self.x1 = min(self.x0, min(kx)), max(self.x1, max(kx))
+            self.z0, self.z1 = min(self.z0, min(kz)), max(self.z1, max(kz))
+
+    def _bucket(self, i, key):
+        self.key[i] = key
+        ids = self.cells.get(key)
+        if ids is None:
+            self.cells[key] = {i}
+        else:
+            ids.add(i)
+        kx, kz = key
+        if kx < self.x0:
+            self.x0 = kx
+        if kx > self.x1:
+            self.x1 = kx
+        if kz < self.z0:
+            self.z0 = kz
+        if kz > self.z1:
+            self.z1 = kz
+
+    def discard(self, i):
+        if i in self.pos:
+            del self.pos[i]
+            self._unbucket(i, self.key.pop(i))
+
+    def _unbucket(self, i, key):
+        ids = self.cells[key]
+        ids.discard(i)
+        if not ids:
+            del self.cells[key]
+
+    def k_nearest(self, x, z, k, radius=math.inf, accept=None):
+        """Up to ``k`` ``(distance, id)`` pairs within ``radius`` of ``(x, z)``,
+        nearest first (equal distances by id). ``accept(id)`` filters.
+
+        Rings of cells are searched outward until the ``k``-th hit is closer
+        than anything the next ring could hold; if that means visiting more
+        cells than there are points, every point is checked instead.
+        """
+        if not self.pos or k <= 0:
+            return []
+        cx, cz = self._cell(x, z)
+        last = max(cx - self.x0, self.x1 - cx, cz - self.z0, self.z1 - cz)
+        if radius != math.inf:
+            last = min(last, math.ceil(radius / self.cell))
+        found, visited, m = [], 0, 0
+        while m <= last:
+            if visited > len(self.pos):
+                found = [(math.hypot(x - px, z - pz), i) for i, (px, pz) in self.pos.items()]
+                found = [hit for hit in found if hit[0] <= radius and (accept is None or accept(hit[1]))]
+                break
+            for key in _ring(cx, cz, m):
+                visited += 1
+                for i in self.cells.get(key, ()):
+                    px, pz = self.pos[i]
+                    d = math.hypot(x - px, z - pz)
+                    if d <= radius and (accept is None or accept(i)):
+                        found.append((d, i))
+            if len(found) >= k and heapq.nsmallest(k, found)[-1][0] <= m * self.cell:
+                break
+            m += 1
+        return heapq.nsmallest(k, found)
+
+    def nearest(self, x, z, radius=math.inf, accept=None):
+        """``(distance, id)`` of the nearest accepted point within ``radius``, or None."""
+        hits = self.k_nearest(x, z, 1, radius, accept)
+        return hits[0] if hits else None
+
+    def within(self, x, z, radius):
+        """``(distance, id)`` of every point within ``radius``, nearest first."""
+        return self.k_nearest(x, z, len(self.pos), radius)
+
+
+class RectSet:
+    """Static ``(x0, z0, x1, z1)`` rectangles, bucketed by the cells they
+    overlap, with their centers in a PointHash."""
+
+    def __init__(self, rects, cell=RECT_CELL):
+        self.cell = cell
+        self.rects = [tuple(map(float, r)) for r in rects]
+        self.cells = {}
+        for r in self.rects:
+            x0, z0, x1, z1 = r
+            for i in range(math.floor(x0 / cell), math.floor(x1 / cell) + 1):
+                for k in range(math.floor(z0 / cell), math.floor(z1 / cell) + 1):
+                    self.cells.setdefault((i, k), []).append(r)
+        self.centers = PointHash()
+        self.centers.add_many((i, (x0 + x1) / 2, (z0 + z1) / 2) for i, (x0, z0, x1, z1) in enumerate(self.rects))
+
+    @classmethod
+    def of_pads(cls, pads):
+        """From ``level.Level.pads``-style dicts."""
+        return cls([(p["x0"], p["z0"], p["x1"], p["z1"]) for p in pads])
+
+    def contains(self, x, z):
+        """Whether ``(x, z)`` lies in any rectangle (edges included)."""
+        for x0, z0, x1, z1 in self.cells.get((math.floor(x / self.cell), math.floor(z / self.cell)), ()):
+            if x0 <= x <= x1 and z0 <= z <= z1:
+                return True
+        return False
+
+    def nearest_center(self, x, z):
+        """Distance to the nearest rectangle center (``inf`` when empty)."""
+        hit = self.centers.nearest(x, z)
+        return hit[0] if hit else math.inf
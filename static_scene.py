@@ -0,0 +1,121 @@
+import numpy as np
+
+from meshes import CUBE_QUADS, CUBE_NORMALS
+
+FLOOR_REPEAT = 42.0
+FLOOR_MATERIAL = {"diffuse": (215, 215, 220)}
+WALL_MATERIAL = {"diffuse": (70, 70, 72), "ambient": (40, 40, 45), "specular": (25, 25, 25), "shininess": 16}
+FLOOR_Y = 0.002
+PAD_Y = 1.1
+
+VERTEX_STRIDE = 8 * 4   # position, normal, texcoord as float32
+WALL_CHUNK = 16.0       # side (m) of the grid cells walls are grouped in for culling
+
+class StaticBatch:
+    """Interleaved ``(N, 8)`` float32 quad vertices that share one material.
+
+    ``chunks``, when set, is ``(firsts, counts, mins, maxs)``: vertex ranges
+    of spatial chunks and their bounding boxes, so a batch can be drawn
+    piecewise.
+    """
+
+    def __init__(self, material, data, textured=False, cull=True, chunks=None):
+        self.material = material
+        self.data = np.ascontiguousarray(data, dtype=np.float32)
+        self.textured = textured
+        self.cull = cull
+        self.chunks = chunks
+
+    @property
+    def count(self):
+        return len(self.data)
+
+def quads_xz(rects, y):
+    """Upward facing quads for ``(x0, z0, x1, z1)`` rectangles."""
+    r = np.asarray(rects, dtype=np.float32).reshape(-1, 4)
+    out = np.zeros((len(r), 4, 8), dtype=np.float32)
+    out[:, :, 0] = r[:, [0, 2, 2, 0]]
+    out[:, :, 1] = y
+    out[:, :, 2] = r[:, [1, 1, 3, 3]]
+    out[:, :, 4] = 1.0
+    return out.reshape(-1, 8)
+
+def boxes(walls):
+    """Cube quads for ``(cx, cy, cz, sx, sy, sz)`` boxes."""
+    w = np.asarray(walls, dtype=np.float32).reshape(-1, 6)
+    pos = CUBE_QUADS[None] * w[:, None, None, 3:6] + w[:, None, None, 0:3]
+    out = np.zeros((len(w), 6, 4, 8), dtype=np.float32)
+    out[..., 0:3] = pos
+    out[..., 3:6] = CUBE_NORMALS[None, :, None, :]
+    return out.reshape(-1, 8)
+
+def chunk_boxes(walls, size=WALL_CHUNK):
+    """Walls sorted by the grid cell their center falls in, and the
+    ``chunks`` tuple (see StaticBatch) for the quads ``boxes`` makes of them."""
+    w = np.asarray(walls, dtype=np.float32).reshape(-1, 6)
+    cell = np.floor(w[:, [0, 2]] / size).astype(np.int64)
+    _, inverse = np.unique(cell, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    order = np.argsort(inverse, kind="stable")
+    w = w[order]
+    counts = np.bincount(inverse)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    mins = np.minimum.reduceat(w[:, :3] - w[:, 3:] / 2, starts)
+    maxs = np.maximum.reduceat(w[:, :3] + w[:, 3:] / 2, starts)
+    per_box = len(CUBE_QUADS) * 4
+    return w, ((starts * per_box).astype(np.int32), (counts * per_box).astype(np.int32), mins, maxs)
+
+def rect_chunks(rects, y):
+    """``chunks`` (see StaticBatch) with one chunk per ``quads_xz`` rectangle."""
+    r = np.asarray(rects, dtype=np.float32).reshape(-1, 4)
+    firsts = np.arange(len(r), dtype=np.int32) * 4
+    ys = np.full((len(r), 1), y, dtype=np.float32)
+    return firsts, np.full(len(r), 4, dtype=np.int32), np.hstack([r[:, 0:1], ys, r[:, 1:2]]), np.hstack([r[:, 2:3], ys, r[:, 3:4]])
+
+def floor_quad(size, repeat=FLOOR_REPEAT):
+    out = quads_xz([(-size, -size, size, size)], 0.0)
+    out[:, 6:8] = [(0, 0), (repeat, 0), (repeat, repeat), (0, repeat)]
+    return out
+
+def bake_static_scene(walls, room_floors, pads, floor_size):
+    """Group all static level geometry into one StaticBatch per material."""
+    batches = [StaticBatch(FLOOR_MATERIAL, floor_quad(floor_size), textured=True)]
+
+    flat = {"specular": (20, 20, 20), "shininess": 8}
+    by_color = {}
+    for x0, z0, x1, z1, color in room_floors:
+        by_color.setdefault(tuple(color), []).append((x0, z0, x1, z1))
+    for color, rects in by_color.items():
+        batches.append(StaticBatch(dict(flat, diffuse=color), quads_xz(rects, FLOOR_Y), chunks=rect_chunks(rects, FLOOR_Y)))
+
+    by_color = {}
+    for area in pads:
+        by_color.setdefault(tuple(area["color"]), []).append((area["x0"], area["z0"], area["x1"], area["z1"]))
+    for color, rects in by_color.items():
+        batches.append(StaticBatch(dict(flat, diffuse=color), quads_xz(rects, PAD_Y), chunks=rect_chunks(rects, PAD_Y)))
+
+    if walls:
+        walls, chunks = chunk_boxes(walls)
+        batches.append(StaticBatch(WALL_MATERIAL, boxes(walls), cull=False, chunks=chunks))
+    return batches
+
+CHUNK_FIELDS = ("firsts", "counts", "mins", "maxs")
+
+def load_static_scene(cache, walls, room_floors, pads, floor_size):
+    """``bake_static_scene`` through ``cache`` (a ``level.BakeCache``): the
+    vertex data is memory-mapped once it has been baked."""
+    def build():
+        arrays, meta = {}, []
+        for i, b in enumerate(bake_static_scene(walls, room_floors, pads, floor_size)):
+            arrays[f"{i}_data"] = b.data
+            if b.chunks is not None:
+                arrays.update((f"{i}_{name}", a) for name, a in zip(CHUNK_FIELDS, b.chunks))
+            meta.append({"material": b.material, "textured": b.textured, "cull": b.cull, "chunks": b.chunks is not None})
+        return arrays, meta
+    arrays, meta = cache.load("static", build)
+    batches = []
+    for i, m in enumerate(meta):
+        chunks = tuple(arrays[f"{i}_{name}"] for name in CHUNK_FIELDS) if m["chunks"] else None
+        material = {k: tuple(v) if isinstance(v, list) else v for k, v in m["material"].items()}
+        batches.append(StaticBatch(material, arrays[f"{i}_data"], m["textured"], m["cull"], chunks))
+    return batches
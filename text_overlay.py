@@ -0,0 +1,271 @@
+"""Text drawn inside the window from a glyph atlas.
+
+``FONT`` is a 5x8 bitmap font. Each band is a line with the characters,
+then their eight pixel rows, 5 pixels per glyph, glyphs separated by
+spaces. ``build_atlas`` rasterizes it once into an alpha texture.
+``TextOverlay`` keeps named labels. A label's quads are laid out again only
+when its text, position or style changes, and the GL buffer is refilled
+only when some label changed. Panels, shadows and text are drawn together
+with one ``glDrawArrays``.
+"""
+import ctypes
+
+import numpy as np
+from OpenGL.GL import (
+    GL_ALPHA, GL_ARRAY_BUFFER, GL_BLEND, GL_COLOR_ARRAY, GL_CULL_FACE, GL_DEPTH_TEST, GL_DYNAMIC_DRAW,
+    GL_FLOAT, GL_LIGHTING, GL_MODELVIEW, GL_NEAREST, GL_ONE_MINUS_SRC_ALPHA, GL_PROJECTION, GL_QUADS,
+    GL_SRC_ALPHA, GL_TEXTURE_2D, GL_TEXTURE_COORD_ARRAY, GL_TEXTURE_MAG_FILTER, GL_TEXTURE_MIN_FILTER,
+    GL_UNPACK_ALIGNMENT, GL_UNSIGNED_BYTE, GL_VERTEX_ARRAY,
+    glBindBuffer, glBindTexture, glBlendFunc, glBufferData, glColorPointer, glDeleteBuffers,
+    glDeleteTextures, glDisable, glDisableClientState, glDrawArrays, glEnable, glEnableClientState,
+    glGenBuffers, glGenTextures, glLoadIdentity, glMatrixMode, glOrtho, glPixelStorei, glPopMatrix,
+    glPushMatrix, glTexCoordPointer, glTexImage2D, glTexParameteri, glVertexPointer,
+)
+
+GLYPH_W, GLYPH_H = 5, 8
+ADVANCE = GLYPH_W + 1
+LINE_HEIGHT = GLYPH_H + 2
+ATLAS_COLS = 16
+FALLBACK = "?"
+
+FONT = r"""
+!"#$%&'()*+,-./0
+..#.. .#.#. .#.#. ..#.. ##... .##.. ..#.. ...#. .#... ..... ..... ..... ..... ..... ..... .###.
+..#.. .#.#. .#.#. .#### ##..# #..#. ..#.. ..#.. ..#.. ..#.. ..#.. ..... ..... ..... ....# #...#
+..#.. ..... ##### #.#.. ...#. #.#.. ..... .#... ...#. #.#.# ..#.. ..... ..... ..... ...#. #..##
+..#.. ..... .#.#. .###. ..#.. .#... ..... .#... ...#. .###. ##### ..... ##### ..... ..#.. #.#.#
+..#.. ..... ##### ..#.# .#... #.#.# ..... .#... ...#. #.#.# ..#.. ..... ..... ..... .#... ##..#
+..... ..... .#.#. ####. #..## #..#. ..... ..#.. ..#.. ..#.. ..#.. .##.. ..... .##.. #.... #...#
+..#.. ..... .#.#. ..#.. ...## .##.# ..... ...#. .#... ..... ..... ..#.. ..... .##.. ..... .###.
+..... ..... ..... ..... ..... ..... ..... ..... ..... ..... ..... .#... ..... ..... ..... .....
+123456789:;<=>?@
+..#.. .###. ##### ...#. ##### ..##. ##### .###. .###. ..... ..... ...#. ..... .#... .###. .###.
+.##.. #...# ...#. ..##. #.... .#... ....# #...# #...# .##.. .##.. ..#.. ..... ..#.. #...# #...#
+..#.. ....# ..#.. .#.#. ####. #.... ...#. #...# #...# .##.. .##.. .#... ##### ...#. ....# ....#
+..#.. ...#. ...#. #..#. ....# ####. ..#.. .###. .#### ..... ..... #.... ..... ....# ...#. .##.#
+..#.. ..#.. ....# ##### ....# #...# .#... #...# ....# .##.. .##.. .#... ##### ...#. ..#.. #.#.#
+..#.. .#... #...# ...#. #...# #...# .#... #...# ...#. .##.. ..#.. ..#.. ..... ..#.. ..... #.#.#
+.###. ##### .###. ...#. .###. .###. .#... .###. .##.. ..... .#... ...#. ..... .#... ..#.. .###.
+..... ..... ..... ..... ..... ..... ..... ..... ..... ..... ..... ..... ..... ..... ..... .....
+ABCDEFGHIJKLMNOP
+.###. ####. .###. ###.. ##### ##### .###. #...# .###. ..### #...# #.... #...# #...# .###. ####.
+#...# #...# #...# #..#. #.... #.... #...# #...# ..#.. ...#. #..#. #.... ##.## #...# #...# #...#
+#...# #...# #.... #...# #.... #.... #.... #...# ..#.. ...#. #.#.. #.... #.#.# ##..# #...# #...#
+##### ####. #.... #...# ####. ####. #.### ##### ..#.. ...#. ##... #.... #.#.# #.#.# #...# ####.
+#...# #...# #.... #...# #.... #.... #...# #...# ..#.. ...#. #.#.. #.... #...# #..## #...# #....
+#...# #...# #...# #..#. #.... #.... #...# #...# ..#.. #..#. #..#. #.... #...# #...# #...# #....
+#...# ####. .###. ###.. ##### #.... .#### #...# .###. .##.. #...# ##### #...# #...# .###. #....
+..... ..... ..... ..... ..... ..... ..... ..... ..... ..... ..... ..... ..... ..... ..... .....
+QRSTUVWXYZ[\]^_`
+.###. ####. .#### ##### #...# #...# #...# #...# #...# ##### .###. ..... .###. ..#.. ..... .#...
+#...# #...# #.... ..#.. #...# #...# #...# #...# #...# ....# .#... #.... ...#. .#.#. ..... ..#..
+#...# #...# #.... ..#.. #...# #...# #...# .#.#. .#.#. ...#. .#... .#... ...#. #...# ..... .....
+#...# ####. .###. ..#.. #...# #...# #.#.# ..#.. ..#.. ..#.. .#... ..#.. ...#. ..... ..... .....
+#.#.# #.#.. ....# ..#.. #...# #...# #.#.# .#.#. ..#.. .#... .#... ...#. ...#. ..... ..... .....
+#..#. #..#. ....# ..#.. #...# .#.#. #.#.# #...# ..#.. #.... .#... ....# ...#. ..... ..... .....
+.##.# #...# ####. ..#.. .###. ..#.. .#.#. #...# ..#.. ##### .###. ..... .###. ..... ..... .....
+..... ..... ..... ..... ..... ..... ..... ..... ..... ..... ..... ..... ..... ..... ##### .....
+abcdefghijklmnop
+..... #.... ..... ....# ..... ..##. ..... #.... ..#.. ...#. #.... .##.. ..... ..... ..... .....
+..... #.... ..... ....# ..... .#..# ..... #.... ..... ..... #.... ..#.. ..... ..... ..... .....
+.###. #.##. .###. .##.# .###. .#... .#### #.##. .##.. ..##. #..#. ..#.. ##.#. #.##. .###. ####.
+....# ##..# #.... #..## #...# ###.. #...# ##..# ..#.. ...#. #.#.. ..#.. #.#.# ##..# #...# #...#
+.#### #...# #.... #...# ##### .#... #...# #...# ..#.. ...#. ##... ..#.. #.#.# #...# #...# #...#
+#...# #...# #...# #...# #.... .#... .#### #...# ..#.. ...#. #.#.. ..#.. #...# #...# #...# ####.
+.#### ####. .###. .#### .###. .#... ....# #...# .###. #..#. #..#. .###. #...# #...# .###. #....
+..... ..... ..... ..... ..... ..... .###. ..... ..... .##.. ..... ..... ..... ..... ..... #....
+qrstuvwxyz{|}~¡¿
+..... ..... ..... .#... ..... ..... ..... ..... ..... ..... ...#. ..#.. .#... ..... ..#.. ..#..
+..... ..... ..... .#... ..... ..... ..... ..... ..... ..... ..#.. ..#.. ..#.. ..... ..... .....
+.#### #.##. .#### ###.. #...# #...# #...# #...# #...# ##### ..#.. ..#.. ..#.. .#... ..#.. ..#..
+#...# ##..# #.... .#... #...# #...# #...# .#.#. #...# ...#. .#... ..#.. ...#. #.#.# ..#.. .#...
+#...# #.... .###. .#... #...# #...# #.#.# ..#.. #...# ..#.. ..#.. ..#.. ..#.. ...#. ..#.. #....
+.#### #.... ....# .#..# #..## .#.#. #.#.# .#.#. .#### .#... ..#.. ..#.. ..#.. ..... ..#.. #...#
+....# #.... ####. ..##. .##.# ..#.. .#.#. #...# ....# ##### ...#. ..#.. .#... ..... ..#.. .###.
+....# ..... ..... ..... ..... ..... ..... ..... .###. ..... ..... ..... ..... ..... ..... .....
+áéíóúñÑü—°
+...#. ...#. ...#. ...#. ...#. .##.# .##.# .#.#. ..... .##..
+..#.. ..#.. ..#.. ..#.. ..#.. #..#. #..#. ..... ..... #..#.
+.###. .###. .##.. .###. #...# #.##. #...# #...# ..... .##..
+....# #...# ..#.. #...# #...# ##..# ##..# #...# ##### .....
+.#### ##### ..#.. #...# #...# #...# #.#.# #...# ..... .....
+#...# #.... ..#.. #...# #..## #...# #..## #..## ..... .....
+.#### .###. .###. .###. .##.# #...# #...# .##.# ..... .....
+..... ..... ..... ..... ..... ..... ..... ..... ..... .....
+"""
+
+# x, y, u, v, r, g, b, a per vertex; four vertices per quad.
+VERTEX_FLOATS = 8
+VERTEX_STRIDE = VERTEX_FLOATS * 4
+DRAW_GL_CALLS = 36      # state setup, the draw itself and the restore in ``TextOverlay.draw``
+
+
+def parse_font(table=FONT):
+    """``{char: (GLYPH_H, GLYPH_W) bool array}`` from a banded font table."""
+    lines = [l for l in table.split("\n") if l]
+    glyphs = {" ": np.zeros((GLYPH_H, GLYPH_W), bool)}
+    for i in range(0, len(lines), GLYPH_H + 1):
+        chars, rows = lines[i], lines[i + 1:i + 1 + GLYPH_H]
+        for k, ch in enumerate(chars):
+            glyphs[ch] = np.array([[p == "#" for p in row[k * (GLYPH_W + 1):k * (GLYPH_W + 1) + GLYPH_W]]
+                                   for row in rows])
+    return glyphs
+
+def build_atlas(glyphs):
+    """Alpha image holding every glyph plus a solid cell (for panels), and
+    the ``(u0, v0, u1, v1)`` of each. Cells keep a 1 pixel gap so nearest
+    sampling never bleeds into a neighbour."""
+    cw, ch = GLYPH_W + 1, GLYPH_H + 1
+    names = [None] + list(glyphs)
+    rows = -(-len(names) // ATLAS_COLS)
+    w = 1 << (ATLAS_COLS * cw - 1).bit_length()
+    h = 1 << (rows * ch - 1).bit_length()
+    img = np.zeros((h, w), np.uint8)
+    uvs = {}
+    for i, name in enumerate(names):
+        x, y = (i % ATLAS_COLS) * cw, (i // ATLAS_COLS) * ch
+        img[y:y + GLYPH_H, x:x + GLYPH_W] = 255 if name is None else glyphs[name] * 255
+        uvs[name] = (x / w, y / h, (x + GLYPH_W) / w, (y + GLYPH_H) / h)
+    return img, uvs
+
+def text_width(text, scale=1):
+    return max(0, len(text) * ADVANCE - 1) * scale
+
+def _quads(x0, y0, x1, y1, uv, color):
+    """Vertex rows for quads with corners ``(x0, y0)``-``(x1, y1)`` (arrays)."""
+    n = len(x0)
+    v = np.empty((n, 4, VERTEX_FLOATS), np.float32)
+    u0, v0, u1, v1 = uv
+    v[:, :, 0] = np.stack([x0, x1, x1, x0], axis=1)
+    v[:, :, 1] = np.stack([y0, y0, y1, y1], axis=1)
+    v[:, :, 2] = np.stack([u0, u1, u1, u0], axis=1)
+    v[:, :, 3] = np.stack([v0, v0, v1, v1], axis=1)
+    v[:, :, 4:] = np.asarray(color, np.float32) / 255.0
+    return v.reshape(-1, VERTEX_FLOATS)
+
+def layout(text, x, y, scale, color, uvs, shadow=None):
+    """Quads for ``text`` with its top-left corner at ``(x, y)`` (pixels,
+    y down). Unknown characters draw as ``FALLBACK``; spaces add no quads.
+    ``shadow`` is an RGBA drawn first, offset by one font pixel."""
+    chars = [(i, c if c in uvs else FALLBACK) for i, c in enumerate(text) if c != " "]
+    if not chars:
+        return np.zeros((0, VERTEX_FLOATS), np.float32)
+    idx = np.array([i for i, _ in chars])
+    uv = np.array([uvs[c] for _, c in chars], np.float32).T
+    x0 = x + idx * ADVANCE * scale
+    y0 = np.full(len(idx), float(y))
+    parts = []
+    if shadow is not None:
+        parts.append(_quads(x0 + scale, y0 + scale, x0 + scale * (GLYPH_W + 1), y0 + scale * (GLYPH_H + 1), uv, shadow))
+    parts.append(_quads(x0, y0, x0 + GLYPH_W * scale, y0 + GLYPH_H * scale, uv, color))
+    return np.concatenate(parts)
+
+
+class Label:
+    __slots__ = ("key", "vertices")
+
+    def __init__(self, key, vertices):
+        self.key = key
+        self.vertices = vertices
+
+
+class TextOverlay:
+    """Named screen-space labels drawn in one call. Needs a current GL context."""
+
+    def __init__(self, width, height):
+        self.width, self.height = width, height
+        img, self.uvs = build_atlas(parse_font())
+        self.tex = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.tex)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_ALPHA, img.shape[1], img.shape[0], 0, GL_ALPHA, GL_UNSIGNED_BYTE, img)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        self.vbo = glGenBuffers(1)
+        self.labels = {}
+        self.count = 0
+        self.dirty = True
+        self.rebuilds = 0
+
+    def text(self, name, text, x, y, scale=2, color=(255, 255, 255, 255), shadow=(0, 0, 0, 160), align="left"):
+        """Show ``text`` as label ``name``. ``align`` is ``"left"`` or
+        ``"center"`` (``x`` is then the middle)."""
+        key = ("text", text, x, y, scale, color, shadow, align)
+        label = self.labels.get(name)
+        if label is not None and label.key == key:
+            return
+        if align == "center":
+            x -= text_width(text, scale) // 2
+        self.labels[name] = Label(key, layout(text, x, y, scale, color, self.uvs, shadow))
+        self.dirty = True
+
+    def panel(self, name, x, y, w, h, color=(0, 0, 0, 110)):
+        """Solid rectangle, drawn before every text label."""
+        key = ("panel", x, y, w, h, color)
+        label = self.labels.get(name)
+        if label is not None and label.key == key:
+            return
+        uv = np.array([self.uvs[None]], np.float32).T
+        self.labels[name] = Label(key, _quads(np.array([x]), np.array([y]), np.array([x + w]), np.array([y + h]), uv, color))
+        self.dirty = True
+
+    def remove(self, name):
+        if self.labels.pop(name, None) is not None:
+            self.dirty = True
+
+    def _upload(self):
+        order = sorted(self.labels.items(), key=lambda kv: kv[1].key[0] != "panel")
+        data = np.concatenate([l.vertices for _, l in order]) if order else np.zeros((0, VERTEX_FLOATS), np.float32)
+        self.count = len(data)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        if self.count:
+            glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.dirty = False
+        self.rebuilds += 1
+
+    def draw(self):
+        """Draw every label over the frame; returns the number of GL calls."""
+        calls = 0
+        if self.dirty:
+            self._upload()
+            calls += 3
+        if not self.count:
+            return calls
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        glOrtho(0, self.width, self.height, 0, -1, 1)
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+        glDisable(GL_LIGHTING); glDisable(GL_DEPTH_TEST); glDisable(GL_CULL_FACE)
+        glEnable(GL_BLEND); glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glEnable(GL_TEXTURE_2D); glBindTexture(GL_TEXTURE_2D, self.tex)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(2, GL_FLOAT, VERTEX_STRIDE, None)
+        glTexCoordPointer(2, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(8))
+        glColorPointer(4, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(16))
+        glDrawArrays(GL_QUADS, 0, self.count)
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        glBindTexture(GL_TEXTURE_2D, 0); glDisable(GL_TEXTURE_2D)
+        glDisable(GL_BLEND)
+        glEnable(GL_CULL_FACE); glEnable(GL_DEPTH_TEST); glEnable(GL_LIGHTING)
+        glPopMatrix()
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+        return calls + DRAW_GL_CALLS
+
+    def delete(self):
+        glDeleteBuffers(1, [self.vbo])
+        glDeleteTextures([self.tex])
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from cache import cache_dir
+
+CACHE_VERSION = 1
+
+def checkerboard(size=256, checks=16, color_a=(205, 205, 210), color_b=(170, 175, 180)):
+    step = size // checks
+    cell = np.arange(size) // step
+    even = (cell[:, None] + cell[None, :]) % 2 == 0
+    return np.where(even[..., None], np.array(color_a, dtype=np.uint8), np.array(color_b, dtype=np.uint8))
+
+GENERATORS = {"checkerboard": checkerboard}
+
+def mip_shapes(h, w):
+    shapes = [(h, w)]
+    while h > 1 or w > 1:
+        h, w = max(1, h // 2), max(1, w // 2)
+        shapes.append((h, w))
+    return shapes
+
+def build_mip_chain(img):
+    """Box-filtered mip levels down to 1x1, each a uint8 ``(h, w, c)`` array."""
+    levels = [img]
+    cur = img.astype(np.float32)
+    for h, w in mip_shapes(*img.shape[:2])[1:]:
+        ph, pw = cur.shape[0] // h, cur.shape[1] // w
+        cur = cur[:h * ph, :w * pw].reshape(h, ph, w, pw, -1).mean(axis=(1, 3))
+        levels.append(np.rint(cur).astype(np.uint8))
+    return levels
+
+def _split(flat, shape):
+    h, w, c = shape
+    levels, off = [], 0
+    for lh, lw in mip_shapes(h, w):
+        n = lh * lw * c
+        levels.append(flat[off:off + n].reshape(lh, lw, c))
+        off += n
+    return levels
+
+def load_mip_chain(kind, use_cache=True, **params):
+    """Mip chain for a procedural texture, memory-mapped from the on-disk
+    cache when an entry for ``(kind, params)`` exists, generated (and stored)
+    otherwise."""
+    key = json.dumps({"kind": kind, "v": CACHE_VERSION, **params}, sort_keys=True)
+    name = hashlib.sha1(key.encode()).hexdigest()
+    path = os.path.join(cache_dir("textures"), name + ".npy")
+
+    if use_cache:
+        try:
+            flat = np.load(path, mmap_mode="r")
+            with open(path[:-4] + ".json") as f:
+                shape = tuple(json.load(f)["shape"])
+            return _split(flat, shape)
+        except (OSError, ValueError, KeyError):
+            pass
+
+    levels = build_mip_chain(GENERATORS[kind](**params))
+    if use_cache:
+        try:
+            os.makedirs(cache_dir("textures"), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, np.concatenate([lv.reshape(-1) for lv in levels]))
+            with open(path[:-4] + ".json", "w") as f:
+                json.dump({"shape": levels[0].shape, "key": key}, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+    return levels
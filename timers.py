@@ -0,0 +1,94 @@
+import heapq
+import itertools
+
+
+class Timer:
+    """Handle returned by ``TimerQueue.schedule``."""
+    __slots__ = ("deadline", "remaining", "payload", "entry")
+
+    def __init__(self, deadline, payload):
+        self.deadline = deadline
+        self.remaining = None     # seconds left while paused
+        self.payload = payload
+        self.entry = None         # live heap entry, None when paused, cancelled or fired
+
+    @property
+    def paused(self):
+        return self.remaining is not None
+
+
+class TimerQueue:
+    """Deadlines on the simulation clock, kept in a min-heap.
+
+    ``pop_due`` only looks at the top of the heap, so timers cost nothing
+    until one is due. Cancelling or pausing a timer just orphans its heap
+    entry, which is skipped when it surfaces. The heap is rebuilt once
+    orphans outnumber live entries, so it never grows past twice the live
+    count.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()   # ties fire in scheduling order
+        self._live = 0
+
+    def __len__(self):
+        return self._live
+
+    def _push(self, timer):
+        timer.entry = [timer.deadline, next(self._seq), timer]
+        heapq.heappush(self._heap, timer.entry)
+        self._live += 1
+
+    def _orphan(self, timer):
+        if timer.entry is not None:
+            timer.entry[2] = None
+            timer.entry = None
+            self._live -= 1
+            if len(self._heap) > 2 * self._live + 16:
+                self._heap = [e for e in self._heap if e[2] is not None]
+                heapq.heapify(self._heap)
+
+    def schedule(self, deadline, payload):
+        timer = Timer(deadline, payload)
+        self._push(timer)
+        return timer
+
+    def schedule_many(self, items):
+        """``schedule`` each ``(deadline, payload)`` of ``items``, heapifying
+        once instead of pushing one by one; returns the Timers."""
+        timers = [Timer(deadline, payload) for deadline, payload in items]
+        for timer in timers:
+            timer.entry = [timer.deadline, next(self._seq), timer]
+            self._heap.append(timer.entry)
+        heapq.heapify(self._heap)
+        self._live += len(timers)
+        return timers
+
+    def cancel(self, timer):
+        self._orphan(timer)
+        timer.remaining = None
+
+    def pause(self, timer, now):
+        """Stop ``timer`` counting down; ``resume`` carries on from here."""
+        if timer.entry is not None:
+            self._orphan(timer)
+            timer.remaining = timer.deadline - now
+
+    def resume(self, timer, now):
+        if timer.remaining is not None:
+            timer.deadline = now + timer.remaining
+            timer.remaining = None
+            self._push(timer)
+
+    def pop_due(self, now):
+        """Payloads of the timers whose deadline is ``<= now``, earliest first."""
+        heap = self._heap
+        due = []
+        while heap and heap[0][0] <= now:
+            _, _, timer = heapq.heappop(heap)
+            if timer is not None:
+                timer.entry = None
+                self._live -= 1
+                due.append(timer.payload)
+        return due
@@ -0,0 +1,96 @@
+import math
+
+import numpy as np
+
+# Camera-distance thresholds (m) between detail levels: 0 is full detail.
+LOD_DISTANCES = (15.0, 40.0)
+# Head sphere (slices, stacks) per detail level.
+SPHERE_LODS = ((14, 14), (8, 8), (5, 5))
+
+
+def perspective(fovy, aspect, near, far):
+    """The matrix ``gluPerspective`` builds."""
+    f = 1.0 / math.tan(math.radians(fovy) / 2)
+    return np.array([[f / aspect, 0, 0, 0],
+                     [0, f, 0, 0],
+                     [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+                     [0, 0, -1, 0]])
+
+def look_at(eye, target, up=(0.0, 1.0, 0.0)):
+    """The matrix ``gluLookAt`` builds."""
+    eye = np.asarray(eye, dtype=np.float64)
+    f = np.asarray(target, dtype=np.float64) - eye
+    f /= np.linalg.norm(f)
+    s = np.cross(f, up)
+    s /= np.linalg.norm(s)
+    u = np.cross(s, f)
+    m = np.eye(4)
+    m[0, :3], m[1, :3], m[2, :3] = s, u, -f
+    m[:3, 3] = -m[:3, :3] @ eye
+    return m
+
+
+class Frustum:
+    """Clip planes, normals pointing in, for vectorized bounding-volume
+    tests: the six of a view-projection matrix, plus the edges of any
+    portals it has been narrowed through."""
+
+    def __init__(self, planes, eye):
+        self.planes = np.asarray(planes, dtype=np.float64)    # (K, 4) unit normal, offset
+        self.eye = np.asarray(eye, dtype=np.float64)
+
+    @classmethod
+    def from_matrix(cls, clip, eye):
+        """The planes of the view-projection matrix ``clip`` (Gribb-Hartmann)."""
+        rows = np.asarray(clip, dtype=np.float64)
+        planes = np.array([rows[3] + rows[0], rows[3] - rows[0],
+                           rows[3] + rows[1], rows[3] - rows[1],
+                           rows[3] + rows[2], rows[3] - rows[2]])
+        return cls(planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True), eye)
+
+    @classmethod
+    def from_camera(cls, eye, target, fovy, aspect, near, far, up=(0.0, 1.0, 0.0)):
+        return cls.from_matrix(perspective(fovy, aspect, near, far) @ look_at(eye, target, up), eye)
+
+    def through(self, corners):
+        """The part of this frustum that looks through the convex polygon
+        ``corners`` (K, 3), or None if the polygon is out of view."""
+        c = np.asarray(corners, dtype=np.float64)
+        if ((c @ self.planes[:, :3].T + self.planes[:, 3]) < 0).all(axis=0).any():
+            return None
+        center = c.mean(axis=0)
+        normal = np.cross(c[1] - c[0], c[2] - c[0])
+        normal /= np.linalg.norm(normal)
+        if abs((self.eye - center) @ normal) < 1e-6:
+            return self     # eye in the portal's plane: nothing to narrow
+        if (self.eye - center) @ normal > 0:
+            normal = -normal
+        planes = [(*normal, -normal @ center)]
+        for a, b in zip(c, np.roll(c, -1, axis=0)):
+            n = np.cross(a - self.eye, b - self.eye)
+            length = np.linalg.norm(n)
+            if length < 1e-9:
+                continue
+            n /= length
+            if (center - self.eye) @ n < 0:
+                n = -n
+            planes.append((*n, -n @ self.eye))
+        return Frustum(np.vstack([self.planes, planes]), self.eye)
+
+    def spheres(self, centers, radii):
+        """Mask of the spheres ``(N, 3)``, ``radii`` that touch the frustum."""
+        c = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+        dist = c @ self.planes[:, :3].T + self.planes[:, 3]
+        return (dist >= -np.asarray(radii, dtype=np.float64).reshape(-1, 1)).all(axis=1)
+
+    def boxes(self, mins, maxs):
+        """Mask of the axis-aligned boxes that touch the frustum: for each
+        plane, the corner furthest along its normal must be inside."""
+        n = self.planes[:, :3]
+        corner = np.where(n > 0, np.asarray(maxs)[:, None, :], np.asarray(mins)[:, None, :])
+        return ((corner * n).sum(axis=2) + self.planes[:, 3] >= 0).all(axis=1)
+
+    def lod(self, centers, distances=LOD_DISTANCES):
+        """Detail level of each point by distance to the eye, 0 = full detail."""
+        d = np.linalg.norm(np.asarray(centers, dtype=np.float64).reshape(-1, 3) - self.eye, axis=1)
+        return np.searchsorted(distances, d)